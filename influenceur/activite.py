@@ -0,0 +1,130 @@
+"""
+Dernière activité des influenceurs authentifiés par token (date_derniere_connexion).
+
+signaler() note l'activité en mémoire, au plus une fois par LAST_SEEN_INTERVAL secondes et
+par influenceur (filtre local au processus, puis verrou partagé dans le cache entre les
+processus). vider() écrit les activités notées en un seul UPDATE ; il est appelé en fin de
+requête (signal request_finished) et n'écrit que si la plus ancienne activité attend depuis
+LAST_SEEN_FLUSH_INTERVAL secondes ou si LAST_SEEN_BATCH_SIZE influenceurs sont en attente.
+Sans nouvelle requête, une minuterie (thread) écrit le lot après LAST_SEEN_FLUSH_INTERVAL
+secondes. Les activités non écrites à l'arrêt d'un processus sont perdues (au plus un intervalle).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_verrou = threading.Lock()
+_en_attente = {}  # influenceur_id -> date de la dernière activité notée
+_debut_attente = None  # time.monotonic() de la plus ancienne activité en attente
+_derniers_signalements = {}  # influenceur_id -> time.monotonic() du dernier signalement retenu
+_minuterie = None  # threading.Timer du prochain vidage sans requête
+
+
+def _cle(influenceur_id):
+    return f'activite:{influenceur_id}'
+
+
+def signaler(influenceur_id):
+    """Note l'activité de l'influenceur si elle n'a pas été notée depuis LAST_SEEN_INTERVAL secondes"""
+    global _debut_attente
+    intervalle = settings.LAST_SEEN_INTERVAL
+    maintenant = time.monotonic()
+    dernier = _derniers_signalements.get(influenceur_id)
+    if dernier is not None and maintenant - dernier < intervalle:
+        return False
+    _derniers_signalements[influenceur_id] = maintenant
+    # Un autre processus a déjà noté l'activité dans l'intervalle
+    if intervalle and not cache.add(_cle(influenceur_id), 1, timeout=intervalle):
+        return False
+    with _verrou:
+        if not _en_attente:
+            _debut_attente = maintenant
+            _programmer_vidage()
+        _en_attente[influenceur_id] = timezone.now()
+    return True
+
+
+def _programmer_vidage():
+    """Démarre la minuterie de vidage si aucune n'est en cours (appelé sous _verrou)"""
+    global _minuterie
+    delai = settings.LAST_SEEN_FLUSH_INTERVAL
+    if delai <= 0 or _minuterie is not None:
+        return
+    _minuterie = threading.Timer(delai, _vidage_differe)
+    _minuterie.daemon = True
+    _minuterie.start()
+
+
+def _vidage_differe():
+    global _minuterie
+    with _verrou:
+        _minuterie = None
+    try:
+        vider(force=True)
+    finally:
+        # Connexion ouverte par ce thread : refermée, aucune requête ne la recyclera
+        connections.close_all()
+
+
+def vider(force=False):
+    """
+    Écrit les activités en attente en un UPDATE groupé, si le lot est dû (ou avec `force`).
+    Retourne le nombre d'influenceurs mis à jour.
+    """
+    global _debut_attente
+    with _verrou:
+        if not _en_attente:
+            return 0
+        if (not force and len(_en_attente) < settings.LAST_SEEN_BATCH_SIZE
+                and time.monotonic() - _debut_attente < settings.LAST_SEEN_FLUSH_INTERVAL):
+            return 0
+        lot = dict(_en_attente)
+        _en_attente.clear()
+        _debut_attente = None
+        # Filtre local : les entrées plus anciennes que l'intervalle ne filtrent plus rien
+        limite = time.monotonic() - settings.LAST_SEEN_INTERVAL
+        for influenceur_id in [i for i, t in _derniers_signalements.items() if t < limite]:
+            del _derniers_signalements[influenceur_id]
+
+    from .models import Influenceur
+
+    try:
+        Influenceur.objects.filter(pk__in=list(lot)).update(date_derniere_connexion=Case(
+            *(When(pk=influenceur_id, then=Value(date)) for influenceur_id, date in lot.items()),
+            output_field=DateTimeField(),
+        ))
+    except DatabaseError:
+        logger.exception('Écriture de la dernière activité de %d influenceur(s) impossible', len(lot))
+        # Remis en attente pour le prochain lot, sauf activité plus récente entre-temps
+        with _verrou:
+            for influenceur_id, date in lot.items():
+                _en_attente.setdefault(influenceur_id, date)
+            if _debut_attente is None:
+                _debut_attente = time.monotonic()
+            _programmer_vidage()
+        return 0
+    return len(lot)
+
+
+def en_attente():
+    """Nombre d'influenceurs dont l'activité attend d'être écrite"""
+    return len(_en_attente)
+
+
+def reinitialiser():
+    """Oublie les activités en attente et les signalements (tests, benchmarks)"""
+    global _debut_attente, _minuterie
+    with _verrou:
+        _en_attente.clear()
+        _derniers_signalements.clear()
+        _debut_attente = None
+        if _minuterie is not None:
+            _minuterie.cancel()
+            _minuterie = None
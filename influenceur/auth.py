@@ -1,9 +1,14 @@
 from rest_framework.authtoken.models import Token
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
+from django.db import transaction
 from .models import Influenceur
+from . import activite, cache
 from django.utils import timezone
 
 class InfluenceurTokenAuthentication(TokenAuthentication):
@@ -19,21 +24,130 @@ class InfluenceurTokenAuthentication(TokenAuthentication):
                 raise AuthenticationFailed('Utilisateur inactif.')
             
             # Vérifier si l'utilisateur a un influenceur associé
-            try:
-                influenceur = Influenceur.objects.get(email=token.user.email)
-                if not influenceur.is_active:
-                    raise AuthenticationFailed('Influenceur inactif.')
-                
-                # Mettre à jour la dernière connexion
-                influenceur.update_last_login()
-                
-                return (token.user, token)
-            except Influenceur.DoesNotExist:
+            influenceur = get_influenceur_from_user(token.user)
+            if influenceur is None:
                 raise AuthenticationFailed('Influenceur non trouvé.')
-                
+            if not influenceur.is_active:
+                raise AuthenticationFailed('Influenceur inactif.')
+
+            # Dernière activité notée en mémoire, écrite par lots (voir activite.py)
+            activite.signaler(influenceur.pk)
+
+            return (token.user, token)
+
         except self.model.DoesNotExist:
             raise AuthenticationFailed('Token invalide.')
 
+class InfluenceurPrincipal(TokenUser):
+    """
+    Utilisateur construit à partir des claims d'un token JWT d'influenceur (voir
+    tokens_for_influenceur), sans accès à la base. Expose les mêmes contrôles que
+    Influenceur (is_admin, has_permission) pour les classes de permissions.
+    """
+    is_active = True
+
+    @property
+    def email(self):
+        return self.token.get('email', '')
+
+    @property
+    def influenceur_id(self):
+        return self.token['influenceur_id']
+
+    @property
+    def role(self):
+        return self.token.get('role')
+
+    @property
+    def permissions(self):
+        return self.token.get('permissions', {})
+
+    def is_admin(self):
+        return self.permissions.get('is_admin', False)
+
+    def has_permission(self, permission):
+        return self.is_admin() or self.permissions.get(f'peut_{permission}', False)
+
+
+class InfluenceurJWTAuthentication(JWTAuthentication):
+    """
+    Authentification JWT sans requête pour les tokens d'influenceur : l'utilisateur est
+    construit depuis les claims (InfluenceurPrincipal) et la version des permissions du
+    token est comparée à celle en cache (révocation). La dernière activité est notée par
+    activite.signaler. Les autres tokens (admins) sont résolus en base par simplejwt.
+    """
+
+    def get_user(self, validated_token):
+        if 'influenceur_id' not in validated_token:
+            return super().get_user(validated_token)
+        version = cache.version_permissions(validated_token['influenceur_id'])
+        if version is None or version != validated_token.get('pv'):
+            raise AuthenticationFailed('Token révoqué, veuillez vous reconnecter.', code='token_revoked')
+        activite.signaler(validated_token['influenceur_id'])
+        return InfluenceurPrincipal(validated_token)
+
+
+def claims_for_influenceur(influenceur):
+    """Claims d'identité et de permissions d'un influenceur, portés par ses tokens JWT"""
+    return {
+        'email': influenceur.email,
+        'influenceur_id': influenceur.pk,
+        'role': influenceur.role,
+        'permissions': influenceur.get_all_permissions(),
+        'pv': influenceur.version_permissions,
+    }
+
+
+def tokens_for_influenceur(user, influenceur):
+    """Refresh token (et access token dérivé) de l'utilisateur Django d'un influenceur"""
+    refresh = RefreshToken.for_user(user)
+    refresh['username'] = user.get_username()
+    for claim, valeur in claims_for_influenceur(influenceur).items():
+        refresh[claim] = valeur
+    return refresh
+
+
+def noms_utilisateur(influenceur):
+    """(first_name, last_name) de l'utilisateur Django à partir du nom de l'influenceur"""
+    parties = (influenceur.nom or '').split()
+    return (parties[0] if parties else '', ' '.join(parties[1:]))
+
+
+def utilisateur_pour_influenceur(influenceur):
+    """
+    Utilisateur Django (username = email) portant les tokens JWT d'un influenceur, créé
+    au besoin ; la ligne n'est réécrite que si le nom ou l'activation ont changé
+    """
+    first_name, last_name = noms_utilisateur(influenceur)
+    champs = {'first_name': first_name, 'last_name': last_name, 'is_active': influenceur.is_active}
+    user, created = User.objects.get_or_create(
+        username=influenceur.email,
+        # Mot de passe factice : l'authentification passe par l'influenceur
+        defaults={**champs, 'email': influenceur.email, 'password': '!'},
+    )
+    if not created:
+        modifies = [champ for champ, valeur in champs.items() if getattr(user, champ) != valeur]
+        if modifies:
+            for champ in modifies:
+                setattr(user, champ, champs[champ])
+            user.save(update_fields=modifies)
+    return user
+
+
+def connecter_influenceur(influenceur):
+    """
+    Connexion d'un influenceur dont le mot de passe a été vérifié, en une transaction :
+    utilisateur Django (écrit seulement s'il a changé), tokens JWT (ligne OutstandingToken
+    pour la blacklist) et dernière connexion (voir Influenceur.enregistrer_connexion).
+    Retourne le refresh token.
+    """
+    with transaction.atomic():
+        user = utilisateur_pour_influenceur(influenceur)
+        refresh = tokens_for_influenceur(user, influenceur)
+        influenceur.enregistrer_connexion()
+    return refresh
+
+
 def create_influenceur_user(influenceur):
     """
     Crée un utilisateur Django pour un influenceur
@@ -87,9 +201,28 @@ def authenticate_influenceur(email, password):
 
 def get_influenceur_from_user(user):
     """
-    Récupère l'influenceur associé à un utilisateur Django
+    Récupère l'influenceur associé à un utilisateur Django (cache partagé entre les
+    requêtes, invalidé à chaque sauvegarde de l'influenceur : voir cache.influenceur_pour_utilisateur)
     """
-    try:
-        return Influenceur.objects.get(email=user.email)
-    except Influenceur.DoesNotExist:
-        return None 
\ No newline at end of file
+    if not user.is_authenticated:
+        return None
+    return cache.influenceur_pour_utilisateur(user)
+
+def get_influenceur_for_permissions(request):
+    """
+    Porteur des permissions de l'utilisateur de la requête : l'utilisateur lui-même s'il
+    vient d'un token JWT d'influenceur (claims, sans requête), sinon son influenceur
+    """
+    if isinstance(request.user, InfluenceurPrincipal):
+        return request.user
+    return get_influenceur_from_request(request)
+
+def get_influenceur_from_request(request):
+    """
+    Influenceur de l'utilisateur de la requête, résolu une seule fois par requête
+    (permissions puis vue)
+    """
+    requete = getattr(request, '_request', request)
+    if not hasattr(requete, '_influenceur_resolu'):
+        requete._influenceur_resolu = get_influenceur_from_user(request.user)
+    return requete._influenceur_resolu 
\ No newline at end of file
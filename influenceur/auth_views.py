@@ -1,19 +1,33 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
+from .hachage import HachageSature
 from .models import Influenceur
 from .serializers import InfluenceurSerializer
 from .permissions import IsInfluenceurOrAdmin, IsOwnerOrAdmin
+from .auth import (
+    get_influenceur_from_request, connecter_influenceur, claims_for_influenceur, tokens_for_influenceur,
+    utilisateur_pour_influenceur,
+)
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _reponse_hachage_sature():
+    """503 quand le pool de hachage des mots de passe est plein (voir hachage.executer)"""
+    return Response({
+        'error': 'Trop de connexions simultanées, veuillez réessayer.'
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+
+
 @api_view(['POST'])
+@authentication_classes([])  # Un token expiré ou révoqué ne doit pas bloquer la connexion
 @permission_classes([AllowAny])
 def admin_login_view(request):
     """
@@ -124,6 +138,7 @@ def admin_login_view(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
+@authentication_classes([])
 @permission_classes([AllowAny])
 def influenceur_login_view(request):
     """
@@ -162,34 +177,11 @@ def influenceur_login_view(request):
                 'error': 'Email ou mot de passe incorrect'
             }, status=status.HTTP_401_UNAUTHORIZED)
         
-        # Créer ou récupérer l'utilisateur Django pour les tokens JWT
-        # Utiliser l'email comme username pour éviter les conflits
-        user, created = User.objects.get_or_create(
-            username=influenceur.email,
-            defaults={
-                'email': influenceur.email,
-                'first_name': influenceur.nom.split()[0] if influenceur.nom else '',
-                'last_name': ' '.join(influenceur.nom.split()[1:]) if len(influenceur.nom.split()) > 1 else '',
-                'is_active': influenceur.is_active,
-                'password': '!'  # Mot de passe factice car on utilise l'influenceur pour l'auth
-            }
-        )
-        
-        # Mettre à jour les informations utilisateur si nécessaire
-        if not created:
-            user.first_name = influenceur.nom.split()[0] if influenceur.nom else ''
-            user.last_name = ' '.join(influenceur.nom.split()[1:]) if len(influenceur.nom.split()) > 1 else ''
-            user.is_active = influenceur.is_active
-            user.save()
-        
-        # Générer les tokens JWT
-        refresh = RefreshToken.for_user(user)
+        # Utilisateur Django, tokens JWT et dernière connexion en une transaction
+        refresh = connecter_influenceur(influenceur)
         access_token = str(refresh.access_token)
         refresh_token = str(refresh)
         
-        # Mettre à jour la dernière connexion
-        influenceur.update_last_login()
-        
         # Sérialiser les données de l'influenceur
         serializer = InfluenceurSerializer(influenceur)
         
@@ -207,6 +199,8 @@ def influenceur_login_view(request):
         
         return Response(response_data, status=status.HTTP_200_OK)
             
+    except HachageSature:
+        return _reponse_hachage_sature()
     except json.JSONDecodeError:
         return Response({
             'error': 'Données JSON invalides'
@@ -218,6 +212,7 @@ def influenceur_login_view(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
+@authentication_classes([])
 @permission_classes([AllowAny])
 def refresh_token_view(request):
     """
@@ -235,7 +230,17 @@ def refresh_token_view(request):
         # Rafraîchir le token
         try:
             refresh = RefreshToken(refresh_token)
-            access_token = str(refresh.access_token)
+            access = refresh.access_token
+            if 'influenceur_id' in refresh:
+                # Token d'influenceur : refusé si révoqué, claims mis à jour depuis la base
+                influenceur = Influenceur.objects.filter(pk=refresh['influenceur_id'], is_active=True).first()
+                if influenceur is None or influenceur.version_permissions != refresh.get('pv'):
+                    return Response({
+                        'error': 'Token de rafraîchissement révoqué'
+                    }, status=status.HTTP_401_UNAUTHORIZED)
+                for claim, valeur in claims_for_influenceur(influenceur).items():
+                    access[claim] = valeur
+            access_token = str(access)
             
             return Response({
                 'success': True,
@@ -307,17 +312,10 @@ def profile_view(request):
     Vue pour récupérer le profil de l'utilisateur connecté
     """
     try:
-        # Récupérer l'utilisateur depuis le token JWT
+        # Utilisateur déjà authentifié par DRF (token JWT)
         auth_header = request.headers.get('Authorization', '')
         if auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-            
-            # Décoder le token pour récupérer l'utilisateur
-            from rest_framework_simplejwt.tokens import AccessToken
-            access_token = AccessToken(token)
-            user_id = access_token['user_id']
-            
-            user = User.objects.get(id=user_id)
+            user = request.user
             
             # Vérifier si c'est un superuser
             if user.is_superuser:
@@ -345,8 +343,10 @@ def profile_view(request):
                 }
             else:
                 # C'est un influenceur
-                try:
-                    influenceur = Influenceur.objects.get(email=user.email)
+                influenceur = get_influenceur_from_request(request)
+                if influenceur is not None:
+                    # L'influenceur résolu ne porte que ses permissions : profil complet lu en base
+                    influenceur = Influenceur.objects.get(pk=influenceur.pk)
                     serializer = InfluenceurSerializer(influenceur)
                     
                     response_data = {
@@ -360,7 +360,7 @@ def profile_view(request):
                             'login_attempts': influenceur.nombre_tentatives_connexion
                         }
                     }
-                except Influenceur.DoesNotExist:
+                else:
                     return Response({
                         'error': 'Influenceur non trouvé'
                     }, status=status.HTTP_404_NOT_FOUND)
@@ -378,6 +378,7 @@ def profile_view(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
+@authentication_classes([])
 @permission_classes([AllowAny])
 def register_view(request):
     """
@@ -410,21 +411,8 @@ def register_view(request):
             role='influenceur'  # Par défaut
         )
         
-        # Créer l'utilisateur Django pour les tokens JWT
-        # Utiliser l'email comme username pour éviter les conflits
-        user, created = User.objects.get_or_create(
-            username=influenceur.email,
-            defaults={
-                'email': influenceur.email,
-                'first_name': influenceur.nom.split()[0] if influenceur.nom else '',
-                'last_name': ' '.join(influenceur.nom.split()[1:]) if len(influenceur.nom.split()) > 1 else '',
-                'is_active': influenceur.is_active,
-                'password': '!'  # Mot de passe factice car on utilise l'influenceur pour l'auth
-            }
-        )
-        
-        # Générer les tokens JWT
-        refresh = RefreshToken.for_user(user)
+        # Utilisateur Django et tokens JWT (identité et permissions de l'influenceur en claims)
+        refresh = tokens_for_influenceur(utilisateur_pour_influenceur(influenceur), influenceur)
         access_token = str(refresh.access_token)
         refresh_token = str(refresh)
         
@@ -442,6 +430,8 @@ def register_view(request):
             'expires_in': 86400
         }, status=status.HTTP_201_CREATED)
             
+    except HachageSature:
+        return _reponse_hachage_sature()
     except json.JSONDecodeError:
         return Response({
             'error': 'Données JSON invalides'
@@ -513,6 +503,8 @@ def change_password_view(request):
             'message': 'Mot de passe modifié avec succès'
         }, status=status.HTTP_200_OK)
         
+    except HachageSature:
+        return _reponse_hachage_sature()
     except json.JSONDecodeError:
         return Response({
             'error': 'Données JSON invalides'
@@ -0,0 +1,112 @@
+"""
+Outils communs aux commandes de benchmark : jeu de données jetable et chronométrage.
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import random
+import statistics
+import time
+import uuid
+
+
+@contextmanager
+def donnees_jetables():
+    """Exécute le bloc dans une transaction systématiquement annulée"""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def creer_jeu_de_donnees(nb_prospects, nb_influenceurs=10, graine=0):
+    """
+    Crée `nb_influenceurs` influenceurs, `nb_prospects` prospects (un tiers confirmés
+    et rattachés à une remise) et une remise pour dix prospects avec bulk_create. Les statistiques incrémentales ne sont
+    pas maintenues : à utiliser dans `donnees_jetables()`.
+    """
+    from prospect.models import Prospect
+    from remise.models import Remise
+    from .models import Influenceur
+
+    aleatoire = random.Random(graine)
+    maintenant = timezone.now()
+    mot_de_passe = make_password('benchmark')
+    prefixe = uuid.uuid4().hex[:6]
+
+    influenceurs = Influenceur.objects.bulk_create([
+        Influenceur(nom=f'Influenceur {i}', email=f'bench-{prefixe}-{i}@example.com',
+                    code_affiliation=f'{prefixe}{i:06d}', password=mot_de_passe)
+        for i in range(nb_influenceurs)
+    ])
+    # Un multiple de nb_influenceurs : la remise i % nb_remises appartient à l'influenceur i % nb_influenceurs
+    nb_remises = nb_influenceurs * max(1, nb_prospects // (10 * nb_influenceurs))
+    remises = Remise.objects.bulk_create([
+        Remise(influenceur=influenceurs[i % nb_influenceurs], montant=Decimal('10.00'), description='Benchmark')
+        for i in range(nb_remises)
+    ])
+
+    statuts = [code for code, _ in Prospect.STATUT_CHOICES]
+    niveaux = [code for code, _ in Prospect.NIVEAU_ETUDE_CHOICES]
+    series = [code for code, _ in Prospect.SERIE_BAC_CHOICES]
+    filieres = [code for code, _ in Prospect.FILIERE_CHOICES]
+    prospects = []
+    for i in range(nb_prospects):
+        n = i % nb_influenceurs
+        statut = aleatoire.choice(statuts)
+        prospects.append(Prospect(
+            nom=f'Prospect {i}',
+            email=f'bench-{prefixe}-p{i}@example.com',
+            telephone=f'{prefixe[:2]}{i:06d}'[-8:],
+            statut=statut,
+            influenceur=influenceurs[n],
+            remise=remises[i % nb_remises] if statut == 'confirme' else None,
+            date_inscription=maintenant - timedelta(minutes=i),
+            niveau_etude=aleatoire.choice(niveaux),
+            serie_bac=aleatoire.choice(series),
+            serie_bac_autre='Série F',
+            filiere_souhaitee=aleatoire.choice(filieres),
+        ))
+    Prospect.objects.bulk_create(prospects, batch_size=1000)
+    return influenceurs
+
+
+def semer(nb_influenceurs, nb_prospects, graine=0, jours=180):
+    """
+    Jeu de données réaliste pour les benchmarks d'API (voir generation.generer), avec un
+    préfixe aléatoire pour ne pas entrer en conflit avec des données existantes. Les
+    statistiques (InfluenceurStats, cumuls journaliers) sont reconstruites comme en production.
+    Retourne les influenceurs, du plus actif au moins actif.
+    """
+    from .generation import generer, semer_statistiques
+
+    influenceurs = generer(nb_influenceurs, nb_prospects, graine=graine, jours=jours,
+                           prefixe=f'b{uuid.uuid4().hex[:6]}', mot_de_passe='benchmark')
+    semer_statistiques(depuis=(timezone.now() - timedelta(days=jours)).date())
+    return influenceurs
+
+
+def mesurer(fonction, repetitions=5):
+    """
+    Exécute `fonction` `repetitions` fois et retourne
+    (durée médiane en secondes, nombre de requêtes du dernier passage, dernier résultat).
+    """
+    durees = []
+    for _ in range(repetitions):
+        reset_queries()
+        with CaptureQueriesContext(connection) as requetes:
+            debut = time.perf_counter()
+            resultat = fonction()
+            durees.append(time.perf_counter() - debut)
+    return statistics.median(durees), len(requetes), resultat
+
+
+def percentile(valeurs, p):
+    """Percentile `p` (0-100) de `valeurs`, par le rang le plus proche"""
+    triees = sorted(valeurs)
+    if not triees:
+        return 0
+    return triees[min(len(triees) - 1, max(0, round(p / 100 * len(triees)) - 1))]
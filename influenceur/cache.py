@@ -0,0 +1,245 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+import threading
+import time
+
+# Portées mises en cache (une entrée par influenceur et par portée)
+PORTEES = (
+    'dashboard_influenceur',
+    'dashboard_global',
+    'statistiques_prospects',
+    'statistiques_remises',
+    'evolution',
+)
+GLOBAL = 'global'
+
+_compteurs = {portee: {'hits': 0, 'misses': 0} for portee in PORTEES}
+_verrou = threading.Lock()
+
+
+def _cle_version(influenceur_id):
+    return f'stats:version:{influenceur_id or GLOBAL}'
+
+
+def version(influenceur_id=None):
+    """
+    Version courante des données d'un influenceur (ou globale).
+    Une version absente (jamais créée ou évincée) est initialisée à partir de l'heure
+    courante, pour ne jamais retomber sur une version déjà utilisée par une entrée.
+    """
+    cle = _cle_version(influenceur_id)
+    valeur = cache.get(cle)
+    if valeur is None:
+        cache.add(cle, time.time_ns() // 1000, timeout=None)
+        valeur = cache.get(cle)
+    return valeur
+
+
+def _incrementer(influenceur_id):
+    _incrementer_cle(_cle_version(influenceur_id))
+
+
+def _incrementer_cle(cle):
+    try:
+        cache.incr(cle)
+    except ValueError:
+        cache.add(cle, time.time_ns() // 1000, timeout=None)
+
+
+def _invalider_maintenant(influenceur_ids):
+    for influenceur_id in set(influenceur_ids):
+        if influenceur_id is not None:
+            _incrementer(influenceur_id)
+    _incrementer(None)
+
+
+def invalider(*influenceur_ids):
+    """
+    Invalide les entrées des influenceurs donnés et les entrées globales.
+    Dans une transaction, l'invalidation est refaite au commit pour ne pas garder
+    une réponse calculée entre l'écriture et le commit.
+    """
+    _invalider_maintenant(influenceur_ids)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _invalider_maintenant(influenceur_ids))
+
+
+def obtenir(portee, influenceur_id, calculer, parametres=()):
+    """
+    Retourne la réponse en cache pour (portée, influenceur, paramètres),
+    ou la calcule avec `calculer()` et la met en cache.
+    Les données dépendant de la date du jour, celle-ci fait partie de la clé.
+    """
+    cle = ':'.join(
+        ['stats', portee, str(influenceur_id or GLOBAL), f'v{version(influenceur_id)}', str(timezone.localdate())]
+        + [str(p) for p in parametres]
+    )
+    data = cache.get(cle)
+    with _verrou:
+        _compteurs[portee]['hits' if data is not None else 'misses'] += 1
+    if data is None:
+        data = calculer()
+        cache.set(cle, data, timeout=getattr(settings, 'STATS_CACHE_TIMEOUT', 300))
+    return data
+
+
+def _cle_code(code_affiliation):
+    return f'affiliation:code:{code_affiliation}'
+
+
+def influenceur_pour_code(code_affiliation):
+    """
+    Identifiant de l'influenceur actif ayant ce code d'affiliation (None sinon), mis en
+    cache AFFILIATION_CODE_CACHE_TIMEOUT secondes. Les codes inconnus sont aussi mis en
+    cache (valeur 0), pour qu'un lien erroné ne coûte pas une requête par soumission.
+    L'entrée est invalidée quand le code ou is_active de l'influenceur change (signals.py).
+    """
+    from .models import Influenceur
+    if not code_affiliation.isalnum() or len(code_affiliation) > Influenceur._meta.get_field('code_affiliation').max_length:
+        return None
+    cle = _cle_code(code_affiliation)
+    influenceur_id = cache.get(cle)
+    if influenceur_id is None:
+        influenceur_id = (
+            Influenceur.objects.filter(code_affiliation=code_affiliation, is_active=True)
+            .values_list('pk', flat=True).first()
+        ) or 0
+        cache.set(cle, influenceur_id, timeout=getattr(settings, 'AFFILIATION_CODE_CACHE_TIMEOUT', 300))
+    return influenceur_id or None
+
+
+def invalider_codes(*codes_affiliation):
+    """Retire du cache la résolution des codes d'affiliation donnés"""
+    cles = [_cle_code(code) for code in set(codes_affiliation) if code]
+    cache.delete_many(cles)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(cles))
+
+
+def _cle_utilisateur(user_id):
+    return f'auth:influenceur:{user_id}'
+
+
+def _cle_version_email(email):
+    return f'auth:version:{email}'
+
+
+def _champs_resolution():
+    """Clé et champs des permissions de l'influenceur, dans l'ordre des colonnes du modèle"""
+    from .models import Influenceur
+    noms = {Influenceur._meta.pk.attname, *Influenceur.CHAMPS_PERMISSIONS}
+    return [champ.attname for champ in Influenceur._meta.concrete_fields if champ.attname in noms]
+
+
+def _influenceur_partiel(valeurs):
+    """
+    Influenceur reconstruit depuis l'entrée en cache : les champs absents (nom, mot de passe…)
+    sont différés et lus en base à la première utilisation
+    """
+    from .models import Influenceur
+    if valeurs is None:
+        return None
+    return Influenceur.from_db(None, _champs_resolution(), valeurs)
+
+
+def influenceur_pour_utilisateur(user):
+    """
+    Influenceur associé à un utilisateur Django (même email), ou None. Le résultat, y compris
+    None, est mis en cache AUTH_INFLUENCEUR_CACHE_TIMEOUT secondes sous l'id de l'utilisateur,
+    avec la version de son email : toute sauvegarde ou suppression d'un influenceur change
+    cette version (invalider_utilisateurs, appelé par signals.py). Une lecture du cache au
+    plus par appel.
+    Seuls la clé et les champs des permissions sont mis en cache (jamais le hash du mot de
+    passe) ; l'instance rendue charge les autres champs à la demande. Le cache doit être
+    partagé entre les processus (Redis en production) pour que l'invalidation soit vue partout.
+    """
+    from .models import Influenceur
+    cle, cle_version = _cle_utilisateur(user.pk), _cle_version_email(user.email)
+    valeurs = cache.get_many([cle, cle_version])
+    entree, version_email = valeurs.get(cle), valeurs.get(cle_version)
+    if entree is not None and version_email is not None and entree[:2] == (user.email, version_email):
+        return _influenceur_partiel(entree[2])
+
+    if version_email is None:
+        cache.add(cle_version, time.time_ns() // 1000, timeout=None)
+        version_email = cache.get(cle_version)
+    champs = _champs_resolution()
+    influenceur = Influenceur.objects.filter(email=user.email).values_list(*champs).first()
+    cache.set(cle, (user.email, version_email, influenceur),
+              timeout=getattr(settings, 'AUTH_INFLUENCEUR_CACHE_TIMEOUT', 60))
+    return _influenceur_partiel(influenceur)
+
+
+def invalider_utilisateurs(*emails):
+    """
+    Invalide l'influenceur en cache des utilisateurs ayant ces emails. Dans une transaction,
+    l'invalidation est refaite au commit (comme invalider).
+    """
+    cles = [_cle_version_email(email) for email in set(emails) if email]
+    for cle in cles:
+        _incrementer_cle(cle)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: [_incrementer_cle(cle) for cle in cles])
+
+
+def _cle_version_permissions(influenceur_id):
+    return f'auth:permissions:{influenceur_id}'
+
+
+def cache_partage():
+    """
+    Faux si le cache par défaut est propre au processus (locmem, dummy) : une invalidation
+    faite par un worker n'y est pas vue par les autres
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    return backend not in ('django.core.cache.backends.locmem.LocMemCache',
+                           'django.core.cache.backends.dummy.DummyCache')
+
+
+def version_permissions(influenceur_id):
+    """
+    Version des permissions de l'influenceur (None s'il n'existe plus), lue en base au plus
+    une fois par AUTH_PERMISSION_VERSION_CACHE_TIMEOUT secondes ; mise à jour par
+    enregistrer_version_permissions à chaque changement.
+    Avec un cache propre au processus (cache_partage), la révocation publiée par un worker
+    ne serait pas vue par les autres : la version est alors lue en base à chaque appel.
+    """
+    from .models import Influenceur
+    versions = Influenceur.objects.filter(pk=influenceur_id).values_list('version_permissions', flat=True)
+    if not cache_partage():
+        return versions.first()
+    cle = _cle_version_permissions(influenceur_id)
+    version = cache.get(cle)
+    if version is None:
+        version = versions.first()
+        version = -1 if version is None else version
+        cache.set(cle, version, timeout=getattr(settings, 'AUTH_PERMISSION_VERSION_CACHE_TIMEOUT', 300))
+    return None if version < 0 else version
+
+
+def enregistrer_version_permissions(influenceur_id, version):
+    """Publie la nouvelle version des permissions (-1 : influenceur supprimé), refaite au commit"""
+    def publier():
+        cache.set(_cle_version_permissions(influenceur_id), version,
+                  timeout=getattr(settings, 'AUTH_PERMISSION_VERSION_CACHE_TIMEOUT', 300))
+    publier()
+    if connection.in_atomic_block:
+        transaction.on_commit(publier)
+
+
+def compteurs():
+    """Compteurs de hits/misses par portée (pour ce processus)"""
+    with _verrou:
+        resultat = {portee: dict(c) for portee, c in _compteurs.items()}
+    for c in resultat.values():
+        total = c['hits'] + c['misses']
+        c['taux_hit'] = round((c['hits'] / total) * 100, 2) if total else 0
+    return resultat
+
+
+def reinitialiser_compteurs():
+    with _verrou:
+        for c in _compteurs.values():
+            c['hits'] = c['misses'] = 0
@@ -0,0 +1,176 @@
+"""
+Détection des requêtes N+1 : le même SQL (paramètres et listes de valeurs exclus) exécuté
+N1_THRESHOLD fois depuis la même ligne du projet, pendant une requête HTTP
+(DetectionN1Middleware) ou une commande (surveiller()), est signalé.
+
+N1_DETECTION vaut 'raise' (exception RequetesN1, en développement et pendant les tests),
+'log' (avertissement avec la pile, sur une fraction N1_SAMPLE_RATE des requêtes, en
+production) ou 'off'. Les boucles par lots volontaires sont exclues avec tolerer().
+"""
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from django.conf import settings
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+import logging
+import os
+import random
+import re
+import sys
+import traceback
+
+logger = logging.getLogger(__name__)
+
+_detecteur_actif = ContextVar('detecteur_n1', default=None)
+
+_LISTES = re.compile(r'%s(?:\s*,\s*%s)+')
+_LIGNES = re.compile(r'\(%s\)(?:\s*,\s*\(%s\))+')
+_LITTERAUX = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_MODULE = os.path.abspath(__file__)
+
+
+class RequetesN1(Exception):
+    """Même requête SQL répétée depuis la même ligne de code (N+1)"""
+
+
+@lru_cache(maxsize=2048)
+def empreinte(sql):
+    """SQL normalisé : littéraux remplacés par ?, listes IN et lignes VALUES réduites à un élément"""
+    sql = _LITTERAUX.sub('?', sql)
+    sql = _LISTES.sub('%s', sql)
+    return _LIGNES.sub('(%s)', sql)
+
+
+@lru_cache(maxsize=1024)
+def _fichier_du_projet(fichier):
+    fichier = os.path.abspath(fichier)
+    return (fichier.startswith(str(settings.BASE_DIR)) and fichier != _MODULE
+            and 'site-packages' not in fichier and os.sep + 'migrations' + os.sep not in fichier)
+
+
+def _pile_du_projet():
+    """Cadres de la pile appartenant au projet, du plus profond au plus haut"""
+    cadres = []
+    cadre = sys._getframe(2)
+    while cadre is not None:
+        if _fichier_du_projet(cadre.f_code.co_filename):
+            cadres.append(cadre)
+        cadre = cadre.f_back
+    return cadres
+
+
+class DetecteurN1:
+    """execute_wrapper comptant les exécutions par (ligne du projet, empreinte SQL)"""
+
+    def __init__(self, mode, seuil, contexte):
+        self.mode = mode
+        self.seuil = seuil
+        self.contexte = contexte
+        self.tolerance = 0
+        self.compteurs = {}
+        self.signales = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not self.tolerance:
+            self.verifier(sql)
+        return execute(sql, params, many, context)
+
+    def verifier(self, sql):
+        cadres = _pile_du_projet()
+        if not cadres:
+            return
+        site = (cadres[0].f_code.co_filename, cadres[0].f_lineno)
+        cle = (site, empreinte(sql))
+        nb = self.compteurs[cle] = self.compteurs.get(cle, 0) + 1
+        if nb < self.seuil or cle in self.signales:
+            return
+        self.signales.add(cle)
+        message = (f'{nb} exécutions de la même requête depuis {site[0]}:{site[1]} '
+                   f'({self.contexte}) : {cle[1][:300]}')
+        if self.mode == 'raise':
+            raise RequetesN1(message)
+        pile = ''.join(traceback.format_list(
+            traceback.StackSummary.extract((c, c.f_lineno) for c in reversed(cadres))
+        ))
+        logger.warning('%s\n%s', message, pile)
+
+
+@contextmanager
+def surveiller(contexte='', mode=None):
+    """
+    Active la détection pour le bloc (toutes les connexions) ; mode par défaut : N1_DETECTION.
+    Produit le détecteur installé, ou None si la détection est désactivée ou déjà active.
+    """
+    mode = mode or getattr(settings, 'N1_DETECTION', 'off')
+    if mode == 'off' or _detecteur_actif.get() is not None:
+        yield None
+        return
+    detecteur = DetecteurN1(mode, getattr(settings, 'N1_THRESHOLD', 10), contexte)
+    with _activer(detecteur):
+        yield detecteur
+
+
+@contextmanager
+def _activer(detecteur):
+    jeton = _detecteur_actif.set(detecteur)
+    try:
+        with ExitStack() as pile:
+            for connexion in connections.all():
+                pile.enter_context(connexion.execute_wrapper(detecteur))
+            yield
+    finally:
+        _detecteur_actif.reset(jeton)
+
+
+@contextmanager
+def tolerer():
+    """Suspend la détection dans le bloc (boucles par lots volontaires)"""
+    detecteur = _detecteur_actif.get()
+    if detecteur is None:
+        yield
+        return
+    detecteur.tolerance += 1
+    try:
+        yield
+    finally:
+        detecteur.tolerance -= 1
+
+
+class DetectionN1Middleware:
+    """
+    Surveille chaque requête en mode 'raise', une fraction N1_SAMPLE_RATE en mode 'log'.
+    Les réponses en flux (exports) restent surveillées, avec les mêmes compteurs, pendant
+    leur itération.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = getattr(settings, 'N1_DETECTION', 'off')
+        if mode == 'log' and random.random() >= getattr(settings, 'N1_SAMPLE_RATE', 0.05):
+            return self.get_response(request)
+        with surveiller(f'{request.method} {request.path}', mode) as detecteur:
+            response = self.get_response(request)
+        if detecteur is not None and response.streaming and not getattr(response, 'is_async', False):
+            response.streaming_content = self._flux_surveille(response.streaming_content, detecteur)
+        return response
+
+    @staticmethod
+    def _flux_surveille(contenu, detecteur):
+        with _activer(detecteur):
+            yield from contenu
+
+
+class BudgetRequetesMixin:
+    """Pour les TestCase : assertBudgetRequetes(maximum) borne le nombre de requêtes d'un bloc"""
+
+    @contextmanager
+    def assertBudgetRequetes(self, maximum, using='default'):
+        with CaptureQueriesContext(connections[using]) as requetes:
+            yield
+        nb = len(requetes)
+        if nb > maximum:
+            detail = '\n'.join(f'{i}. {q["sql"]}' for i, q in enumerate(requetes.captured_queries, 1))
+            self.fail(f'{nb} requêtes exécutées pour un budget de {maximum} :\n{detail}')
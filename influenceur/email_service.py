@@ -1,50 +1,105 @@
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
+from django.template.loader import get_template, render_to_string
 from django.conf import settings
 from django.utils.html import strip_tags
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+
+@lru_cache(maxsize=None)
+def gabarit(nom):
+    """Template compilé une fois par processus (rendu des emails en masse)"""
+    return get_template(nom)
+
+
+class LimiteurDebit:
+    """
+    Limite le débit d'envoi à `par_seconde` messages par seconde, tous threads confondus
+    (les envois sont espacés régulièrement). Sans limite si `par_seconde` est nul.
+    """
+
+    def __init__(self, par_seconde=None):
+        self.intervalle = 1 / par_seconde if par_seconde else 0
+        self.prochain = time.monotonic()
+        self.verrou = threading.Lock()
+
+    def attendre(self):
+        if not self.intervalle:
+            return
+        with self.verrou:
+            maintenant = time.monotonic()
+            attente = self.prochain - maintenant
+            self.prochain = max(self.prochain, maintenant) + self.intervalle
+        if attente > 0:
+            time.sleep(attente)
+
 class EmailService:
     """
     Service d'envoi d'emails pour le système d'affiliation
     """
-    
+
     @staticmethod
-    def send_affiliation_link(influenceur):
-        """
-        Envoie un email avec le lien d'affiliation à un influenceur
-        """
-        try:
-            subject = f"Votre lien d'affiliation - {influenceur.nom}"
-            
-            # Contexte pour le template
-            context = {
-                'influenceur': influenceur,
-                'affiliation_link': influenceur.get_affiliation_link(),
-                'base_url': getattr(settings, 'AFFILIATION_BASE_URL', 'http://localhost:8000'),
-                'site_name': 'Système d\'Affiliation'
-            }
-            
-            # Rendu du template HTML
-            html_message = render_to_string('influenceur/email_affiliation_link.html', context)
-            
-            # Version texte simple
-            text_message = f"""
+    def _contexte(influenceur):
+        return {
+            'influenceur': influenceur,
+            'affiliation_link': influenceur.get_affiliation_link(),
+            'base_url': getattr(settings, 'AFFILIATION_BASE_URL', 'http://localhost:8000'),
+            'site_name': 'Système d\'Affiliation'
+        }
+
+    @staticmethod
+    def contenu_affiliation_link(influenceur):
+        """Sujet, texte et HTML de l'email contenant le lien d'affiliation"""
+        subject = f"Votre lien d'affiliation - {influenceur.nom}"
+        context = EmailService._contexte(influenceur)
+        html_message = gabarit('influenceur/email_affiliation_link.html').render(context)
+        text_message = f"""
 Bonjour {influenceur.nom},
 
 Votre compte d'influenceur a été créé avec succès !
 
-Votre lien d'affiliation : {influenceur.get_affiliation_link()}
+Votre lien d'affiliation : {context['affiliation_link']}
 
 Vous pouvez utiliser ce lien pour promouvoir nos produits et gagner des commissions.
 
 Cordialement,
 L'équipe {context['site_name']}
             """.strip()
-            
-            # Envoi de l'email
+        return subject, text_message, html_message
+
+    @staticmethod
+    def contenu_welcome_email(influenceur):
+        """Sujet, texte et HTML de l'email de bienvenue"""
+        subject = f"Bienvenue dans notre programme d'affiliation - {influenceur.nom}"
+        context = EmailService._contexte(influenceur)
+        html_message = gabarit('influenceur/email_welcome.html').render(context)
+        text_message = f"""
+Bienvenue {influenceur.nom} !
+
+Nous sommes ravis de vous accueillir dans notre programme d'affiliation.
+
+Votre lien d'affiliation : {context['affiliation_link']}
+
+Commencez dès maintenant à promouvoir nos produits et à gagner des commissions !
+
+Cordialement,
+L'équipe {context['site_name']}
+            """.strip()
+        return subject, text_message, html_message
+
+    @staticmethod
+    def send_affiliation_link(influenceur):
+        """
+        Envoie immédiatement un email avec le lien d'affiliation à un influenceur
+        (les vues passent par la file d'envoi, voir mettre_en_file_creation)
+        """
+        try:
+            subject, text_message, html_message = EmailService.contenu_affiliation_link(influenceur)
             send_mail(
                 subject=subject,
                 message=text_message,
@@ -64,33 +119,10 @@ L'équipe {context['site_name']}
     @staticmethod
     def send_welcome_email(influenceur):
         """
-        Envoie un email de bienvenue à un nouvel influenceur
+        Envoie immédiatement un email de bienvenue à un nouvel influenceur
         """
         try:
-            subject = f"Bienvenue dans notre programme d'affiliation - {influenceur.nom}"
-            
-            context = {
-                'influenceur': influenceur,
-                'affiliation_link': influenceur.get_affiliation_link(),
-                'base_url': getattr(settings, 'AFFILIATION_BASE_URL', 'http://localhost:8000'),
-                'site_name': 'Système d\'Affiliation'
-            }
-            
-            html_message = render_to_string('influenceur/email_welcome.html', context)
-            
-            text_message = f"""
-Bienvenue {influenceur.nom} !
-
-Nous sommes ravis de vous accueillir dans notre programme d'affiliation.
-
-Votre lien d'affiliation : {influenceur.get_affiliation_link()}
-
-Commencez dès maintenant à promouvoir nos produits et à gagner des commissions !
-
-Cordialement,
-L'équipe {context['site_name']}
-            """.strip()
-            
+            subject, text_message, html_message = EmailService.contenu_welcome_email(influenceur)
             send_mail(
                 subject=subject,
                 message=text_message,
@@ -106,7 +138,99 @@ L'équipe {context['site_name']}
         except Exception as e:
             logger.error(f"Erreur lors de l'envoi de l'email de bienvenue à {influenceur.email}: {str(e)}")
             return False
-    
+
+    @staticmethod
+    def mettre_en_file_creation(influenceur):
+        """
+        Met en file l'email d'affiliation et l'email de bienvenue d'un nouvel influenceur.
+        Ils sont envoyés par le dispatcher (run_email_dispatcher) : la création du compte
+        ne dépend plus du serveur SMTP.
+        """
+        from .models import EmailSortant
+        return EmailSortant.mettre_en_file(influenceur, 'affiliation', 'bienvenue')
+
+    @staticmethod
+    def construire_message(email_sortant, connection=None):
+        """Message (texte + HTML) correspondant à un email de la file"""
+        subject, text_message, html_message = CONTENUS[email_sortant.type_email](email_sortant.influenceur)
+        message = EmailMultiAlternatives(
+            subject=subject,
+            body=text_message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email_sortant.destinataire],
+            connection=connection,
+        )
+        message.attach_alternative(html_message, 'text/html')
+        return message
+
+    @staticmethod
+    def _envoyer_sur_connexion(emails, limiteur):
+        """
+        Envoie `emails` sur une connexion ouverte pour eux, un message à la fois pour qu'un
+        destinataire refusé n'entraîne que sa propre nouvelle tentative.
+        Retourne [(email, erreur ou None)] ; aucun accès à la base (exécuté dans un thread).
+        """
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            # Serveur injoignable : tous ces emails sont reportés
+            logger.error(f"Connexion au serveur d'emails impossible : {str(e)}")
+            return [(email_sortant, e) for email_sortant in emails]
+
+        resultats = []
+        try:
+            for email_sortant in emails:
+                limiteur.attendre()
+                try:
+                    connection.send_messages([EmailService.construire_message(email_sortant, connection)])
+                except Exception as e:
+                    logger.error(f"Erreur lors de l'envoi de l'email {email_sortant.type_email} "
+                                 f"à {email_sortant.destinataire}: {str(e)}")
+                    resultats.append((email_sortant, e))
+                else:
+                    resultats.append((email_sortant, None))
+        finally:
+            connection.close()
+        return resultats
+
+    @staticmethod
+    def envoyer_file(taille_lot=None, campagne=None, nb_connexions=None, limiteur=None):
+        """
+        Envoie un lot d'emails de la file (d'une campagne si elle est donnée).
+        Le lot est réparti sur `nb_connexions` connexions SMTP ouvertes en parallèle
+        (EMAIL_OUTBOX_CONCURRENCY), chacune réutilisée pour tous ses messages ; le débit
+        global est borné par `limiteur` (EMAIL_OUTBOX_RATE par défaut).
+        Retourne (envoyés, échecs).
+        """
+        from .models import EmailSortant
+        taille_lot = taille_lot or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+        nb_connexions = nb_connexions or getattr(settings, 'EMAIL_OUTBOX_CONCURRENCY', 1)
+        limiteur = limiteur or LimiteurDebit(getattr(settings, 'EMAIL_OUTBOX_RATE', 0))
+
+        lot = EmailSortant.reserver_lot(taille_lot, campagne=campagne)
+        if not lot:
+            return 0, 0
+
+        parts = [lot[i::nb_connexions] for i in range(min(nb_connexions, len(lot)))]
+        if len(parts) == 1:
+            resultats = EmailService._envoyer_sur_connexion(lot, limiteur)
+        else:
+            with ThreadPoolExecutor(max_workers=len(parts)) as pool:
+                resultats = [r for part in pool.map(lambda p: EmailService._envoyer_sur_connexion(p, limiteur), parts)
+                             for r in part]
+
+        # Statuts enregistrés par le thread principal : une requête pour les envois réussis
+        envoyes = [email_sortant for email_sortant, erreur in resultats if erreur is None]
+        EmailSortant.marquer_envoyes(envoyes)
+        for email_sortant, erreur in resultats:
+            if erreur is not None:
+                email_sortant.marquer_echec(erreur)
+
+        echecs = len(resultats) - len(envoyes)
+        logger.info(f"{len(envoyes)} email(s) envoyé(s), {echecs} en échec")
+        return len(envoyes), echecs
+
     @staticmethod
     def send_commission_notification(influenceur, prospect, commission_amount):
         """
@@ -149,4 +273,11 @@ L'équipe {context['site_name']}
             
         except Exception as e:
             logger.error(f"Erreur lors de l'envoi de la notification de commission à {influenceur.email}: {str(e)}")
-            return False 
\ No newline at end of file
+            return False 
+
+
+# type d'email de la file -> construction du contenu
+CONTENUS = {
+    'affiliation': EmailService.contenu_affiliation_link,
+    'bienvenue': EmailService.contenu_welcome_email,
+}
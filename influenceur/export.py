@@ -0,0 +1,103 @@
+"""
+Exports CSV / NDJSON en flux : les lignes sont lues par lots avec `.iterator()` et
+construites par la lecture rapide (influenceur/lecture_rapide.py), la mémoire reste
+donc constante quel que soit le nombre de lignes.
+"""
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from .lecture_rapide import plan_de_lecture
+import csv
+import io
+import json
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def taille_lot_par_defaut():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def lignes(serializer_class, queryset, taille_lot=None):
+    """Itère sur les représentations des lignes, lues par lots de `taille_lot`"""
+    plan = plan_de_lecture(serializer_class)
+    taille_lot = taille_lot or taille_lot_par_defaut()
+    for ligne in queryset.values(*plan.chemins).iterator(chunk_size=taille_lot):
+        yield plan.construire(ligne)
+
+
+def formater(serializer_class, queryset, format_export='csv', taille_lot=None):
+    """
+    Produit le contenu de l'export par morceaux (un morceau par lot de lignes).
+    CSV : une ligne d'en-têtes puis une ligne par enregistrement ; NDJSON : un objet JSON par ligne.
+    """
+    taille_lot = taille_lot or taille_lot_par_defaut()
+    tampon = io.StringIO()
+    if format_export == 'csv':
+        ecrivain = csv.writer(tampon)
+        ecrivain.writerow([nom for nom, _ in plan_de_lecture(serializer_class).etapes])
+        ecrire = lambda ligne: ecrivain.writerow(ligne.values())
+    else:
+        ecrire = lambda ligne: tampon.write(json.dumps(ligne, ensure_ascii=False) + '\n')
+
+    for i, ligne in enumerate(lignes(serializer_class, queryset, taille_lot), start=1):
+        ecrire(ligne)
+        if i % taille_lot == 0:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    if tampon.tell():
+        yield tampon.getvalue()
+
+
+def reponse_export(serializer_class, queryset, format_export, nom):
+    """Réponse HTTP en flux, proposée au téléchargement sous `<nom>-<date>.<format>`"""
+    response = StreamingHttpResponse(
+        formater(serializer_class, queryset, format_export), content_type=FORMATS[format_export]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nom}-{timezone.localdate()}.{format_export}"'
+    return response
+
+
+def ecrire_export(serializer_class, queryset, format_export, fichier, taille_lot=None):
+    """Ecrit l'export dans un fichier ouvert en texte ; retourne le nombre de caractères écrits"""
+    taille = 0
+    for morceau in formater(serializer_class, queryset, format_export, taille_lot):
+        taille += fichier.write(morceau)
+    return taille
+
+
+class _ExportRenderer(BaseRenderer):
+    """
+    Renderer d'export pour la négociation DRF (en-tête Accept ou ?format=) : le contenu
+    est produit en flux par la vue, seules les réponses d'erreur passent ici, en JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+class CSVRenderer(_ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(_ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+RENDERERS = [JSONRenderer, CSVRenderer, NDJSONRenderer]
+
+
+def format_demande(request):
+    """Format d'export : ?type=, sinon le format négocié (Accept ou ?format=), csv par défaut"""
+    if request.GET.get('type'):
+        return request.GET['type']
+    format_negocie = getattr(request.accepted_renderer, 'format', None)
+    return format_negocie if format_negocie in FORMATS else 'csv'
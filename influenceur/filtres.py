@@ -0,0 +1,66 @@
+"""
+Filtres communs aux listes et aux exports de prospects et de remises :
+?influenceur={id}, ?statut={code}, ?depuis=AAAA-MM-JJ, ?jusqu_au=AAAA-MM-JJ (inclus).
+"""
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+class FiltreInvalide(ValueError):
+    """Paramètre de filtre mal formé (le message est destiné au client)"""
+
+
+def lire_date(params, nom):
+    """Date AAAA-MM-JJ du paramètre `nom` (None s'il est absent) ; FiltreInvalide si elle est mal formée"""
+    valeur = params.get(nom)
+    if not valeur:
+        return None
+    try:
+        jour = parse_date(valeur)
+    except ValueError:
+        jour = None
+    if jour is None:
+        raise FiltreInvalide(f'Date invalide pour « {nom} » (format AAAA-MM-JJ)')
+    return jour
+
+
+def _debut_du_jour(jour):
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def lire_filtres(params, statuts):
+    """
+    Lit les filtres depuis un dict de paramètres (request.GET ou options de commande).
+    Un statut inconnu est ignoré, comme dans les listes existantes.
+    """
+    depuis = lire_date(params, 'depuis')
+    jusqu_au = lire_date(params, 'jusqu_au')
+    if depuis and jusqu_au and depuis > jusqu_au:
+        raise FiltreInvalide('Période invalide (depuis postérieur à jusqu_au)')
+    influenceur = params.get('influenceur') or None
+    if influenceur is not None and not str(influenceur).isdigit():
+        raise FiltreInvalide('Identifiant d\'influenceur invalide')
+    statut = params.get('statut')
+    return {
+        'influenceur': influenceur,
+        'statut': statut if statut in statuts else None,
+        'depuis': depuis,
+        'jusqu_au': jusqu_au,
+    }
+
+
+def appliquer_filtres(queryset, filtres, champ_date):
+    """
+    Applique les filtres à un queryset. La période est traduite en bornes sur
+    `champ_date` (et non en __date) pour rester servie par les index sur la date.
+    """
+    if filtres['influenceur']:
+        queryset = queryset.filter(influenceur_id=filtres['influenceur'])
+    if filtres['statut']:
+        queryset = queryset.filter(statut=filtres['statut'])
+    if filtres['depuis']:
+        queryset = queryset.filter(**{f'{champ_date}__gte': _debut_du_jour(filtres['depuis'])})
+    if filtres['jusqu_au']:
+        queryset = queryset.filter(**{f'{champ_date}__lt': _debut_du_jour(filtres['jusqu_au'] + timedelta(days=1))})
+    return queryset
@@ -0,0 +1,197 @@
+"""
+Génération de données synthétiques réalistes (commande seed_affiliation, benchmarks).
+Les lignes sont produites par lots et insérées avec bulk_create : aucun save() par ligne,
+un seul hachage de mot de passe pour tous les influenceurs. Sur une base sans prospects,
+le résultat ne dépend que de la graine (et non de la taille des lots) : deux générations
+avec la même graine et les mêmes volumes sont identiques. Les numéros de téléphone déjà
+présents en base sont sautés (telephones_libres) : les numéros attribués dépendent alors
+aussi des données existantes.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+import random
+import zlib
+
+# Répartitions (en poids relatifs) des statuts et des champs du formulaire
+REPARTITION_STATUTS = {'en_attente': 45, 'confirme': 40, 'rejeter': 15}
+REPARTITION_NIVEAUX = {'bac': 55, 'licence': 30, 'master': 10, 'autre': 5}
+# Séries du bac malien : les séries scientifiques et économiques dominent les inscriptions
+REPARTITION_SERIES_BAC = {'tsexp': 30, 'tse': 20, 'tseco': 20, 'tss': 15, 'tll': 12, 'autre': 3}
+REPARTITION_FILIERES = {
+    'ig': 14, 'gl': 12, 'fc': 10, 'rit': 8, 'gc': 8, 'mm': 8, 'irs': 6, 'ba': 6, 'grh': 6,
+    'gpg': 5, 'glt': 5, 'cim': 5, 'gea': 4, 'audit': 3, 'autre': 2,
+}
+# Textes libres des choix « autre »
+AUTRES = {
+    'niveau_etude': ('BTS', 'DUT', 'Doctorat', 'DEF'),
+    'serie_bac': ('TAL', 'TI', 'Bac technique'),
+    'filiere_souhaitee': ('Agronomie', 'Médecine', 'Droit des affaires'),
+}
+PRENOMS = ('Awa', 'Moussa', 'Fanta', 'Ibrahim', 'Aminata', 'Seydou', 'Mariam', 'Oumar', 'Kadiatou', 'Bakary',
+           'Assitan', 'Boubacar', 'Rokia', 'Mamadou', 'Djeneba', 'Souleymane')
+NOMS = ('Traoré', 'Diarra', 'Keita', 'Coulibaly', 'Sidibé', 'Koné', 'Diallo', 'Touré', 'Sangaré', 'Cissé',
+        'Dembélé', 'Maïga', 'Samaké', 'Doumbia')
+
+# Numéros maliens à 8 chiffres (60 000 000 à 99 999 999) : i -> PREMIER_TELEPHONE + (décalage + i * PAS) mod
+# NB_TELEPHONES est une bijection (PAS premier avec NB_TELEPHONES), donc sans doublon dans une génération
+PREMIER_TELEPHONE = 60_000_000
+NB_TELEPHONES = 40_000_000
+PAS_TELEPHONE = 7919
+MONTANT_PAR_PROSPECT = Decimal('10.00')
+
+
+class Tirage:
+    """Tirage pondéré rapide (poids cumulés calculés une fois)"""
+
+    def __init__(self, repartition):
+        self.codes = list(repartition)
+        self.cumuls = list(accumulate(repartition.values()))
+
+    def __call__(self, aleatoire, k):
+        return aleatoire.choices(self.codes, cum_weights=self.cumuls, k=k)
+
+
+def telephone(decalage, i):
+    return f'{PREMIER_TELEPHONE + (decalage + i * PAS_TELEPHONE) % NB_TELEPHONES:08d}'
+
+
+def telephones_libres(decalage, depart, k):
+    """
+    `k` numéros de la suite à partir du rang `depart` non utilisés par un prospect existant
+    (une requête par lot de candidats). Retourne (numéros, rang suivant).
+    """
+    from prospect.models import Prospect
+
+    numeros = []
+    while len(numeros) < k:
+        candidats = [telephone(decalage, depart + n) for n in range(k - len(numeros))]
+        depart += len(candidats)
+        pris = set(Prospect.objects.filter(telephone__in=candidats).values_list('telephone', flat=True))
+        numeros += [numero for numero in candidats if numero not in pris]
+    return numeros, depart
+
+
+def code_affiliation(prefixe, i):
+    return f'{prefixe}x{i:07d}'
+
+
+def generer(nb_influenceurs, nb_prospects, graine=0, jours=365, prefixe=None, taille_lot=5000,
+            mot_de_passe='seed', progression=None):
+    """
+    Génère `nb_influenceurs` influenceurs (quelques-uns apportent la plupart des prospects),
+    `nb_prospects` prospects inscrits sur les `jours` derniers jours et une remise par
+    influenceur et par mois pour les prospects confirmés depuis plus d'une semaine (payée
+    pour les mois révolus). `prefixe` (alphanumérique, « s<graine> » par défaut) rend uniques
+    emails et codes d'affiliation ; `progression(table, nb_lignes)` est appelé après chaque lot.
+    Les statistiques (InfluenceurStats, cumuls) ne sont pas maintenues : voir semer_statistiques.
+    Retourne les influenceurs, du plus actif au moins actif.
+    """
+    from prospect.models import Prospect
+    from remise.models import Remise
+    from .models import Influenceur
+
+    aleatoire = random.Random(graine)
+    prefixe = prefixe or f's{graine}'
+    decalage = zlib.crc32(prefixe.encode()) % NB_TELEPHONES
+    maintenant = timezone.now()
+    progression = progression or (lambda table, nb: None)
+
+    # Un seul hachage pour tous les comptes (pas de save() par influenceur)
+    hash_mot_de_passe = make_password(mot_de_passe)
+    influenceurs = []
+    for debut in range(0, nb_influenceurs, taille_lot):
+        influenceurs += Influenceur.objects.bulk_create([
+            Influenceur(nom=f'{aleatoire.choice(PRENOMS)} {aleatoire.choice(NOMS)}',
+                        email=f'{prefixe}-i{i}@example.com', code_affiliation=code_affiliation(prefixe, i),
+                        password=hash_mot_de_passe, is_active=i == 0 or aleatoire.random() < 0.95,
+                        date_creation=maintenant - timedelta(days=jours + aleatoire.randrange(30)))
+            for i in range(debut, min(debut + taille_lot, nb_influenceurs))
+        ])
+        progression('influenceurs', len(influenceurs))
+
+    # Poids décroissants : le premier influenceur est le plus actif
+    tirage_influenceurs = Tirage({i.pk: 1 / (rang + 1) ** 0.8 for rang, i in enumerate(influenceurs)})
+    tirages = {
+        'statut': Tirage(REPARTITION_STATUTS),
+        'niveau_etude': Tirage(REPARTITION_NIVEAUX),
+        'serie_bac': Tirage(REPARTITION_SERIES_BAC),
+        'filiere_souhaitee': Tirage(REPARTITION_FILIERES),
+        'influenceur': tirage_influenceurs,
+    }
+    # Un flux par champ tiré par lot : les valeurs ne dépendent pas de taille_lot
+    flux = {champ: random.Random(f'{graine}-{champ}') for champ in tirages}
+
+    limite_remise = maintenant - timedelta(days=7)
+    mois_courant = maintenant.date().replace(day=1)
+    remises = {}      # (influenceur_id, mois) -> remise
+    nb_par_remise = {}
+    nb_crees = rang_telephone = 0
+    for debut in range(0, nb_prospects, taille_lot):
+        k = min(taille_lot, nb_prospects - debut)
+        valeurs = {champ: tirage(flux[champ], k) for champ, tirage in tirages.items()}
+        telephones, rang_telephone = telephones_libres(decalage, rang_telephone, k)
+        lot, nouvelles = [], []
+        for n in range(k):
+            i = debut + n
+            niveau = valeurs['niveau_etude'][n]
+            serie = valeurs['serie_bac'][n] if niveau == 'bac' else None
+            filiere = valeurs['filiere_souhaitee'][n]
+            prospect = Prospect(
+                nom=f'{aleatoire.choice(PRENOMS)} {aleatoire.choice(NOMS)}',
+                email=f'{prefixe}-p{i}@example.com',
+                telephone=telephones[n],
+                statut=valeurs['statut'][n],
+                influenceur_id=valeurs['influenceur'][n],
+                date_inscription=maintenant - timedelta(seconds=aleatoire.randrange(jours * 86400)),
+                niveau_etude=niveau,
+                niveau_etude_autre=aleatoire.choice(AUTRES['niveau_etude']) if niveau == 'autre' else None,
+                serie_bac=serie,
+                serie_bac_autre=aleatoire.choice(AUTRES['serie_bac']) if serie == 'autre' else None,
+                filiere_souhaitee=filiere,
+                filiere_autre=aleatoire.choice(AUTRES['filiere_souhaitee']) if filiere == 'autre' else None,
+            )
+            if prospect.statut == 'confirme' and prospect.date_inscription < limite_remise:
+                cle = (prospect.influenceur_id, prospect.date_inscription.date().replace(day=1))
+                if cle not in remises:
+                    paye = cle[1] < mois_courant
+                    remises[cle] = Remise(influenceur_id=cle[0], montant=MONTANT_PAR_PROSPECT,
+                                          statut='payee' if paye else 'en_attente',
+                                          date_paiement=maintenant if paye else None,
+                                          description='Commission mensuelle (données générées)')
+                    nouvelles.append(remises[cle])
+                prospect._remise_cle = cle
+            lot.append(prospect)
+
+        with transaction.atomic():
+            Remise.objects.bulk_create(nouvelles)
+            for prospect in lot:
+                cle = getattr(prospect, '_remise_cle', None)
+                if cle is not None:
+                    prospect.remise_id = remises[cle].pk
+                    nb_par_remise[prospect.remise_id] = nb_par_remise.get(prospect.remise_id, 0) + 1
+            Prospect.objects.bulk_create(lot)
+        nb_crees += k
+        progression('prospects', nb_crees)
+
+    # Montant des remises : nombre de prospects rémunérés, une requête par lot de remises
+    remise_ids = list(nb_par_remise)
+    for debut in range(0, len(remise_ids), 500):
+        lot = remise_ids[debut:debut + 500]
+        Remise.objects.filter(pk__in=lot).update(montant=Case(
+            *[When(pk=pk, then=Value(nb_par_remise[pk] * MONTANT_PAR_PROSPECT)) for pk in lot],
+            output_field=Remise._meta.get_field('montant'),
+        ))
+    progression('remises', len(remise_ids))
+    return influenceurs
+
+
+def semer_statistiques(depuis):
+    """Reconstruit InfluenceurStats et les cumuls journaliers après une génération"""
+    from .models import InfluenceurStats, StatistiqueJournaliere
+    InfluenceurStats.reconstruire()
+    StatistiqueJournaliere.cumuler(depuis=depuis)
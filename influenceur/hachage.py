@@ -0,0 +1,79 @@
+"""
+Hachage des mots de passe des influenceurs.
+
+L'algorithme suit PASSWORD_HASHERS (le premier hache, les suivants restent reconnus : voir
+PASSWORD_HASHER dans les settings). Les hachages et vérifications s'exécutent dans un pool
+de PASSWORD_HASHING_WORKERS threads (hashlib et argon2-cffi libèrent le GIL) : au plus
+PASSWORD_HASHING_QUEUE opérations attendent une place, au-delà HachageSature est levée et la
+vue répond 503 au lieu d'occuper un worker WSGI. PASSWORD_HASHING_WORKERS=0 hache dans le
+thread appelant.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+import threading
+
+_verrou = threading.Lock()
+_pool = None  # (configuration, exécuteur, places)
+
+
+class HachageSature(Exception):
+    """Trop de hachages de mots de passe en cours ou en attente"""
+
+
+def _pool_courant():
+    """Pool et sémaphore des places, recréés si la configuration a changé"""
+    global _pool
+    configuration = (settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_QUEUE)
+    pool = _pool
+    if pool is None or pool[0] != configuration:
+        with _verrou:
+            if _pool is None or _pool[0] != configuration:
+                if _pool is not None:
+                    _pool[1].shutdown(wait=False)
+                workers, attente = configuration
+                _pool = (configuration, ThreadPoolExecutor(workers, thread_name_prefix='hachage'),
+                         threading.BoundedSemaphore(workers + attente))
+            pool = _pool
+    return pool
+
+
+def executer(fonction, *args):
+    """Exécute `fonction(*args)` dans le pool de hachage ; HachageSature si toutes les places sont prises"""
+    if settings.PASSWORD_HASHING_WORKERS <= 0:
+        return fonction(*args)
+    _, executeur, places = _pool_courant()
+    if not places.acquire(blocking=False):
+        raise HachageSature('Trop de connexions simultanées, veuillez réessayer.')
+    try:
+        return executeur.submit(fonction, *args).result()
+    finally:
+        places.release()
+
+
+def est_hache(mot_de_passe):
+    """Vrai si `mot_de_passe` est un hachage d'un des PASSWORD_HASHERS (et non un mot de passe en clair)"""
+    try:
+        identify_hasher(mot_de_passe)
+    except ValueError:
+        return False
+    return True
+
+
+def hacher(mot_de_passe):
+    """Hachage de `mot_de_passe` avec l'algorithme préféré"""
+    return executer(make_password, mot_de_passe)
+
+
+def _verifier(mot_de_passe, encode):
+    nouveau = []
+    valide = check_password(mot_de_passe, encode, setter=lambda brut: nouveau.append(make_password(brut)))
+    return valide, (nouveau[0] if nouveau else None)
+
+
+def verifier(mot_de_passe, encode):
+    """
+    (valide, nouveau_hachage) : `nouveau_hachage` est fourni quand le mot de passe est correct
+    mais haché avec un algorithme ou un coût qui n'est plus le préféré (sinon None)
+    """
+    return executer(_verifier, mot_de_passe, encode)
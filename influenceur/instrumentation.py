@@ -0,0 +1,161 @@
+"""
+Instrumentation des requêtes HTTP : pour chaque requête, vue résolue, durée totale, temps
+passé en base, nombre de requêtes SQL, requêtes répétées (même SQL exécuté plusieurs fois,
+signe d'un N+1) et taille de la réponse. Les requêtes lentes sont journalisées en JSON
+(logger influenceur.instrumentation) ; les dernières mesures de chaque vue sont gardées en
+mémoire (tampon circulaire, par processus) pour la vue instrumentation_vues.
+"""
+from collections import deque
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from .benchmark import percentile
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+VUE_NON_RESOLUE = '<non résolue>'
+
+_mesures = {}  # nom de vue -> deque des dernières mesures
+_verrou = threading.Lock()
+
+
+class CompteurRequetes:
+    """
+    execute_wrapper comptant les requêtes SQL, leur durée cumulée et les répétitions
+    d'un même SQL (paramètres exclus)
+    """
+
+    def __init__(self):
+        self.nb_requetes = 0
+        self.nb_repetees = 0
+        self.duree_db = 0.0
+        self._vues = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duree_db += time.perf_counter() - debut
+            self.nb_requetes += 1
+            if sql in self._vues:
+                self.nb_repetees += 1
+            else:
+                self._vues.add(sql)
+
+
+def compter_requetes(compteur):
+    """Installe `compteur` sur toutes les connexions (à utiliser avec `with`)"""
+    pile = ExitStack()
+    for connexion in connections.all():
+        pile.enter_context(connexion.execute_wrapper(compteur))
+    return pile
+
+
+def enregistrer(mesure):
+    """Ajoute une mesure au tampon circulaire de sa vue"""
+    taille = getattr(settings, 'INSTRUMENTATION_BUFFER_SIZE', 1000)
+    with _verrou:
+        tampon = _mesures.get(mesure['vue'])
+        if tampon is None or tampon.maxlen != taille:
+            tampon = _mesures[mesure['vue']] = deque(tampon or (), maxlen=taille)
+        tampon.append(mesure)
+
+
+def percentiles():
+    """Percentiles des mesures en mémoire, par vue (pour ce processus)"""
+    with _verrou:
+        copies = {vue: list(tampon) for vue, tampon in _mesures.items()}
+    resultat = {}
+    for vue, mesures in sorted(copies.items()):
+        durees = [m['duree_ms'] for m in mesures]
+        durees_db = [m['duree_db_ms'] for m in mesures]
+        resultat[vue] = {
+            'nb_mesures': len(mesures),
+            'duree_ms': {f'p{p}': percentile(durees, p) for p in (50, 95, 99)},
+            'duree_db_ms': {f'p{p}': percentile(durees_db, p) for p in (50, 95, 99)},
+            'requetes_max': max(m['requetes'] for m in mesures),
+            'requetes_repetees_max': max(m['requetes_repetees'] for m in mesures),
+        }
+    return resultat
+
+
+def reinitialiser():
+    with _verrou:
+        _mesures.clear()
+
+
+class InstrumentationMiddleware:
+    """
+    Mesure chaque requête (voir le module). Réglages : SLOW_REQUEST_THRESHOLD_MS (seuil de
+    journalisation, 0 pour tout journaliser), SERVER_TIMING_HEADER (ajoute l'en-tête
+    Server-Timing) et INSTRUMENTATION_BUFFER_SIZE (mesures gardées par vue).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        compteur = CompteurRequetes()
+        debut = time.perf_counter()
+        with compter_requetes(compteur):
+            response = self.get_response(request)
+
+        if response.streaming and not getattr(response, 'is_async', False):
+            # Réponse en flux (exports) : les requêtes SQL sont exécutées pendant l'itération,
+            # la mesure est enregistrée quand le flux est terminé (ou interrompu)
+            response.streaming_content = self._flux_mesure(
+                response.streaming_content, compteur,
+                lambda taille: self._terminer(request, response, compteur, debut, taille),
+            )
+            mesure = self._mesure(request, response, compteur, debut, None)
+        else:
+            taille = None if response.streaming else len(response.content)
+            mesure = self._terminer(request, response, compteur, debut, taille)
+
+        if getattr(settings, 'SERVER_TIMING_HEADER', False):
+            # Envoyé avec les en-têtes : pour un flux, ne couvre que la préparation de la réponse
+            response['Server-Timing'] = (
+                f'app;dur={mesure["duree_ms"]}, '
+                f'db;dur={mesure["duree_db_ms"]};desc="{mesure["requetes"]} requete(s)"'
+            )
+        return response
+
+    @staticmethod
+    def _flux_mesure(contenu, compteur, terminer):
+        taille = 0
+        try:
+            with compter_requetes(compteur):
+                for morceau in contenu:
+                    taille += len(morceau)
+                    yield morceau
+        finally:
+            terminer(taille)
+
+    @staticmethod
+    def _mesure(request, response, compteur, debut, taille):
+        resolution = getattr(request, 'resolver_match', None)
+        return {
+            'vue': resolution.view_name if resolution else VUE_NON_RESOLUE,
+            'methode': request.method,
+            'statut': response.status_code,
+            'duree_ms': round((time.perf_counter() - debut) * 1000, 2),
+            'duree_db_ms': round(compteur.duree_db * 1000, 2),
+            'requetes': compteur.nb_requetes,
+            'requetes_repetees': compteur.nb_repetees,
+            'taille_octets': taille,
+        }
+
+    def _terminer(self, request, response, compteur, debut, taille):
+        """Enregistre la mesure de la requête et la journalise si elle est lente"""
+        mesure = self._mesure(request, response, compteur, debut, taille)
+        enregistrer(mesure)
+
+        seuil = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500)
+        if mesure['duree_ms'] >= seuil:
+            logger.warning(json.dumps({'evenement': 'requete_lente', 'chemin': request.path, **mesure}))
+        return mesure
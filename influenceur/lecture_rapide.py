@@ -0,0 +1,139 @@
+"""
+Lecture rapide des listes : les lignes sont construites directement depuis `.values()`
+en suivant un plan compilé une fois par serializer, sans instancier de modèle ni de
+champ DRF par ligne. Le JSON produit est identique à celui du serializer d'origine
+(même ordre de clés, mêmes représentations), ce que vérifient les tests de parité.
+"""
+from functools import lru_cache
+from operator import itemgetter
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.fields.files import FileField as ModelFileField
+from rest_framework import fields as drf_fields
+from rest_framework import relations, serializers
+
+# Champs dont la représentation est la valeur renvoyée par la base
+CHAMPS_IDENTITE = (
+    drf_fields.IntegerField,
+    drf_fields.CharField,
+    drf_fields.ChoiceField,
+    drf_fields.BooleanField,
+    drf_fields.ReadOnlyField,
+    relations.PrimaryKeyRelatedField,
+)
+# Champs dont la représentation est calculée par le champ DRF, valeur par valeur
+CHAMPS_CONVERTIS = (
+    drf_fields.DateTimeField,
+    drf_fields.DateField,
+    drf_fields.DecimalField,
+    drf_fields.FloatField,
+)
+
+
+class PlanDeLecture:
+    """
+    Plan de construction des lignes d'un serializer : `chemins` à passer à `.values()`
+    et `construire(ligne)` qui transforme un dict de `.values()` en représentation.
+    """
+
+    def __init__(self, serializer, prefixe=''):
+        self.chemins = []
+        self.etapes = []
+        model = serializer.Meta.model
+        for champ in serializer._readable_fields:
+            self.etapes.append((champ.field_name, self._compiler(champ, model, prefixe)))
+
+    def _chemin(self, chemin):
+        if chemin not in self.chemins:
+            self.chemins.append(chemin)
+        return chemin
+
+    def _compiler(self, champ, model, prefixe):
+        source = champ.source_attrs
+        if len(source) > 1 and (source[-1].startswith('get_')
+                                or not isinstance(champ, CHAMPS_IDENTITE + CHAMPS_CONVERTIS)):
+            raise ImproperlyConfigured(f'Lecture rapide : source « {champ.source} » non supportée')
+        # Source pointée (ex. influenceur.nom) : lue à travers la relation. DRF omet la clé
+        # quand une relation nullable est vide, sauf avec allow_null=True (valeur None)
+        modele_relation = model
+        for relation in source[:-1]:
+            champ_relation = modele_relation._meta.get_field(relation)
+            if champ_relation.null and not champ.allow_null:
+                raise ImproperlyConfigured(
+                    f'Lecture rapide : « {champ.field_name} » traverse une relation nullable, allow_null=True requis'
+                )
+            modele_relation = champ_relation.related_model
+        nom = '__'.join(source)
+
+        # Serializer imbriqué : sous-plan sur la relation, None si la relation est vide
+        if isinstance(champ, serializers.Serializer):
+            sous_plan = PlanDeLecture(champ, f'{prefixe}{nom}__')
+            for chemin in sous_plan.chemins:
+                self._chemin(chemin)
+            cle = self._chemin(f'{prefixe}{nom}__{champ.Meta.model._meta.pk.name}')
+            construire = sous_plan.construire
+            return lambda ligne: None if ligne[cle] is None else construire(ligne)
+
+        # Libellé d'un choix (get_<champ>_display), table calculée une fois
+        if nom.startswith('get_') and nom.endswith('_display'):
+            return self._compiler_libelle(model, nom[4:-8], prefixe)
+
+        cle = self._chemin(prefixe + nom)
+        if isinstance(champ, CHAMPS_IDENTITE):
+            return itemgetter(cle)
+
+        representer = champ.to_representation
+        if isinstance(champ, drf_fields.FileField) and len(source) == 1:
+            champ_modele = model._meta.get_field(nom)
+            if not isinstance(champ_modele, ModelFileField):
+                raise ImproperlyConfigured(f'Lecture rapide : champ fichier « {nom} » non supporté')
+            fichier = champ_modele.attr_class
+            return lambda ligne: representer(fichier(None, champ_modele, ligne[cle])) if ligne[cle] else None
+        if isinstance(champ, CHAMPS_CONVERTIS):
+            return lambda ligne: None if ligne[cle] is None else representer(ligne[cle])
+        raise ImproperlyConfigured(
+            f'Lecture rapide : champ « {champ.field_name} » ({type(champ).__name__}) non supporté'
+        )
+
+    def _compiler_libelle(self, model, nom, prefixe):
+        """
+        Reproduit get_<nom>_display, y compris les surcharges déclarées par le modèle
+        dans CHAMPS_AUTRE (texte libre renvoyé à la place du libellé de « autre »).
+        """
+        libelles = {code: str(libelle) for code, libelle in model._meta.get_field(nom).flatchoices}
+        cle = self._chemin(prefixe + nom)
+        champ_autre = getattr(model, 'CHAMPS_AUTRE', {}).get(nom)
+        if champ_autre is None:
+            return lambda ligne: None if ligne[cle] is None else libelles.get(ligne[cle], ligne[cle])
+
+        cle_autre = self._chemin(prefixe + champ_autre)
+
+        def libelle(ligne):
+            code = ligne[cle]
+            if code == 'autre' and ligne[cle_autre]:
+                return ligne[cle_autre]
+            return None if code is None else libelles.get(code, code)
+        return libelle
+
+    def construire(self, ligne):
+        return {nom: etape(ligne) for nom, etape in self.etapes}
+
+
+@lru_cache(maxsize=256)
+def _plan(serializer_class, expand):
+    return PlanDeLecture(serializer_class(context={'expand': expand}))
+
+
+def plan_de_lecture(serializer_class, expand=()):
+    """
+    Plan (mis en cache) pour un serializer et un ensemble de détails demandés.
+    Seuls les détails déclarés par le serializer (champs_depliables) comptent : les valeurs
+    inconnues de ?expand= ne créent pas de nouvelle entrée dans le cache.
+    """
+    depliables = getattr(serializer_class, 'champs_depliables', {})
+    return _plan(serializer_class, frozenset(expand).intersection(depliables))
+
+
+def serialiser(serializer_class, queryset, expand=()):
+    """Equivalent rapide de `serializer_class(queryset, many=True).data`"""
+    plan = plan_de_lecture(serializer_class, expand)
+    return [plan.construire(ligne) for ligne in queryset.values(*plan.chemins)]
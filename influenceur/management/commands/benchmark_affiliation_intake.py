@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from influenceur.benchmark import donnees_jetables, creer_jeu_de_donnees, percentile
+from prospect.models import InscriptionEnAttente
+from prospect.views import affiliation_form_view
+import json
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = ('Test de charge du formulaire d\'affiliation : soumissions par seconde, latence et '
+            'requêtes par soumission, en inscription directe et en mode file (plus le débit d\'import)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=2000, help='Nombre de soumissions par mode')
+        parser.add_argument('--duplicates', type=float, default=0.05,
+                            help='Part de soumissions en double (défaut : 0.05)')
+        parser.add_argument('--mode', choices=['direct', 'file', 'tous'], default='tous')
+        parser.add_argument('--batch-size', type=int, default=500, help='Taille des lots d\'import (mode file)')
+
+    def soumissions(self, nb, part_doublons, graine=0):
+        aleatoire = random.Random(graine)
+        corps = []
+        for i in range(nb):
+            n = aleatoire.randrange(i) if i and aleatoire.random() < part_doublons else i
+            corps.append(json.dumps({
+                'nom': f'Prospect {n}', 'telephone': f'9{n:07d}', 'email': f'charge-{n}@example.com',
+                'niveau_etude': 'bac', 'serie_bac': 'tse', 'filiere_souhaitee': 'ig',
+            }))
+        return corps
+
+    def handle(self, *args, **options):
+        modes = ['direct', 'file'] if options['mode'] == 'tous' else [options['mode']]
+        usine = RequestFactory()
+        self.stdout.write(f'{"mode":<8}{"soumis/s":>10}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+                          f'{"req/soumis":>12}{"acceptés":>9}{"409":>6}')
+        for mode in modes:
+            with donnees_jetables(), override_settings(AFFILIATION_INTAKE_BUFFERED=(mode == 'file')):
+                code = creer_jeu_de_donnees(0, nb_influenceurs=1)[0].code_affiliation
+                corps = self.soumissions(options['submissions'], options['duplicates'])
+                durees, statuts = [], {}
+                reset_queries()
+                with CaptureQueriesContext(connection) as requetes:
+                    debut = time.perf_counter()
+                    for contenu in corps:
+                        requete = usine.post(f'/affiliation/{code}/', contenu, content_type='application/json')
+                        t0 = time.perf_counter()
+                        reponse = affiliation_form_view(requete, code)
+                        durees.append(time.perf_counter() - t0)
+                        statuts[reponse.status_code] = statuts.get(reponse.status_code, 0) + 1
+                    total = time.perf_counter() - debut
+                    nb_requetes = len(requetes)
+
+                acceptees = statuts.get(200, 0) + statuts.get(202, 0)
+                self.stdout.write(
+                    f'{mode:<8}{len(corps) / total:>10.0f}{percentile(durees, 50) * 1000:>9.2f}'
+                    f'{percentile(durees, 95) * 1000:>9.2f}{percentile(durees, 99) * 1000:>9.2f}'
+                    f'{nb_requetes / len(corps):>12.1f}{acceptees:>9}{statuts.get(409, 0):>6}'
+                )
+
+                if mode == 'file':
+                    debut = time.perf_counter()
+                    importees = conflits = 0
+                    while True:
+                        resultat = InscriptionEnAttente.importer(options['batch_size'])
+                        if not any(resultat.values()):
+                            break
+                        importees += resultat['importees']
+                        conflits += resultat['conflits']
+                    duree = time.perf_counter() - debut
+                    self.stdout.write(f'  import : {importees} prospect(s), {conflits} conflit(s), '
+                                      f'{importees / duree if duree else 0:.0f} prospects/s')
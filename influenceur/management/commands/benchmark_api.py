@@ -0,0 +1,244 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from influenceur.benchmark import donnees_jetables, semer, percentile
+from prospect.models import Prospect
+from remise.models import Remise
+import django
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+
+def cas_mesures(influenceurs, prefixe):
+    """
+    Cas mesurés : nom -> fonction(i) retournant (méthode, url, données) pour la i-ème requête
+    (méthode 'get', 'post' en JSON ou 'multipart').
+    Les vues qui modifient les données reçoivent un objet différent à chaque requête.
+    """
+    principal = influenceurs[0]
+    en_attente = iter(Prospect.objects.filter(statut='en_attente').order_by('pk').values_list('pk', flat=True))
+    a_payer = iter(Remise.objects.filter(statut='en_attente').order_by('pk').values_list('pk', flat=True))
+    a_remunerer = iter(
+        Prospect.objects.filter(statut='confirme', remise__isnull=True)
+        .order_by('influenceur_id').values_list('influenceur_id', flat=True).distinct()
+    )
+
+    def suivant(iterateur):
+        # Jeu de données épuisé : la vue répond alors 404 (signalé dans les résultats)
+        return next(iterateur, 0)
+
+    return {
+        # influenceur/views.py
+        'influenceurs_liste': lambda i: ('get', reverse('influenceur_view'), None),
+        'influenceur_creation': lambda i: ('post', reverse('influenceur_view'), {
+            'nom': f'Nouveau {i}', 'email': f'{prefixe}-nouveau-{i}@example.com', 'password': 'benchmark'}),
+        'influenceur_detail': lambda i: ('get', reverse('influenceur_detail', args=[principal.pk]), None),
+        'influenceur_dashboard': lambda i: ('get', reverse('influenceur_dashboard', args=[principal.pk]), None),
+        'influenceur_prospects': lambda i: ('get', reverse('influenceur_prospects', args=[principal.pk]), None),
+        'influenceur_remises': lambda i: ('get', reverse('influenceur_remises', args=[principal.pk]), None),
+        'dashboard_global': lambda i: ('get', reverse('dashboard_global_admin'), None),
+        'evolution_mois': lambda i: ('get', reverse('statistiques_evolution') + '?granularite=mois', None),
+        'cache_statistiques': lambda i: ('get', reverse('cache_statistiques'), None),
+        'influenceur_login': lambda i: ('post', reverse('influenceur_login'), {
+            'email': principal.email, 'password': 'benchmark'}),
+        # prospect/views.py
+        'prospects_liste': lambda i: ('get', reverse('prospect_view'), None),
+        'prospects_confirmes': lambda i: ('get', reverse('prospect_view') + '?statut=confirme', None),
+        'prospects_export_csv': lambda i: ('get', reverse('prospects_export') + f'?type=csv&influenceur={principal.pk}', None),
+        'prospect_detail': lambda i: ('get', reverse('prospect_detail', args=[
+            Prospect.objects.filter(influenceur=principal).values_list('pk', flat=True).first()]), None),
+        'prospect_valider': lambda i: ('post', reverse('prospect_valider', args=[suivant(en_attente)]), None),
+        'prospects_sans_remise': lambda i: ('get', reverse('prospects_sans_remise'), None),
+        'prospects_statistiques': lambda i: ('get', reverse('prospects_statistiques'), None),
+        'affiliation_form': lambda i: ('post', reverse('affiliation_form', args=[principal.code_affiliation]), {
+            'nom': f'Visiteur {i}', 'telephone': f'9{i:07d}', 'email': f'{prefixe}-visiteur-{i}@example.com',
+            'filiere_souhaitee': 'ig'}),
+        # remise/views.py
+        'remises_liste': lambda i: ('get', reverse('remise_view'), None),
+        'remises_export_csv': lambda i: ('get', reverse('remises_export') + '?type=csv', None),
+        'remise_payer': lambda i: ('multipart', reverse('remise_payer', args=[suivant(a_payer)]), {}),
+        'calculer_remises_automatiques': lambda i: ('post', reverse('calculer_remises_automatiques'), {}),
+        'calculer_remise_influenceur': lambda i: ('post', reverse(
+            'calculer_remise_influenceur', args=[suivant(a_remunerer)]), {}),
+        'statistiques_remises': lambda i: ('get', reverse('statistiques_remises'), None),
+    }
+
+
+def commit_courant():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=settings.BASE_DIR, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Benchmark des vues de l\'API sur un jeu de données réaliste (annulé à la fin) : latence '
+            '(p50/p95/p99), requêtes SQL et mémoire allouée par vue, résultats en JSON comparables entre commits')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--influenceurs', type=int, default=50, help='Influenceurs générés (défaut : 50)')
+        parser.add_argument('--prospects', type=int, default=5000, help='Prospects générés (défaut : 5000)')
+        parser.add_argument('--seed', type=int, default=0, help='Graine du jeu de données')
+        parser.add_argument('--repeat', type=int, default=30, help='Requêtes mesurées par vue (défaut : 30)')
+        parser.add_argument('--warmup', type=int, default=3, help='Requêtes de chauffe par vue (défaut : 3)')
+        parser.add_argument('--only', help='Vues à mesurer, séparées par des virgules')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Conserve le cache entre les requêtes (par défaut il est vidé avant chacune)')
+        parser.add_argument('--output', help='Fichier JSON des résultats')
+        parser.add_argument('--compare', help='Fichier JSON de référence (exécution précédente)')
+        parser.add_argument('--threshold', type=float, default=20,
+                            help='Régression signalée au-delà de ce pourcentage sur le p50 (défaut : 20)')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Termine en erreur si une régression est détectée')
+
+    def handle(self, *args, **options):
+        reference = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as fichier:
+                reference = json.load(fichier)
+
+        hotes = [*settings.ALLOWED_HOSTS, 'testserver']
+        # Les réponses 4xx attendues (jeu de données épuisé) ne sont pas journalisées
+        journal_requetes = logging.getLogger('django.request')
+        niveau = journal_requetes.level
+        journal_requetes.setLevel(logging.ERROR)
+        try:
+            self.executer(options, hotes, reference)
+        finally:
+            journal_requetes.setLevel(niveau)
+
+    def executer(self, options, hotes, reference):
+        with donnees_jetables(), override_settings(ALLOWED_HOSTS=hotes):
+            debut = time.perf_counter()
+            influenceurs = semer(options['influenceurs'], options['prospects'], graine=options['seed'])
+            duree_semis = time.perf_counter() - debut
+            admin = User.objects.create_superuser(f'bench-admin-{timezone.now():%H%M%S%f}', '', 'benchmark')
+            client = APIClient()
+            client.force_authenticate(user=admin)
+
+            tous = cas_mesures(influenceurs, f'bench{options["seed"]}')
+            noms = options['only'].split(',') if options['only'] else list(tous)
+            inconnus = set(noms) - set(tous)
+            if inconnus:
+                raise CommandError(f'Vue(s) inconnue(s) : {", ".join(sorted(inconnus))} (disponibles : {", ".join(tous)})')
+
+            self.stdout.write(f'{"vue":<32}{"p50":>9}{"p95":>9}{"p99":>9}{"SQL":>8}{"mémoire":>12}  statuts')
+            resultats = {}
+            for nom in noms:
+                resultats[nom] = self.mesurer(client, tous[nom], options)
+                self.afficher(nom, resultats[nom], (reference or {}).get('resultats', {}).get(nom), options['threshold'])
+
+        rapport = {
+            'meta': {
+                'commit': commit_courant(),
+                'date': timezone.now().isoformat(),
+                'base': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'influenceurs': options['influenceurs'],
+                'prospects': options['prospects'],
+                'seed': options['seed'],
+                'repetitions': options['repeat'],
+                'cache_conserve': options['warm_cache'],
+                'duree_semis_s': round(duree_semis, 2),
+            },
+            'resultats': resultats,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fichier:
+                json.dump(rapport, fichier, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Résultats écrits dans {options["output"]}'))
+
+        if reference is not None:
+            regressions = [nom for nom, r in resultats.items()
+                           if self.variation(r, reference['resultats'].get(nom), options['threshold'])]
+            if regressions:
+                message = f'Régression(s) au-delà de {options["threshold"]:g} % : {", ".join(regressions)}'
+                if options['fail_on_regression']:
+                    raise CommandError(message)
+                self.stdout.write(self.style.WARNING(message))
+
+    def requete(self, client, cas, i, options):
+        methode, url, donnees = cas(i)
+        if not options['warm_cache']:
+            cache.clear()
+        if methode == 'get':
+            reponse = client.get(url)
+        elif methode == 'multipart':
+            reponse = client.post(url, donnees, format='multipart')
+        else:
+            reponse = client.post(url, json.dumps(donnees) if donnees is not None else None,
+                                  content_type='application/json')
+        # Réponses en flux (exports) : le coût comprend la production du contenu
+        taille = sum(len(morceau) for morceau in reponse.streaming_content) if reponse.streaming else len(reponse.content)
+        return reponse.status_code, taille
+
+    def mesurer(self, client, cas, options):
+        i = 0
+        for _ in range(options['warmup']):
+            self.requete(client, cas, i, options)
+            i += 1
+
+        durees, nb_requetes, statuts = [], [], {}
+        for _ in range(options['repeat']):
+            reset_queries()
+            with CaptureQueriesContext(connection) as requetes:
+                debut = time.perf_counter()
+                statut, taille = self.requete(client, cas, i, options)
+                durees.append(time.perf_counter() - debut)
+            nb_requetes.append(len(requetes))
+            statuts[str(statut)] = statuts.get(str(statut), 0) + 1
+            i += 1
+
+        # Mémoire : passage séparé, tracemalloc ralentit l'exécution
+        tracemalloc.start()
+        try:
+            self.requete(client, cas, i, options)
+            _, pic = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'p50_ms': round(percentile(durees, 50) * 1000, 3),
+            'p95_ms': round(percentile(durees, 95) * 1000, 3),
+            'p99_ms': round(percentile(durees, 99) * 1000, 3),
+            'moyenne_ms': round(statistics.mean(durees) * 1000, 3),
+            'requetes': round(statistics.median(nb_requetes)),
+            'requetes_max': max(nb_requetes),
+            'memoire_pic_ko': round(pic / 1024, 1),
+            'taille_reponse_ko': round(taille / 1024, 1),
+            'statuts': statuts,
+        }
+
+    @staticmethod
+    def variation(resultat, reference, seuil):
+        """Vrai si le p50 ou le nombre de requêtes a augmenté au-delà du seuil"""
+        if not reference:
+            return False
+        plus_lent = reference['p50_ms'] and (resultat['p50_ms'] - reference['p50_ms']) * 100 / reference['p50_ms'] > seuil
+        return bool(plus_lent or resultat['requetes'] > reference['requetes'])
+
+    def afficher(self, nom, resultat, reference, seuil):
+        ligne = (f'{nom:<32}{resultat["p50_ms"]:>9.2f}{resultat["p95_ms"]:>9.2f}{resultat["p99_ms"]:>9.2f} ms'
+                 f'{resultat["requetes"]:>5} req{resultat["memoire_pic_ko"]:>9.0f} Ko  '
+                 f'{",".join(f"{s}x{n}" for s, n in resultat["statuts"].items())}')
+        if reference:
+            ecart = (resultat['p50_ms'] - reference['p50_ms']) * 100 / reference['p50_ms'] if reference['p50_ms'] else 0
+            ligne += f'  (p50 {ecart:+.0f} %, requêtes {reference["requetes"]} -> {resultat["requetes"]})'
+            if self.variation(resultat, reference, seuil):
+                self.stdout.write(self.style.WARNING(ligne))
+                return
+        self.stdout.write(ligne)
@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hashers, make_password
+from django.core.management.base import BaseCommand
+from influenceur.benchmark import percentile
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = ('Débit de chaque algorithme de PASSWORD_HASHERS sur cette machine : vérifications par '
+            'seconde selon le nombre de threads (choix de PASSWORD_HASHER et PASSWORD_HASHING_WORKERS)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verifications', type=int, default=40,
+                            help='Vérifications par algorithme et par niveau de parallélisme (défaut : 40)')
+        parser.add_argument('--threads', default=f'1,2,4,{os.cpu_count() or 1}',
+                            help='Niveaux de parallélisme, séparés par des virgules')
+
+    def handle(self, *args, **options):
+        niveaux = sorted({int(n) for n in options['threads'].split(',')})
+        self.stdout.write(f'Algorithme préféré : {settings.PASSWORD_HASHER}, '
+                          f'PASSWORD_HASHING_WORKERS={settings.PASSWORD_HASHING_WORKERS}, {os.cpu_count()} CPU')
+        self.stdout.write(f'{"algorithme":<24}{"p50 ms":>9}' + ''.join(f'{f"{n} thr/s":>11}' for n in niveaux))
+        for hasher in get_hashers():
+            try:
+                encode = make_password('benchmark', hasher=hasher.algorithm)
+            except ValueError as e:
+                # Bibliothèque absente (argon2-cffi, bcrypt)
+                self.stdout.write(f'{hasher.algorithm:<24}  indisponible : {e}')
+                continue
+
+            durees = []
+            for _ in range(min(options['verifications'], 20)):
+                debut = time.perf_counter()
+                check_password('benchmark', encode)
+                durees.append(time.perf_counter() - debut)
+
+            debits = []
+            for n in niveaux:
+                with ThreadPoolExecutor(n) as executeur:
+                    debut = time.perf_counter()
+                    list(executeur.map(lambda _: check_password('benchmark', encode), range(options['verifications'])))
+                    debits.append(options['verifications'] / (time.perf_counter() - debut))
+            self.stdout.write(f'{hasher.algorithm:<24}{percentile(durees, 50) * 1000:>9.1f}'
+                              + ''.join(f'{d:>11.1f}' for d in debits))
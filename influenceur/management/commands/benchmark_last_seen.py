@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from influenceur import activite
+from influenceur.auth import tokens_for_influenceur, utilisateur_pour_influenceur
+from influenceur.benchmark import donnees_jetables, creer_jeu_de_donnees
+import time
+
+
+class Command(BaseCommand):
+    help = ('Test de charge de la dernière activité : requêtes authentifiées par JWT pendant une durée '
+            'donnée, écritures de date_derniere_connexion par seconde, sans puis avec la limitation')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--influenceurs', type=int, default=50, help='Influenceurs actifs (défaut : 50)')
+        parser.add_argument('--duration', type=float, default=10, help='Durée de chaque mode en secondes (défaut : 10)')
+        parser.add_argument('--interval', type=int, default=settings.LAST_SEEN_INTERVAL,
+                            help='LAST_SEEN_INTERVAL du mode limité')
+        parser.add_argument('--flush-interval', type=float, default=2,
+                            help='LAST_SEEN_FLUSH_INTERVAL du mode limité (défaut : 2)')
+
+    def handle(self, *args, **options):
+        hotes = [*settings.ALLOWED_HOSTS, 'testserver']
+        with donnees_jetables(), override_settings(ALLOWED_HOSTS=hotes):
+            influenceurs = creer_jeu_de_donnees(0, nb_influenceurs=options['influenceurs'])
+            jetons = [str(tokens_for_influenceur(utilisateur_pour_influenceur(i), i).access_token) for i in influenceurs]
+
+            self.stdout.write(f'{"mode":<14}{"requêtes":>10}{"req/s":>9}{"UPDATE":>9}{"UPDATE/s":>10}'
+                              f'{"lignes":>8}{"borne/s":>9}')
+            # Sans limitation : une écriture par requête, comme avant le suivi par lots
+            self.mesurer('par requête', jetons, options['duration'], intervalle=0, vidage=0)
+            self.mesurer('limité', jetons, options['duration'], options['interval'], options['flush_interval'])
+
+    def mesurer(self, mode, jetons, duree, intervalle, vidage):
+        cache.clear()
+        activite.reinitialiser()
+        client = APIClient()
+        url = reverse('auth_profile')
+        nb = 0
+        with override_settings(LAST_SEEN_INTERVAL=intervalle, LAST_SEEN_FLUSH_INTERVAL=vidage):
+            reset_queries()
+            with CaptureQueriesContext(connection) as requetes:
+                debut = time.perf_counter()
+                while time.perf_counter() - debut < duree:
+                    client.credentials(HTTP_AUTHORIZATION=f'Bearer {jetons[nb % len(jetons)]}')
+                    client.get(url)
+                    nb += 1
+                total = time.perf_counter() - debut
+        ecritures = [q['sql'] for q in requetes.captured_queries
+                     if q['sql'].startswith('UPDATE') and 'date_derniere_connexion' in q['sql']]
+        lignes = sum(q.count('WHEN') or 1 for q in ecritures)
+        # Au plus un UPDATE par intervalle de vidage et par processus
+        borne = f'{1 / vidage:.1f}' if vidage else '-'
+        self.stdout.write(f'{mode:<14}{nb:>10}{nb / total:>9.0f}{len(ecritures):>9}{len(ecritures) / total:>10.1f}'
+                          f'{lignes:>8}{borne:>9}')
+        if activite.en_attente():
+            self.stdout.write(f'  {activite.en_attente()} activité(s) encore en attente du prochain lot')
+        activite.reinitialiser()
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from influenceur.auth_views import influenceur_login_view
+from influenceur.benchmark import donnees_jetables, creer_jeu_de_donnees, percentile
+from influenceur.models import Influenceur
+import json
+import time
+
+ECRITURES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class Command(BaseCommand):
+    help = ('Test de charge de la connexion des influenceurs : connexions par seconde, latence, '
+            'requêtes et écritures SQL par connexion (première connexion puis connexions suivantes)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--influenceurs', type=int, default=20, help='Comptes utilisés (défaut : 20)')
+        parser.add_argument('--logins', type=int, default=500, help='Connexions mesurées après la première (défaut : 500)')
+        parser.add_argument('--fast-hash', action='store_true',
+                            help='Hachage MD5 : mesure le coût base de données sans celui du hachage')
+
+    def handle(self, *args, **options):
+        hashers = settings.PASSWORD_HASHERS
+        if options['fast_hash']:
+            hashers = ['django.contrib.auth.hashers.MD5PasswordHasher']
+        with donnees_jetables(), override_settings(PASSWORD_HASHERS=hashers):
+            influenceurs = creer_jeu_de_donnees(0, nb_influenceurs=options['influenceurs'])
+            Influenceur.objects.filter(pk__in=[i.pk for i in influenceurs]).update(password=make_password('benchmark'))
+            corps = [json.dumps({'email': i.email, 'password': 'benchmark'}) for i in influenceurs]
+
+            self.stdout.write(f'{"phase":<12}{"conn/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+                              f'{"req/conn":>10}{"écrit/conn":>12}  statuts')
+            # Première connexion de chaque compte (création de l'utilisateur Django) puis rafale
+            self.mesurer('premiere', corps)
+            self.mesurer('suivantes', [corps[i % len(corps)] for i in range(options['logins'])])
+
+    def mesurer(self, phase, corps):
+        usine = RequestFactory()
+        url = reverse('influenceur_login')
+        durees, statuts = [], {}
+        reset_queries()
+        with CaptureQueriesContext(connection) as requetes:
+            debut = time.perf_counter()
+            for contenu in corps:
+                requete = usine.post(url, contenu, content_type='application/json')
+                t0 = time.perf_counter()
+                reponse = influenceur_login_view(requete)
+                durees.append(time.perf_counter() - t0)
+                statuts[reponse.status_code] = statuts.get(reponse.status_code, 0) + 1
+            total = time.perf_counter() - debut
+        ecritures = sum(1 for q in requetes.captured_queries if q['sql'].lstrip().upper().startswith(ECRITURES))
+        self.stdout.write(
+            f'{phase:<12}{len(corps) / total:>9.0f}{percentile(durees, 50) * 1000:>9.2f}'
+            f'{percentile(durees, 95) * 1000:>9.2f}{percentile(durees, 99) * 1000:>9.2f}'
+            f'{len(requetes) / len(corps):>10.1f}{ecritures / len(corps):>12.1f}  '
+            f'{",".join(f"{s}x{n}" for s, n in statuts.items())}'
+        )
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from influenceur.benchmark import donnees_jetables, creer_jeu_de_donnees, mesurer
+from influenceur.lecture_rapide import serialiser
+from prospect.models import Prospect
+from prospect.serializers import ProspectSerializers, ProspectListeSerializer
+from remise.models import Remise
+from remise.serializers import RemiseSerializers, RemiseListeSerializer
+
+
+class Command(BaseCommand):
+    help = ('Compare le temps de sérialisation et la taille des réponses de liste '
+            '(serializers complets / serializers de liste / lecture rapide), ramenés à 1 000 lignes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Nombre de prospects générés')
+        parser.add_argument('--repeat', type=int, default=5, help='Nombre de mesures par cas')
+
+    def handle(self, *args, **options):
+        nb_lignes = options['rows']
+        with donnees_jetables():
+            creer_jeu_de_donnees(nb_lignes)
+            tout = {'influenceur', 'remise'}
+            cas = [
+                ('prospects complet', lambda: ProspectSerializers(Prospect.objects.all(), many=True).data),
+                ('prospects liste', lambda: ProspectListeSerializer(
+                    Prospect.objects.select_related(*ProspectListeSerializer.jointures()), many=True).data),
+                ('prospects liste ?expand', lambda: ProspectListeSerializer(
+                    Prospect.objects.select_related(*ProspectListeSerializer.jointures(tout)), many=True,
+                    context={'expand': tout}).data),
+                ('prospects liste rapide', lambda: serialiser(ProspectListeSerializer, Prospect.objects.all())),
+                ('prospects rapide ?expand', lambda: serialiser(ProspectListeSerializer, Prospect.objects.all(), tout)),
+                ('remises complet', lambda: RemiseSerializers(Remise.objects.all(), many=True).data),
+                ('remises liste', lambda: RemiseListeSerializer(
+                    Remise.objects.select_related(*RemiseListeSerializer.jointures()), many=True).data),
+                ('remises liste rapide', lambda: serialiser(RemiseListeSerializer, Remise.objects.all())),
+            ]
+
+            self.stdout.write(f'{"cas":<26}{"lignes":>8}{"ms/1k":>10}{"Ko/1k":>10}{"requêtes":>10}')
+            for nom, serializer in cas:
+                duree, nb_requetes, contenu = mesurer(
+                    lambda: JSONRenderer().render(serializer()), options['repeat']
+                )
+                nb = max(Prospect.objects.count() if nom.startswith('prospects') else Remise.objects.count(), 1)
+                self.stdout.write(
+                    f'{nom:<26}{nb:>8}{duree * 1000 * 1000 / nb:>10.1f}'
+                    f'{len(contenu) / 1024 * 1000 / nb:>10.1f}{nb_requetes:>10}'
+                )
@@ -1,78 +1,69 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
+from django.db import transaction
+from influenceur import detecteur_n1
+from influenceur.auth import noms_utilisateur
 from influenceur.models import Influenceur
 
+
 class Command(BaseCommand):
     help = 'Nettoie les utilisateurs Django orphelins et corrige les problèmes de gestion des utilisateurs'
 
     def handle(self, *args, **options):
-        # 1. Supprimer les utilisateurs Django qui n'ont pas d'influenceur correspondant
-        users_to_delete = []
-        for user in User.objects.all():
-            if not user.is_superuser:  # Ne pas toucher aux superusers
-                try:
-                    # Vérifier si l'utilisateur correspond à un influenceur
-                    influenceur = Influenceur.objects.get(email=user.email)
-                    self.stdout.write(
-                        self.style.SUCCESS(f'Utilisateur {user.email} OK - influenceur trouvé')
-                    )
-                except Influenceur.DoesNotExist:
-                    # Utilisateur orphelin
-                    users_to_delete.append(user)
-                    self.stdout.write(
-                        self.style.WARNING(f'Utilisateur orphelin trouvé: {user.email}')
-                    )
-        
-        # Supprimer les utilisateurs orphelins
-        for user in users_to_delete:
-            user.delete()
-            self.stdout.write(
-                self.style.SUCCESS(f'Utilisateur orphelin supprimé: {user.email}')
-            )
-        
-        # 2. Créer les utilisateurs Django manquants pour les influenceurs
-        influenceurs_without_user = []
-        for influenceur in Influenceur.objects.all():
-            try:
-                user = User.objects.get(email=influenceur.email)
-                # Mettre à jour les informations utilisateur si nécessaire
-                if user.first_name != influenceur.nom.split()[0] if influenceur.nom else '':
-                    user.first_name = influenceur.nom.split()[0] if influenceur.nom else ''
-                    user.last_name = ' '.join(influenceur.nom.split()[1:]) if len(influenceur.nom.split()) > 1 else ''
-                    user.is_active = influenceur.is_active
-                    user.save()
-                    self.stdout.write(
-                        self.style.SUCCESS(f'Utilisateur mis à jour: {influenceur.email}')
-                    )
-            except User.DoesNotExist:
-                # Créer l'utilisateur Django manquant
-                influenceurs_without_user.append(influenceur)
-        
-        # Créer les utilisateurs manquants
-        for influenceur in influenceurs_without_user:
-            user = User.objects.create(
-                username=influenceur.email,
-                email=influenceur.email,
-                first_name=influenceur.nom.split()[0] if influenceur.nom else '',
-                last_name=' '.join(influenceur.nom.split()[1:]) if len(influenceur.nom.split()) > 1 else '',
-                is_active=influenceur.is_active,
-                password='!'  # Mot de passe factice
-            )
-            self.stdout.write(
-                self.style.SUCCESS(f'Utilisateur créé pour: {influenceur.email}')
-            )
-        
+        # Utilisateurs et influenceurs chargés une fois et rapprochés par email (nombre de
+        # requêtes indépendant du nombre de comptes)
+        with detecteur_n1.surveiller('cleanup_users'), transaction.atomic():
+            influenceurs = {i.email: i for i in Influenceur.objects.only('email', 'nom', 'is_active')}
+            users = list(User.objects.filter(is_superuser=False))  # Ne pas toucher aux superusers
+
+            # 1. Supprimer les utilisateurs Django qui n'ont pas d'influenceur correspondant
+            users_to_delete = [user for user in users if user.email not in influenceurs]
+            for user in users_to_delete:
+                self.stdout.write(self.style.WARNING(f'Utilisateur orphelin trouvé: {user.email}'))
+            User.objects.filter(pk__in=[user.pk for user in users_to_delete]).delete()
+            for user in users_to_delete:
+                self.stdout.write(self.style.SUCCESS(f'Utilisateur orphelin supprimé: {user.email}'))
+
+            # 2. Mettre à jour les utilisateurs existants, créer ceux qui manquent
+            users_par_email = {user.email: user for user in User.objects.filter(email__in=list(influenceurs))}
+            users_to_update = []
+            influenceurs_without_user = []
+            for email, influenceur in influenceurs.items():
+                user = users_par_email.get(email)
+                if user is None:
+                    influenceurs_without_user.append(influenceur)
+                    continue
+                first_name, last_name = noms_utilisateur(influenceur)
+                if (user.first_name, user.last_name, user.is_active) != (first_name, last_name, influenceur.is_active):
+                    user.first_name, user.last_name, user.is_active = first_name, last_name, influenceur.is_active
+                    users_to_update.append(user)
+            User.objects.bulk_update(users_to_update, ['first_name', 'last_name', 'is_active'], batch_size=500)
+            for user in users_to_update:
+                self.stdout.write(self.style.SUCCESS(f'Utilisateur mis à jour: {user.email}'))
+
+            User.objects.bulk_create([
+                User(username=influenceur.email, email=influenceur.email,
+                     first_name=noms_utilisateur(influenceur)[0], last_name=noms_utilisateur(influenceur)[1],
+                     is_active=influenceur.is_active, password='!')  # Mot de passe factice
+                for influenceur in influenceurs_without_user
+            ], batch_size=500)
+            for influenceur in influenceurs_without_user:
+                self.stdout.write(self.style.SUCCESS(f'Utilisateur créé pour: {influenceur.email}'))
+
         # 3. Statistiques
         total_users = User.objects.count()
-        total_influenceurs = Influenceur.objects.count()
+        total_influenceurs = len(influenceurs)
         superusers = User.objects.filter(is_superuser=True).count()
-        
+
         self.stdout.write(
             self.style.SUCCESS(f'\n=== RÉSUMÉ ===')
         )
         self.stdout.write(
             self.style.SUCCESS(f'Utilisateurs Django orphelins supprimés: {len(users_to_delete)}')
         )
+        self.stdout.write(
+            self.style.SUCCESS(f'Utilisateurs Django mis à jour: {len(users_to_update)}')
+        )
         self.stdout.write(
             self.style.SUCCESS(f'Utilisateurs Django créés: {len(influenceurs_without_user)}')
         )
@@ -81,4 +72,4 @@ class Command(BaseCommand):
         )
         self.stdout.write(
             self.style.SUCCESS(f'Total influenceurs: {total_influenceurs}')
-        ) 
\ No newline at end of file
+        )
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.hashers import make_password, check_password, is_password_usable
+from influenceur.hachage import est_hache
 from influenceur.models import Influenceur
 
 class Command(BaseCommand):
@@ -21,7 +22,7 @@ class Command(BaseCommand):
                 self.stdout.write(f'Nom: {influenceur.nom}')
                 self.stdout.write(f'Email: {influenceur.email}')
                 self.stdout.write(f'Mot de passe stocké: {influenceur.password[:20]}...')
-                self.stdout.write(f'Mot de passe hashé: {influenceur.password.startswith("pbkdf2_")}')
+                self.stdout.write(f'Mot de passe hashé: {est_hache(influenceur.password)}')
                 self.stdout.write(f'Mot de passe utilisable: {is_password_usable(influenceur.password)}')
                 
                 if test_password:
@@ -48,8 +49,8 @@ class Command(BaseCommand):
             for influenceur in influenceurs:
                 self.stdout.write(f'\n{influenceur.email}:')
                 self.stdout.write(f'  - Mot de passe: {influenceur.password[:30]}...')
-                self.stdout.write(f'  - Hashé: {influenceur.password.startswith("pbkdf2_")}')
+                self.stdout.write(f'  - Hashé: {est_hache(influenceur.password)}')
                 self.stdout.write(f'  - Utilisable: {is_password_usable(influenceur.password)}')
                 
-                if not influenceur.password.startswith('pbkdf2_'):
+                if not est_hache(influenceur.password):
                     self.stdout.write(self.style.WARNING(f'  ⚠️  Mot de passe non hashé pour {influenceur.email}')) 
\ No newline at end of file
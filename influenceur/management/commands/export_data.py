@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from influenceur import export
+from influenceur.filtres import lire_filtres, appliquer_filtres, FiltreInvalide
+from prospect.models import Prospect
+from prospect.serializers import ProspectExportSerializer
+from remise.models import Remise
+from remise.serializers import RemiseExportSerializer
+import os
+import time
+
+# modèle exporté -> (modèle, serializer d'export, champ de date des filtres)
+EXPORTS = {
+    'prospects': (Prospect, ProspectExportSerializer, 'date_inscription'),
+    'remises': (Remise, RemiseExportSerializer, 'date_creation'),
+}
+
+
+class Command(BaseCommand):
+    help = ('Exporte les prospects ou les remises en CSV / NDJSON directement dans un fichier, '
+            'avec les mêmes colonnes et filtres que les endpoints d\'export')
+
+    def add_arguments(self, parser):
+        parser.add_argument('modele', choices=sorted(EXPORTS), help='Données à exporter')
+        parser.add_argument('--output', required=True, help='Fichier de destination')
+        parser.add_argument('--type', choices=sorted(export.FORMATS), default='csv', help='Format (csv par défaut)')
+        parser.add_argument('--influenceur', help='Filtre par identifiant d\'influenceur')
+        parser.add_argument('--statut', help='Filtre par statut (code)')
+        parser.add_argument('--depuis', help='Date de début incluse (AAAA-MM-JJ)')
+        parser.add_argument('--jusqu-au', dest='jusqu_au', help='Date de fin incluse (AAAA-MM-JJ)')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Lignes lues par lot (défaut : EXPORT_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        model, serializer_class, champ_date = EXPORTS[options['modele']]
+        try:
+            filtres = lire_filtres(options, dict(model.STATUT_CHOICES))
+        except FiltreInvalide as e:
+            raise CommandError(str(e))
+
+        queryset = appliquer_filtres(model.objects.all(), filtres, champ_date).order_by(f'-{champ_date}', '-id')
+        nb_lignes = queryset.count()
+
+        debut = time.perf_counter()
+        # newline='' : le module csv gère lui-même les fins de ligne
+        with open(options['output'], 'w', encoding='utf-8', newline='') as fichier:
+            export.ecrire_export(serializer_class, queryset, options['type'], fichier, options['chunk_size'])
+        duree = time.perf_counter() - debut
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{nb_lignes} ligne(s) exportée(s) dans {options["output"]} '
+            f'({os.path.getsize(options["output"]) / 1024:.1f} Ko, {duree:.2f} s)'
+        ))
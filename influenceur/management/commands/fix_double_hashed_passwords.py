@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.hashers import make_password, check_password, is_password_usable
+from influenceur.hachage import est_hache
 from influenceur.models import Influenceur
 
 class Command(BaseCommand):
@@ -21,7 +22,7 @@ class Command(BaseCommand):
                 )
             else:
                 # Le mot de passe n'est pas hashé ou mal hashé
-                if password.startswith('pbkdf2_'):
+                if est_hache(password):
                     # Double hashé - essayer de récupérer le mot de passe original
                     try:
                         # Essayer de vérifier avec le mot de passe tel quel
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from prospect.models import InscriptionEnAttente
+import time
+
+
+class Command(BaseCommand):
+    help = ('Importe par lots les inscriptions du formulaire d\'affiliation mises en file '
+            '(AFFILIATION_INTAKE_BUFFERED=True) en prospects, en signalant les doublons et les données invalides')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Vide la file puis s\'arrête')
+        parser.add_argument('--poll-interval', type=float, default=1,
+                            help='Secondes entre deux consultations de la file vide (défaut : 1)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Inscriptions importées par transaction (défaut : 500)')
+
+    def handle(self, *args, **options):
+        total = {'importees': 0, 'conflits': 0, 'invalides': 0}
+        debut = time.perf_counter()
+        while True:
+            resultat = InscriptionEnAttente.importer(options['batch_size'])
+            if any(resultat.values()):
+                for cle in total:
+                    total[cle] += resultat[cle]
+                self.stdout.write(f'{resultat["importees"]} prospect(s) créé(s), {resultat["conflits"]} conflit(s), '
+                                  f'{resultat["invalides"]} invalide(s)')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f'File vidée : {total["importees"]} prospect(s) créé(s), {total["conflits"]} conflit(s), '
+            f'{total["invalides"]} invalide(s) ({duree:.2f} s)'
+        ))
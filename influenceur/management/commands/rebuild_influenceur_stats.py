@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from influenceur.models import InfluenceurStats
+
+class Command(BaseCommand):
+    help = 'Reconstruit la table InfluenceurStats depuis les prospects et remises, puis la vérifie'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Vérifie la table sans la reconstruire')
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            nb = InfluenceurStats.reconstruire()
+            self.stdout.write(self.style.SUCCESS(f'Statistiques reconstruites pour {nb} influenceur(s)'))
+
+        ecarts = InfluenceurStats.verifier()
+        for influenceur_id, champ, stocke, attendu in ecarts:
+            self.stdout.write(
+                self.style.WARNING(f'Influenceur {influenceur_id} - {champ}: stocké {stocke}, attendu {attendu}')
+            )
+
+        if ecarts:
+            raise CommandError(f'{len(ecarts)} écart(s) détecté(s) dans InfluenceurStats')
+        self.stdout.write(self.style.SUCCESS('InfluenceurStats est cohérente avec les tables brutes'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from influenceur.models import StatistiqueJournaliere, EtatCumul
+
+class Command(BaseCommand):
+    help = 'Cumule les compteurs journaliers (prospects/remises) par influenceur jusqu\'à hier'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookback-days', type=int, default=7,
+                            help='Nombre de jours déjà cumulés à recalculer (changements de statut récents)')
+        parser.add_argument('--since', type=str,
+                            help='Recalcule tout depuis cette date (AAAA-MM-JJ)')
+
+    def handle(self, *args, **options):
+        depuis = None
+        if options['since']:
+            depuis = parse_date(options['since'])
+            if depuis is None:
+                raise CommandError('Date invalide pour --since (format AAAA-MM-JJ)')
+
+        nb_lignes = StatistiqueJournaliere.cumuler(
+            jours_a_recalculer=max(options['lookback_days'], 1),
+            depuis=depuis,
+        )
+        dernier_jour = EtatCumul.lire(StatistiqueJournaliere.NOM_CUMUL)
+        self.stdout.write(self.style.SUCCESS(
+            f'{nb_lignes} ligne(s) journalière(s) écrite(s), cumul à jour jusqu\'au {dernier_jour}'
+        ))
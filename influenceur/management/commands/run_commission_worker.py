@@ -0,0 +1,39 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from remise.models import CalculRemises
+import time
+
+
+class Command(BaseCommand):
+    help = ('Exécute en arrière-plan les calculs de remises demandés par l\'API '
+            '(POST /remises/calculer-automatiques/), par lots d\'influenceurs')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Traite les calculs en attente puis s\'arrête')
+        parser.add_argument('--poll-interval', type=float, default=5,
+                            help='Secondes entre deux consultations de la file (défaut : 5)')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Influenceurs traités par transaction (défaut : Remise.TAILLE_LOT)')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Reprend un calcul en cours sans progression depuis N secondes (défaut : 600)')
+
+    def handle(self, *args, **options):
+        delai_reprise = timedelta(seconds=options['stale_after'])
+        while True:
+            calcul = CalculRemises.prendre_suivant(delai_reprise)
+            if calcul is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Calcul #{calcul.pk} ({calcul.montant_par_prospect} F CFA par prospect)...')
+            debut = time.perf_counter()
+            calcul.executer(options['chunk_size'])
+            duree = time.perf_counter() - debut
+            style = self.style.SUCCESS if calcul.statut == 'termine' else self.style.ERROR
+            self.stdout.write(style(
+                f'Calcul #{calcul.pk} {calcul.get_statut_display().lower()} : {calcul.nb_remises} remise(s), '
+                f'{calcul.montant_total} F CFA, {len(calcul.erreurs)} lot(s) en erreur ({duree:.2f} s)'
+            ))
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from influenceur.email_service import EmailService, LimiteurDebit
+from influenceur.models import CampagneEmail
+import time
+
+
+class Command(BaseCommand):
+    help = ('Envoie les emails de la file (EmailSortant) par lots, sur une connexion SMTP par lot, '
+            'avec nouvelles tentatives espacées et abandon après EMAIL_OUTBOX_MAX_ATTEMPTS échecs ; '
+            'met aussi en file, lot par lot, les destinataires des campagnes en préparation')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Vide la file des emails à envoyer puis s\'arrête')
+        parser.add_argument('--poll-interval', type=float, default=5,
+                            help='Secondes entre deux consultations de la file vide (défaut : 5)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Emails par lot (défaut : EMAIL_OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Influenceurs mis en file par lot de préparation de campagne (défaut : 1000)')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Connexions SMTP simultanées (défaut : EMAIL_OUTBOX_CONCURRENCY)')
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Emails par seconde au maximum (défaut : EMAIL_OUTBOX_RATE, 0 = sans limite)')
+
+    def handle(self, *args, **options):
+        taille_lot = options['batch_size'] or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+        debit = options['rate'] if options['rate'] is not None else getattr(settings, 'EMAIL_OUTBOX_RATE', 0)
+        limiteur = LimiteurDebit(debit)
+        total_envoyes = total_echecs = 0
+        while True:
+            # Un lot de préparation de campagne entre deux lots d'envoi
+            prepare = CampagneEmail.preparer_en_attente(options['chunk_size'])
+            envoyes, echecs = EmailService.envoyer_file(taille_lot, nb_connexions=options['concurrency'], limiteur=limiteur)
+            total_envoyes += envoyes
+            total_echecs += echecs
+            if envoyes or echecs:
+                self.stdout.write(f'{envoyes} email(s) envoyé(s), {echecs} en échec')
+            if prepare or envoyes or echecs:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'File vidée : {total_envoyes} email(s) envoyé(s), {total_echecs} échec(s)'
+        ))
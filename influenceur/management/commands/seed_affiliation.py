@@ -0,0 +1,58 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from django.utils import timezone
+from influenceur.generation import code_affiliation, generer, semer_statistiques
+from influenceur.models import Influenceur
+import time
+
+
+class Command(BaseCommand):
+    help = ('Génère un jeu de données synthétique réaliste (influenceurs, prospects, remises) '
+            'par lots bulk_create, reproductible à partir d\'une graine')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--influenceurs', type=int, default=1000,
+                            help='Nombre d\'influenceurs (défaut : 1000)')
+        parser.add_argument('--prospects', type=int, default=100000,
+                            help='Nombre de prospects (défaut : 100000)')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Graine du générateur ; préfixe les emails et codes générés (défaut : 0)')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Période couverte par les inscriptions, en jours (défaut : 365)')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Lignes par bulk_create (défaut : 5000)')
+        parser.add_argument('--password', default='seed',
+                            help='Mot de passe de tous les influenceurs générés (défaut : seed)')
+        parser.add_argument('--skip-stats', action='store_true',
+                            help='Ne reconstruit pas InfluenceurStats ni les cumuls journaliers')
+
+    def handle(self, *args, **options):
+        if options['influenceurs'] < 1 or options['prospects'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--influenceurs et --batch-size doivent être positifs, --prospects ne peut être négatif')
+        prefixe = f's{options["seed"]}'
+        if Influenceur.objects.filter(code_affiliation=code_affiliation(prefixe, 0)).exists():
+            raise CommandError(f'Les données de la graine {options["seed"]} existent déjà : '
+                               f'choisissez une autre graine (--seed)')
+
+        debut = time.perf_counter()
+
+        def progression(table, nb):
+            duree = time.perf_counter() - debut
+            self.stdout.write(f'{table} : {nb} ligne(s) ({nb / duree:.0f} lignes/s)' if duree else f'{table} : {nb}')
+
+        try:
+            influenceurs = generer(options['influenceurs'], options['prospects'], graine=options['seed'],
+                                   jours=options['days'], prefixe=prefixe, taille_lot=options['batch_size'],
+                                   mot_de_passe=options['password'], progression=progression)
+        except IntegrityError as e:
+            raise CommandError(f'Conflit avec des données existantes : {e}')
+
+        if not options['skip_stats']:
+            self.stdout.write('Reconstruction des statistiques...')
+            semer_statistiques(depuis=(timezone.now() - timedelta(days=options['days'])).date())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(influenceurs)} influenceur(s) et {options["prospects"]} prospect(s) générés en '
+            f'{time.perf_counter() - debut:.1f} s (codes {code_affiliation(prefixe, 0)}...)'
+        ))
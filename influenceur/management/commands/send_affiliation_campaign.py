@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from influenceur.email_service import EmailService, LimiteurDebit
+from influenceur.models import CampagneEmail
+import time
+
+
+class Command(BaseCommand):
+    help = ('Renvoie le lien d\'affiliation à tous les influenceurs actifs : préparation par lots, '
+            'envoi sur des connexions SMTP réutilisées, débit borné, reprise possible (--resume)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resume', type=int, metavar='ID',
+                            help='Reprend la campagne ID (préparation puis envois restants)')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Influenceurs mis en file par transaction (défaut : 1000)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Emails réservés par lot d\'envoi (défaut : EMAIL_OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Connexions SMTP simultanées (défaut : EMAIL_OUTBOX_CONCURRENCY)')
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Emails par seconde au maximum (défaut : EMAIL_OUTBOX_RATE, 0 = sans limite)')
+        parser.add_argument('--no-send', action='store_true',
+                            help='Prépare seulement la campagne, l\'envoi est laissé à run_email_dispatcher')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                campagne = CampagneEmail.objects.get(pk=options['resume'])
+            except CampagneEmail.DoesNotExist:
+                raise CommandError(f'Campagne {options["resume"]} introuvable')
+        else:
+            campagne = CampagneEmail.objects.create(type_email='affiliation', demande_par='commande')
+
+        debut = time.perf_counter()
+        campagne.preparer(options['chunk_size'])
+        self.stdout.write(f'Campagne #{campagne.pk} : {campagne.nb_destinataires} destinataire(s) '
+                          f'en file ({time.perf_counter() - debut:.2f} s)')
+        if options['no_send']:
+            return
+
+        debit = options['rate'] if options['rate'] is not None else getattr(settings, 'EMAIL_OUTBOX_RATE', 0)
+        limiteur = LimiteurDebit(debit)
+        debut = time.perf_counter()
+        total_envoyes = total_echecs = 0
+        while True:
+            envoyes, echecs = EmailService.envoyer_file(
+                options['batch_size'], campagne=campagne, nb_connexions=options['concurrency'], limiteur=limiteur
+            )
+            if not envoyes and not echecs:
+                break
+            total_envoyes += envoyes
+            total_echecs += echecs
+            self.stdout.write(f'{total_envoyes} envoyé(s), {total_echecs} échec(s)...')
+        duree = time.perf_counter() - debut
+
+        rapport = campagne.rapport()
+        self.stdout.write(self.style.SUCCESS(
+            f'Campagne #{campagne.pk} ({rapport["statut"]}) : {rapport["nb_envoyes"]}/{rapport["nb_destinataires"]} '
+            f'envoyé(s), {rapport["nb_en_attente"]} en attente de nouvelle tentative, {rapport["nb_echecs"]} abandonné(s)'
+        ))
+        if total_envoyes and duree:
+            self.stdout.write(f'Débit : {total_envoyes / duree:.1f} email(s)/s sur cette exécution ({duree:.2f} s)')
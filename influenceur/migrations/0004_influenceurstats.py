@@ -0,0 +1,70 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:25
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db.models import Count, Q, Sum
+
+
+def remplir_stats(apps, schema_editor):
+    """Calcule les statistiques initiales de chaque influenceur"""
+    Influenceur = apps.get_model('influenceur', 'Influenceur')
+    InfluenceurStats = apps.get_model('influenceur', 'InfluenceurStats')
+    Prospect = apps.get_model('prospect', 'Prospect')
+    Remise = apps.get_model('remise', 'Remise')
+
+    stats = {pk: InfluenceurStats(influenceur_id=pk) for pk in Influenceur.objects.values_list('pk', flat=True)}
+    for ligne in Prospect.objects.order_by().values('influenceur').annotate(
+        nb_prospects=Count('id'),
+        nb_prospects_en_attente=Count('id', filter=Q(statut='en_attente')),
+        nb_prospects_confirmes=Count('id', filter=Q(statut='confirme')),
+        nb_prospects_rejetes=Count('id', filter=Q(statut='rejeter')),
+    ):
+        s = stats[ligne.pop('influenceur')]
+        for champ, valeur in ligne.items():
+            setattr(s, champ, valeur)
+    for ligne in Remise.objects.order_by().values('influenceur').annotate(
+        nb_remises=Count('id'),
+        nb_remises_en_attente=Count('id', filter=Q(statut='en_attente')),
+        nb_remises_payees=Count('id', filter=Q(statut='payee')),
+        montant_en_attente=Sum('montant', filter=Q(statut='en_attente')),
+        montant_paye=Sum('montant', filter=Q(statut='payee')),
+    ):
+        s = stats[ligne.pop('influenceur')]
+        for champ, valeur in ligne.items():
+            setattr(s, champ, valeur or 0)
+    InfluenceurStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('influenceur', '0003_alter_influenceur_telephone'),
+        ('prospect', '0004_add_rejeter_status'),
+        ('remise', '0002_remise_date_creation_remise_date_paiement_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InfluenceurStats',
+            fields=[
+                ('influenceur', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='influenceur.influenceur')),
+                ('nb_prospects', models.PositiveIntegerField(default=0)),
+                ('nb_prospects_en_attente', models.PositiveIntegerField(default=0)),
+                ('nb_prospects_confirmes', models.PositiveIntegerField(default=0)),
+                ('nb_prospects_rejetes', models.PositiveIntegerField(default=0)),
+                ('nb_remises', models.PositiveIntegerField(default=0)),
+                ('nb_remises_en_attente', models.PositiveIntegerField(default=0)),
+                ('nb_remises_payees', models.PositiveIntegerField(default=0)),
+                ('montant_en_attente', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('montant_paye', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('date_mise_a_jour', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Statistiques influenceur',
+                'verbose_name_plural': 'Statistiques influenceurs',
+            },
+        ),
+        migrations.RunPython(remplir_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:27
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('influenceur', '0004_influenceurstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EtatCumul',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=50, unique=True)),
+                ('dernier_jour', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatistiqueJournaliere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('nb_prospects', models.PositiveIntegerField(default=0)),
+                ('nb_prospects_confirmes', models.PositiveIntegerField(default=0)),
+                ('nb_prospects_rejetes', models.PositiveIntegerField(default=0)),
+                ('nb_remises', models.PositiveIntegerField(default=0)),
+                ('montant_remises', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('influenceur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistiques_journalieres', to='influenceur.influenceur')),
+            ],
+            options={
+                'verbose_name': 'Statistique journalière',
+                'verbose_name_plural': 'Statistiques journalières',
+                'indexes': [models.Index(fields=['jour'], name='stat_journaliere_jour_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='statistiquejournaliere',
+            constraint=models.UniqueConstraint(fields=('influenceur', 'jour'), name='stat_journaliere_unique'),
+        ),
+    ]
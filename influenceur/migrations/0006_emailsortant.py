@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('influenceur', '0005_statistiquejournaliere'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailSortant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_email', models.CharField(choices=[('affiliation', "Lien d'affiliation"), ('bienvenue', 'Bienvenue')], max_length=20)),
+                ('destinataire', models.EmailField(max_length=254)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('envoye', 'Envoyé'), ('echec', 'Echec')], default='en_attente', max_length=20)),
+                ('nb_tentatives', models.PositiveSmallIntegerField(default=0)),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now)),
+                ('derniere_erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_envoi', models.DateTimeField(blank=True, null=True)),
+                ('influenceur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emails_sortants', to='influenceur.influenceur')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['statut', 'prochaine_tentative'], name='email_sortant_a_envoyer_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('influenceur', '0006_emailsortant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampagneEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_email', models.CharField(choices=[('affiliation', "Lien d'affiliation"), ('bienvenue', 'Bienvenue')], default='affiliation', max_length=20)),
+                ('statut', models.CharField(choices=[('preparation', 'En préparation'), ('envoi', "En cours d'envoi"), ('terminee', 'Terminée')], default='preparation', max_length=20)),
+                ('demande_par', models.CharField(blank=True, max_length=150)),
+                ('nb_destinataires', models.PositiveIntegerField(default=0)),
+                ('dernier_influenceur_id', models.PositiveIntegerField(default=0)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='emailsortant',
+            name='campagne',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='influenceur.campagneemail'),
+        ),
+        migrations.AddConstraint(
+            model_name='emailsortant',
+            constraint=models.UniqueConstraint(fields=('campagne', 'influenceur'), name='email_sortant_campagne_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('influenceur', '0007_campagneemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='influenceur',
+            name='version_permissions',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,19 +1,97 @@
 from django.db import models
 from django.conf import settings
 from django.db import models
+from django.db import router, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
-from django.contrib.auth.hashers import make_password, check_password
 from django.contrib.auth.models import User
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from . import hachage
 import uuid
 
-class Influenceur(models.Model):
+
+def calculer_taux_conversion(nb_confirmes, nb_rejetes):
+    """Taux de conversion (confirmés / (confirmés + rejetés)) en pourcentage"""
+    prospects_traites = nb_confirmes + nb_rejetes
+    if prospects_traites > 0:
+        return round((nb_confirmes / prospects_traites) * 100, 2)
+    return 0
+
+
+class SuiviModificationsMixin:
+    """
+    Mémorise la valeur des champs listés dans `champs_suivis` au chargement
+    depuis la base, pour détecter leurs modifications sans requête supplémentaire.
+
+    Avec `verrouiller_transitions`, une sauvegarde qui écrit des champs suivis relit d'abord
+    leurs valeurs en base (ligne verrouillée jusqu'à la fin de la transaction) : deux
+    sauvegardes concurrentes parties du même état chargé ne répercutent pas deux fois la
+    même transition sur InfluenceurStats.
+    """
+    champs_suivis = ()
+    verrouiller_transitions = False
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._etat_initial = {
+            nom: valeur for nom, valeur in zip(field_names, values)
+            if nom in cls.champs_suivis and valeur is not models.DEFERRED
+        }
+        return instance
+
+    def get_etat_initial(self):
+        """Valeurs des champs suivis au chargement (None si l'instance est nouvelle)"""
+        return getattr(self, '_etat_initial', None)
+
+    def memoriser_etat(self):
+        """Mémorise l'état courant comme nouvel état de référence (après un save)"""
+        differes = self.get_deferred_fields()
+        self._etat_initial = {nom: getattr(self, nom) for nom in self.champs_suivis if nom not in differes}
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        # Les valeurs relues deviennent l'état de référence des champs suivis rechargés
+        if fields is None:
+            self.memoriser_etat()
+            return
+        recharges = {self._meta.get_field(nom).attname for nom in fields}
+        etat = self.get_etat_initial() or {}
+        etat.update({nom: getattr(self, nom) for nom in self.champs_suivis if nom in recharges})
+        self._etat_initial = etat
+
+    def save(self, *args, **kwargs):
+        ancien = self.get_etat_initial()
+        update_fields = kwargs.get('update_fields')
+        if (not self.verrouiller_transitions or not ancien or self._state.adding
+                or update_fields is not None and not set(ancien).intersection(update_fields)):
+            return super().save(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            actuel = (type(self)._base_manager.using(using).select_for_update()
+                      .filter(pk=self.pk).values(*ancien).first())
+            if actuel is not None:
+                ancien.update(actuel)
+            return super().save(*args, **kwargs)
+
+
+class Influenceur(SuiviModificationsMixin, models.Model):
     ROLE_CHOICES = [
         ('admin', 'Administrateur'),
         ('influenceur', 'Influenceur'),
         ('moderateur', 'Modérateur'),
     ]
     
+    # Champs portés par les tokens JWT : leur modification révoque les tokens émis
+    CHAMPS_PERMISSIONS = ('role', 'is_active', 'peut_creer_influenceurs', 'peut_valider_prospects',
+                          'peut_payer_remises', 'peut_voir_statistiques')
+    # Champs dont la modification invalide la résolution en cache des codes d'affiliation
+    # et des utilisateurs (email), ou les tokens JWT (mot de passe et CHAMPS_PERMISSIONS)
+    champs_suivis = ('code_affiliation', 'email', 'password') + CHAMPS_PERMISSIONS
+
     nom = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     telephone = models.CharField(max_length=15, blank=True, null=True)  # Optionnel
@@ -36,6 +114,10 @@ class Influenceur(models.Model):
     date_derniere_tentative = models.DateTimeField(null=True, blank=True)
     bloque_jusqu_a = models.DateTimeField(null=True, blank=True)
 
+    # Incrémentée quand les permissions, l'activation ou le mot de passe changent :
+    # les tokens JWT portant une autre version sont refusés (auth.InfluenceurJWTAuthentication)
+    version_permissions = models.PositiveIntegerField(default=0)
+
     @classmethod
     def create_influenceur(cls, nom, email, password, telephone=None, **kwargs):
         """
@@ -57,26 +139,44 @@ class Influenceur(models.Model):
         if not self.code_affiliation:
             self.code_affiliation = uuid.uuid4().hex[:8]
         
-        if not self.pk:
-            # Ne pas rehasher si déjà hashé
-            if not self.password.startswith('pbkdf2_'):
-                self.password = make_password(self.password)
-                self.date_derniere_modification_password = timezone.now()
-        else:
-            try:
-                old_instance = Influenceur.objects.get(pk=self.pk)
-                if old_instance.password != self.password:
-                    # Seulement si le mot de passe a changé, et n'est pas encore hashé
-                    if not self.password.startswith('pbkdf2_'):
-                        self.password = make_password(self.password)
-                        self.date_derniere_modification_password = timezone.now()
-            except Influenceur.DoesNotExist:
-                if not self.password.startswith('pbkdf2_'):
-                    self.password = make_password(self.password)
-                    self.date_derniere_modification_password = timezone.now()
-        
+        ancien = self.get_etat_initial()
+        update_fields = kwargs.get('update_fields')
+        password_modifie = self._password_modifie(ancien, update_fields)
+        # Hacher un mot de passe en clair, pas un hachage existant (quel que soit l'algorithme)
+        if password_modifie and not hachage.est_hache(self.password):
+            self.password = hachage.hacher(self.password)
+            self.date_derniere_modification_password = timezone.now()
+            if update_fields is not None:
+                kwargs['update_fields'] = update_fields = {*update_fields, 'date_derniere_modification_password'}
+
+        # Révocation des tokens JWT si les permissions ou le mot de passe ont changé
+        self._permissions_modifiees = ancien is not None and (password_modifie or any(
+            champ in ancien and ancien[champ] != getattr(self, champ) for champ in self.CHAMPS_PERMISSIONS
+        ))
+        if self._permissions_modifiees:
+            self.version_permissions += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version_permissions'}
+
         super().save(*args, **kwargs)
 
+    def _password_modifie(self, ancien, update_fields):
+        """
+        Vrai si le mot de passe a changé depuis le chargement, par comparaison à l'état initial
+        (sans requête). Toujours vrai pour une instance nouvelle ; faux sans vérification pour
+        un save(update_fields=...) qui n'inclut pas le mot de passe.
+        """
+        if update_fields is not None and 'password' not in update_fields:
+            return False
+        if 'password' in self.get_deferred_fields():
+            return False
+        if ancien is None:
+            return True
+        if 'password' not in ancien:
+            # Chargé sans le mot de passe (only/defer) puis modifié : seule la base peut trancher
+            return Influenceur.objects.filter(pk=self.pk).values_list('password', flat=True).first() != self.password
+        return ancien['password'] != self.password
+
     def __str__(self):
         return self.nom
 
@@ -104,13 +204,43 @@ class Influenceur(models.Model):
         self.nombre_tentatives_connexion = 0  # Reset les tentatives
         self.save(update_fields=['date_derniere_connexion', 'nombre_tentatives_connexion'])
     
+    def enregistrer_connexion(self):
+        """
+        Connexion réussie : date de dernière connexion et remise à zéro des tentatives en un
+        seul UPDATE (sans save() ni signaux). Omis quand il n'y a pas de tentatives à effacer
+        et que la dernière connexion enregistrée date de moins de LAST_LOGIN_UPDATE_INTERVAL
+        secondes (rafales de connexions). Retourne True si la ligne a été écrite.
+        """
+        from . import cache
+
+        maintenant = timezone.now()
+        intervalle = timedelta(seconds=getattr(settings, 'LAST_LOGIN_UPDATE_INTERVAL', 60))
+        if (not self.nombre_tentatives_connexion and self.date_derniere_connexion
+                and maintenant - self.date_derniere_connexion < intervalle):
+            return False
+        Influenceur.objects.filter(pk=self.pk).update(date_derniere_connexion=maintenant, nombre_tentatives_connexion=0)
+        self.date_derniere_connexion = maintenant
+        self.nombre_tentatives_connexion = 0
+        cache.invalider_utilisateurs(self.email)
+        return True
+
     def check_password(self, raw_password):
-        """Vérifie le mot de passe"""
-        return check_password(raw_password, self.password)
+        """
+        Vérifie le mot de passe. Un hachage d'un algorithme ou d'un coût dépassé est remplacé
+        par celui de l'algorithme préféré (même mot de passe : les tokens restent valides)
+        """
+        valide, nouveau = hachage.verifier(raw_password, self.password)
+        if nouveau:
+            Influenceur.objects.filter(pk=self.pk, password=self.password).update(password=nouveau)
+            self.password = nouveau
+            etat = self.get_etat_initial()
+            if etat is not None:
+                etat['password'] = nouveau
+        return valide
     
     def set_password(self, raw_password):
         """Définit un nouveau mot de passe hashé"""
-        self.password = make_password(raw_password)
+        self.password = hachage.hacher(raw_password)
         self.date_derniere_modification_password = timezone.now()
         self.save(update_fields=['password', 'date_derniere_modification_password'])
     
@@ -151,4 +281,509 @@ class Influenceur(models.Model):
         if self.is_locked():
             return False, f"Compte bloqué jusqu'à {self.bloque_jusqu_a.strftime('%H:%M')}"
         
-        return True, "OK"
\ No newline at end of file
+        return True, "OK"
+
+
+class InfluenceurStats(models.Model):
+    """
+    Statistiques agrégées d'un influenceur, maintenues de manière incrémentale
+    à chaque écriture de prospect ou de remise (voir influenceur/signals.py).
+    """
+    # Champ de compteur pour chaque statut de prospect / remise
+    CHAMPS_PROSPECTS = {
+        'en_attente': 'nb_prospects_en_attente',
+        'confirme': 'nb_prospects_confirmes',
+        'rejeter': 'nb_prospects_rejetes',
+    }
+    CHAMPS_REMISES = {
+        'en_attente': ('nb_remises_en_attente', 'montant_en_attente'),
+        'payee': ('nb_remises_payees', 'montant_paye'),
+    }
+
+    influenceur = models.OneToOneField(Influenceur, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    nb_prospects = models.PositiveIntegerField(default=0)
+    nb_prospects_en_attente = models.PositiveIntegerField(default=0)
+    nb_prospects_confirmes = models.PositiveIntegerField(default=0)
+    nb_prospects_rejetes = models.PositiveIntegerField(default=0)
+    nb_remises = models.PositiveIntegerField(default=0)
+    nb_remises_en_attente = models.PositiveIntegerField(default=0)
+    nb_remises_payees = models.PositiveIntegerField(default=0)
+    montant_en_attente = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    montant_paye = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    date_mise_a_jour = models.DateTimeField(default=timezone.now)
+
+    COMPTEURS = [
+        'nb_prospects', 'nb_prospects_en_attente', 'nb_prospects_confirmes', 'nb_prospects_rejetes',
+        'nb_remises', 'nb_remises_en_attente', 'nb_remises_payees', 'montant_en_attente', 'montant_paye',
+    ]
+
+    class Meta:
+        verbose_name = "Statistiques influenceur"
+        verbose_name_plural = "Statistiques influenceurs"
+
+    def __str__(self):
+        return f"Statistiques de {self.influenceur_id}"
+
+    @property
+    def taux_conversion(self):
+        return calculer_taux_conversion(self.nb_prospects_confirmes, self.nb_prospects_rejetes)
+
+    @property
+    def montant_total(self):
+        return self.montant_en_attente + self.montant_paye
+
+    @classmethod
+    def calculer(cls, influenceur_ids=None):
+        """
+        Recalcule les compteurs depuis les tables brutes Prospect et Remise.
+        Retourne un dict {influenceur_id: {compteur: valeur}} (deux requêtes groupées).
+        """
+        from prospect.models import Prospect
+        from remise.models import Remise
+
+        influenceurs = Influenceur.objects.all()
+        if influenceur_ids is not None:
+            influenceurs = influenceurs.filter(pk__in=influenceur_ids)
+        resultat = {
+            pk: {champ: (Decimal('0.00') if champ.startswith('montant') else 0) for champ in cls.COMPTEURS}
+            for pk in influenceurs.values_list('pk', flat=True)
+        }
+
+        agregats_prospects = {'nb_prospects': Count('id')}
+        for statut, champ in cls.CHAMPS_PROSPECTS.items():
+            agregats_prospects[champ] = Count('id', filter=Q(statut=statut))
+        agregats_remises = {'nb_remises': Count('id')}
+        for statut, (champ_nb, champ_montant) in cls.CHAMPS_REMISES.items():
+            agregats_remises[champ_nb] = Count('id', filter=Q(statut=statut))
+            agregats_remises[champ_montant] = Sum('montant', filter=Q(statut=statut))
+
+        for modele, agregats in ((Prospect, agregats_prospects), (Remise, agregats_remises)):
+            lignes = modele.objects.filter(influenceur__in=list(resultat)) if influenceur_ids is not None else modele.objects.all()
+            for ligne in lignes.order_by().values('influenceur').annotate(**agregats):
+                compteurs = resultat.get(ligne.pop('influenceur'))
+                if compteurs is not None:
+                    compteurs.update({champ: valeur or 0 for champ, valeur in ligne.items()})
+        return resultat
+
+    @classmethod
+    def recalculer(cls, influenceur_id):
+        """Recalcule entièrement les statistiques d'un influenceur"""
+        compteurs = cls.calculer([influenceur_id]).get(influenceur_id)
+        if compteurs is None:
+            return None
+        stats, _ = cls.objects.update_or_create(
+            influenceur_id=influenceur_id,
+            defaults=dict(compteurs, date_mise_a_jour=timezone.now())
+        )
+        return stats
+
+    @classmethod
+    def reconstruire(cls):
+        """Reconstruit toute la table depuis zéro. Retourne le nombre de lignes créées."""
+
+        lignes = [
+            cls(influenceur_id=pk, date_mise_a_jour=timezone.now(), **compteurs)
+            for pk, compteurs in cls.calculer().items()
+        ]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(lignes, batch_size=1000)
+        return len(lignes)
+
+    @classmethod
+    def verifier(cls):
+        """
+        Compare la table aux valeurs recalculées depuis les tables brutes.
+        Retourne la liste des écarts sous forme de (influenceur_id, champ, stocké, attendu).
+        """
+        attendu = cls.calculer()
+        stocke = {s.influenceur_id: s for s in cls.objects.all()}
+        ecarts = []
+        for pk, compteurs in attendu.items():
+            stats = stocke.get(pk)
+            for champ, valeur in compteurs.items():
+                valeur_stockee = getattr(stats, champ) if stats else None
+                if valeur_stockee != valeur:
+                    ecarts.append((pk, champ, valeur_stockee, valeur))
+        return ecarts
+
+    @classmethod
+    def appliquer(cls, influenceur_id, creer=True, **deltas):
+        """
+        Applique des variations aux compteurs d'un influenceur en une seule requête UPDATE.
+        Si la ligne n'existe pas encore, elle est recalculée depuis les tables brutes.
+        """
+        deltas = {champ: delta for champ, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        modifications = {champ: F(champ) + delta for champ, delta in deltas.items()}
+        nb = cls.objects.filter(influenceur_id=influenceur_id).update(
+            date_mise_a_jour=timezone.now(), **modifications
+        )
+        if not nb and creer:
+            cls.recalculer(influenceur_id)
+
+    @classmethod
+    def appliquer_en_masse(cls, deltas_par_influenceur, taille_lot=500):
+        """
+        Applique des variations propres à chaque influenceur ({id: {champ: delta}}) en une
+        requête UPDATE par lot d'influenceurs (une expression CASE par champ).
+        Les lignes absentes sont recalculées depuis les tables brutes.
+        """
+        influenceur_ids = list(deltas_par_influenceur)
+        for debut in range(0, len(influenceur_ids), taille_lot):
+            lot = influenceur_ids[debut:debut + taille_lot]
+            champs = {champ for i in lot for champ, delta in deltas_par_influenceur[i].items() if delta}
+            if not champs:
+                continue
+            modifications = {
+                champ: F(champ) + Case(
+                    *[When(influenceur_id=i, then=Value(deltas_par_influenceur[i].get(champ, 0))) for i in lot],
+                    default=Value(0),
+                    output_field=cls._meta.get_field(champ),
+                )
+                for champ in champs
+            }
+            nb = cls.objects.filter(influenceur_id__in=lot).update(date_mise_a_jour=timezone.now(), **modifications)
+            if nb != len(lot):
+                existants = set(cls.objects.filter(influenceur_id__in=lot).values_list('influenceur_id', flat=True))
+                for influenceur_id in set(lot) - existants:
+                    cls.recalculer(influenceur_id)
+
+    @classmethod
+    def pour(cls, influenceur):
+        """Retourne les statistiques d'un influenceur (recalculées si absentes)"""
+        try:
+            return cls.objects.get(influenceur=influenceur)
+        except cls.DoesNotExist:
+            return cls.recalculer(influenceur.pk)
+
+    @classmethod
+    def totaux(cls):
+        """Somme des compteurs de tous les influenceurs (une requête)"""
+        totaux = cls.objects.aggregate(**{champ: Sum(champ) for champ in cls.COMPTEURS})
+        return {champ: valeur or 0 for champ, valeur in totaux.items()}
+
+
+class StatistiqueJournaliere(models.Model):
+    """
+    Compteurs journaliers par influenceur, alimentés par le job de cumul
+    (commande rollup_daily_stats). Les prospects sont rattachés à leur jour
+    d'inscription, les remises à leur jour de création.
+    """
+    influenceur = models.ForeignKey(Influenceur, on_delete=models.CASCADE, related_name='statistiques_journalieres')
+    jour = models.DateField()
+    nb_prospects = models.PositiveIntegerField(default=0)
+    nb_prospects_confirmes = models.PositiveIntegerField(default=0)
+    nb_prospects_rejetes = models.PositiveIntegerField(default=0)
+    nb_remises = models.PositiveIntegerField(default=0)
+    montant_remises = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    MESURES = ['nb_prospects', 'nb_prospects_confirmes', 'nb_prospects_rejetes', 'nb_remises', 'montant_remises']
+    NOM_CUMUL = 'statistiques_journalieres'
+
+    class Meta:
+        verbose_name = "Statistique journalière"
+        verbose_name_plural = "Statistiques journalières"
+        constraints = [
+            models.UniqueConstraint(fields=['influenceur', 'jour'], name='stat_journaliere_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['jour'], name='stat_journaliere_jour_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.influenceur_id} - {self.jour}"
+
+    @classmethod
+    def agreger(cls, debut, fin, influenceur_id=None):
+        """
+        Agrège les tables brutes par (influenceur, jour) sur [debut, fin] (dates incluses).
+        Retourne un dict {(influenceur_id, jour): {mesure: valeur}} en deux requêtes groupées.
+        """
+        from prospect.models import Prospect
+        from remise.models import Remise
+
+        borne_debut = timezone.make_aware(datetime.combine(debut, time.min))
+        borne_fin = timezone.make_aware(datetime.combine(fin + timedelta(days=1), time.min))
+        filtres = {'influenceur_id': influenceur_id} if influenceur_id is not None else {}
+        resultat = {}
+
+        requetes = (
+            (Prospect, 'date_inscription', {
+                'nb_prospects': Count('id'),
+                'nb_prospects_confirmes': Count('id', filter=Q(statut='confirme')),
+                'nb_prospects_rejetes': Count('id', filter=Q(statut='rejeter')),
+            }),
+            (Remise, 'date_creation', {
+                'nb_remises': Count('id'),
+                'montant_remises': Sum('montant'),
+            }),
+        )
+        for modele, champ_date, agregats in requetes:
+            lignes = (
+                modele.objects.filter(**{f'{champ_date}__gte': borne_debut, f'{champ_date}__lt': borne_fin}, **filtres)
+                .annotate(jour=TruncDate(champ_date))
+                .values('influenceur_id', 'jour')
+                .annotate(**agregats)
+                .order_by()
+            )
+            for ligne in lignes:
+                cle = (ligne.pop('influenceur_id'), ligne.pop('jour'))
+                mesures = resultat.setdefault(cle, {mesure: 0 for mesure in cls.MESURES})
+                mesures.update({mesure: valeur or 0 for mesure, valeur in ligne.items()})
+        return resultat
+
+    @classmethod
+    def cumuler(cls, jusqu_au=None, jours_a_recalculer=7, depuis=None):
+        """
+        Job de cumul incrémental : (re)calcule les compteurs des jours compris entre
+        le dernier jour cumulé (moins `jours_a_recalculer`, pour intégrer les changements
+        de statut récents) et `jusqu_au` (hier par défaut). Traite un mois à la fois.
+        Retourne le nombre de lignes écrites.
+        """
+        from prospect.models import Prospect
+
+        jusqu_au = jusqu_au or timezone.localdate() - timedelta(days=1)
+        if depuis is None:
+            dernier_jour = EtatCumul.lire(cls.NOM_CUMUL)
+            if dernier_jour is not None:
+                depuis = dernier_jour - timedelta(days=jours_a_recalculer - 1)
+            else:
+                premiere_inscription = Prospect.objects.order_by('date_inscription').values_list('date_inscription', flat=True).first()
+                depuis = timezone.localdate(premiere_inscription) if premiere_inscription else jusqu_au
+
+        nb_lignes = 0
+        debut = depuis
+        while debut <= jusqu_au:
+            fin = min(debut + timedelta(days=30), jusqu_au)
+            lignes = [
+                cls(influenceur_id=influenceur_id, jour=jour, **mesures)
+                for (influenceur_id, jour), mesures in cls.agreger(debut, fin).items()
+            ]
+            with transaction.atomic():
+                cls.objects.filter(jour__gte=debut, jour__lte=fin).delete()
+                cls.objects.bulk_create(lignes, batch_size=1000)
+                EtatCumul.objects.update_or_create(nom=cls.NOM_CUMUL, defaults={'dernier_jour': fin})
+            nb_lignes += len(lignes)
+            debut = fin + timedelta(days=1)
+        if depuis > jusqu_au:
+            # Rien à cumuler (aucune donnée antérieure) : le cumul est à jour
+            EtatCumul.objects.update_or_create(nom=cls.NOM_CUMUL, defaults={'dernier_jour': jusqu_au})
+        return nb_lignes
+
+
+class EtatCumul(models.Model):
+    """
+    Dernier jour entièrement traité par un job de cumul.
+    """
+    nom = models.CharField(max_length=50, unique=True)
+    dernier_jour = models.DateField()
+
+    def __str__(self):
+        return f"{self.nom} : {self.dernier_jour}"
+
+    @classmethod
+    def lire(cls, nom):
+        """Retourne le dernier jour cumulé pour le job `nom` (None s'il n'a jamais tourné)"""
+        return cls.objects.filter(nom=nom).values_list('dernier_jour', flat=True).first()
+
+
+class EmailSortant(models.Model):
+    """
+    File d'envoi des emails (outbox) : les vues enregistrent l'email à envoyer et le
+    dispatcher (commande run_email_dispatcher) les envoie par lots sur une seule connexion
+    SMTP. Un envoi en échec est retenté avec un délai croissant, puis abandonné (statut
+    « echec ») après EMAIL_OUTBOX_MAX_ATTEMPTS tentatives.
+    """
+    TYPE_CHOICES = [
+        ('affiliation', "Lien d'affiliation"),
+        ('bienvenue', 'Bienvenue'),
+    ]
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('envoye', 'Envoyé'),
+        ('echec', 'Echec'),
+    ]
+
+    type_email = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    influenceur = models.ForeignKey(Influenceur, on_delete=models.CASCADE, related_name='emails_sortants')
+    campagne = models.ForeignKey('CampagneEmail', on_delete=models.CASCADE, null=True, blank=True, related_name='emails')
+    destinataire = models.EmailField()
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    nb_tentatives = models.PositiveSmallIntegerField(default=0)
+    prochaine_tentative = models.DateTimeField(default=timezone.now)
+    derniere_erreur = models.TextField(blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_envoi = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['statut', 'prochaine_tentative'], name='email_sortant_a_envoyer_idx'),
+        ]
+        constraints = [
+            # Un seul email par destinataire et par campagne (reprise sans doublon)
+            models.UniqueConstraint(fields=['campagne', 'influenceur'], name='email_sortant_campagne_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_type_email_display()} -> {self.destinataire} ({self.statut})"
+
+    @classmethod
+    def mettre_en_file(cls, influenceur, *types_email):
+        """Enregistre les emails `types_email` à envoyer à l'influenceur (une requête)"""
+        return cls.objects.bulk_create([
+            cls(type_email=type_email, influenceur=influenceur, destinataire=influenceur.email)
+            for type_email in types_email
+        ])
+
+    @classmethod
+    def reserver_lot(cls, taille_lot, duree_reservation=timedelta(minutes=5), campagne=None):
+        """
+        Réserve jusqu'à `taille_lot` emails à envoyer (d'une `campagne` si elle est donnée) :
+        leur prochaine tentative est repoussée de `duree_reservation`, ce qui les masque aux
+        autres dispatchers pendant l'envoi (et les rend de nouveau disponibles si ce
+        dispatcher s'arrête avant la fin).
+        """
+        maintenant = timezone.now()
+        emails = cls.objects.filter(statut='en_attente', prochaine_tentative__lte=maintenant)
+        if campagne is not None:
+            emails = emails.filter(campagne=campagne)
+        with transaction.atomic():
+            lot = list(
+                # Seules les lignes d'emails sont verrouillées, pas les influenceurs joints
+                emails.select_for_update(skip_locked=True, of=('self',))
+                .select_related('influenceur')
+                .order_by('prochaine_tentative', 'pk')[:taille_lot]
+            )
+            if lot:
+                cls.objects.filter(pk__in=[e.pk for e in lot]).update(
+                    prochaine_tentative=maintenant + duree_reservation
+                )
+        return lot
+
+    @classmethod
+    def marquer_envoyes(cls, emails):
+        cls.objects.filter(pk__in=[e.pk for e in emails]).update(
+            statut='envoye', date_envoi=timezone.now(), derniere_erreur='', nb_tentatives=F('nb_tentatives') + 1
+        )
+
+    def marquer_echec(self, erreur):
+        """
+        Consigne un échec d'envoi : nouvelle tentative après un délai doublé à chaque essai
+        (EMAIL_OUTBOX_BACKOFF secondes au premier), abandon après EMAIL_OUTBOX_MAX_ATTEMPTS.
+        """
+        self.nb_tentatives += 1
+        self.derniere_erreur = str(erreur)[:1000]
+        if self.nb_tentatives >= getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5):
+            self.statut = 'echec'
+        else:
+            delai = getattr(settings, 'EMAIL_OUTBOX_BACKOFF', 60) * 2 ** (self.nb_tentatives - 1)
+            self.prochaine_tentative = timezone.now() + timedelta(seconds=delai)
+        self.save(update_fields=['nb_tentatives', 'derniere_erreur', 'statut', 'prochaine_tentative'])
+
+
+class CampagneEmail(models.Model):
+    """
+    Envoi d'un email à tous les influenceurs actifs (ex. renvoi des liens d'affiliation).
+    La préparation parcourt les influenceurs par lots et crée un EmailSortant par
+    destinataire, envoyé ensuite par le dispatcher : le statut de chaque destinataire est
+    celui de son EmailSortant. Une préparation interrompue reprend après le dernier
+    influenceur traité.
+    """
+    STATUT_CHOICES = [
+        ('preparation', 'En préparation'),
+        ('envoi', 'En cours d\'envoi'),
+        ('terminee', 'Terminée'),
+    ]
+
+    type_email = models.CharField(max_length=20, choices=EmailSortant.TYPE_CHOICES, default='affiliation')
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='preparation')
+    demande_par = models.CharField(max_length=150, blank=True)
+    nb_destinataires = models.PositiveIntegerField(default=0)
+    # Curseur de préparation : dernier influenceur mis en file
+    dernier_influenceur_id = models.PositiveIntegerField(default=0)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Campagne {self.get_type_email_display()} #{self.pk} - {self.statut}"
+
+    def preparer(self, taille_lot=1000, nb_lots=None):
+        """
+        Met en file un email par influenceur actif, par lots de `taille_lot` (une transaction
+        par lot, curseur enregistré avec le lot), au plus `nb_lots` lots par appel. Le curseur
+        est relu sous verrou à chaque lot : la commande et les dispatchers peuvent préparer
+        la même campagne. Sans effet sur une campagne déjà préparée.
+        """
+        while nb_lots is None or nb_lots > 0:
+            with transaction.atomic():
+                etat = (type(self).objects.select_for_update()
+                        .values('statut', 'dernier_influenceur_id', 'nb_destinataires').get(pk=self.pk))
+                for champ, valeur in etat.items():
+                    setattr(self, champ, valeur)
+                if self.statut != 'preparation':
+                    return
+                lot = list(
+                    Influenceur.objects.filter(is_active=True, pk__gt=self.dernier_influenceur_id)
+                    .order_by('pk').values_list('pk', 'email')[:taille_lot]
+                )
+                if lot:
+                    # Après une interruption, une partie du lot peut déjà être en file
+                    deja_en_file = set(self.emails.filter(
+                        influenceur_id__in=[influenceur_id for influenceur_id, _ in lot]
+                    ).values_list('influenceur_id', flat=True))
+                    nouveaux = [
+                        EmailSortant(type_email=self.type_email, campagne=self,
+                                     influenceur_id=influenceur_id, destinataire=email)
+                        for influenceur_id, email in lot if influenceur_id not in deja_en_file
+                    ]
+                    EmailSortant.objects.bulk_create(nouveaux, ignore_conflicts=True)
+                    self.dernier_influenceur_id = lot[-1][0]
+                    self.nb_destinataires += len(nouveaux)
+                if len(lot) < taille_lot:
+                    self.statut = 'envoi'
+                self.save(update_fields=['dernier_influenceur_id', 'nb_destinataires', 'statut'])
+            if nb_lots is not None:
+                nb_lots -= 1
+
+    @classmethod
+    def preparer_en_attente(cls, taille_lot=1000):
+        """
+        Prépare un lot de la plus ancienne campagne en préparation (run_email_dispatcher) ;
+        False s'il n'y en a aucune
+        """
+        campagne = cls.objects.filter(statut='preparation').order_by('pk').first()
+        if campagne is None:
+            return False
+        campagne.preparer(taille_lot, nb_lots=1)
+        return True
+
+    def rapport(self):
+        """
+        Avancement de la campagne : destinataires par statut et débit d'envoi constaté
+        (emails envoyés par seconde entre le premier et le dernier envoi).
+        """
+        emails = self.emails.all()
+        comptes = dict(emails.values_list('statut').annotate(n=Count('id')).order_by())
+        envois = emails.filter(statut='envoye').aggregate(premier=models.Min('date_envoi'), dernier=models.Max('date_envoi'))
+        if self.statut == 'envoi' and not comptes.get('en_attente'):
+            self.statut = 'terminee'
+            self.date_fin = timezone.now()
+            self.save(update_fields=['statut', 'date_fin'])
+
+        duree = (envois['dernier'] - envois['premier']).total_seconds() if envois['premier'] else 0
+        nb_envoyes = comptes.get('envoye', 0)
+        return {
+            'id': self.pk,
+            'type_email': self.type_email,
+            'statut': self.statut,
+            'nb_destinataires': self.nb_destinataires,
+            'nb_envoyes': nb_envoyes,
+            'nb_en_attente': comptes.get('en_attente', 0),
+            'nb_echecs': comptes.get('echec', 0),
+            'duree_envoi_s': round(duree, 3),
+            'debit_par_seconde': round(nb_envoyes / duree, 2) if duree else None,
+            'date_creation': self.date_creation,
+            'date_fin': self.date_fin,
+        }
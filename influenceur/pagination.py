@@ -0,0 +1,72 @@
+from rest_framework import status
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from .lecture_rapide import plan_de_lecture
+
+# Valeurs du paramètre ?pagination= qui rétablissent l'ancienne réponse (liste complète)
+VALEURS_SANS_PAGINATION = ('false', '0', 'non', 'off')
+
+
+class ProspectCursorPagination(CursorPagination):
+    """
+    Pagination par curseur des prospects, du plus récent au plus ancien.
+    Le coût d'une page ne dépend pas de sa profondeur (index prospect_date_id_idx).
+    """
+    ordering = ('-date_inscription', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class RemiseCursorPagination(CursorPagination):
+    """
+    Pagination par curseur des remises, de la plus récente à la plus ancienne.
+    """
+    ordering = ('-date_creation', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class EmailSortantCursorPagination(CursorPagination):
+    """
+    Pagination par curseur des emails d'une campagne, dans l'ordre de mise en file.
+    """
+    ordering = ('id',)
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+def pagination_desactivee(request):
+    """Mode de compatibilité : ?pagination=false renvoie la liste complète comme avant"""
+    return request.GET.get('pagination', '').lower() in VALEURS_SANS_PAGINATION
+
+
+def champs_a_deplier(request):
+    """Détails imbriqués demandés par ?expand=influenceur,remise"""
+    return {nom.strip() for nom in request.GET.get('expand', '').split(',') if nom.strip()}
+
+
+def reponse_paginee(request, queryset, serializer_class, pagination_class):
+    """
+    Sérialise un queryset page par page (réponse {next, previous, results}),
+    ou en entier si le client a demandé le mode de compatibilité.
+    Les jointures déclarées par le serializer (voir DepliableMixin) sont appliquées
+    pour que chaque page coûte une seule requête.
+    Les serializers marqués `lecture_rapide` sont servis depuis `.values()` (voir
+    influenceur/lecture_rapide.py), pour un JSON identique.
+    """
+    expand = champs_a_deplier(request)
+    if getattr(serializer_class, 'lecture_rapide', False):
+        plan = plan_de_lecture(serializer_class, expand)
+        queryset = queryset.values(*plan.chemins)
+        serialiser = lambda lignes: [plan.construire(ligne) for ligne in lignes]
+    else:
+        if hasattr(serializer_class, 'jointures'):
+            queryset = queryset.select_related(*serializer_class.jointures(expand))
+        serialiser = lambda objets: serializer_class(objets, many=True, context={'expand': expand}).data
+
+    if pagination_desactivee(request):
+        return Response(serialiser(queryset.order_by(*pagination_class.ordering)), status=status.HTTP_200_OK)
+
+    paginator = pagination_class()
+    page = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(serialiser(page))
@@ -1,5 +1,6 @@
 from rest_framework import permissions
 from rest_framework.permissions import BasePermission
+from .auth import get_influenceur_for_permissions
 
 class IsAdminUser(BasePermission):
     """
@@ -8,13 +9,14 @@ class IsAdminUser(BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        
-        # Si c'est un influenceur connecté
-        if hasattr(request.user, 'influenceur'):
-            return request.user.influenceur.is_admin()
-        
+
         # Si c'est un superutilisateur Django
-        return request.user.is_superuser
+        if request.user.is_superuser:
+            return True
+
+        # Si c'est un influenceur connecté
+        influenceur = get_influenceur_for_permissions(request)
+        return influenceur is not None and influenceur.is_active and influenceur.is_admin()
 
 class IsInfluenceurOrAdmin(BasePermission):
     """
@@ -23,80 +25,55 @@ class IsInfluenceurOrAdmin(BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        
+
         # Superutilisateur a tous les droits
         if request.user.is_superuser:
             return True
-        
+
         # Vérifier si c'est un influenceur
-        if hasattr(request.user, 'influenceur'):
-            return request.user.influenceur.is_active
-        
-        return False
+        influenceur = get_influenceur_for_permissions(request)
+        return influenceur is not None and influenceur.is_active
 
-class CanCreateInfluenceurs(BasePermission):
+class _PermissionInfluenceur(BasePermission):
     """
-    Permission pour créer des influenceurs
+    Permission accordée aux superutilisateurs et aux influenceurs actifs ayant
+    la permission `permission` (voir Influenceur.has_permission)
     """
+    permission = None
+
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        
+
         if request.user.is_superuser:
             return True
-        
-        if hasattr(request.user, 'influenceur'):
-            return request.user.influenceur.has_permission('creer_influenceurs')
-        
-        return False
 
-class CanValidateProspects(BasePermission):
+        influenceur = get_influenceur_for_permissions(request)
+        return influenceur is not None and influenceur.is_active and influenceur.has_permission(self.permission)
+
+class CanCreateInfluenceurs(_PermissionInfluenceur):
+    """
+    Permission pour créer des influenceurs
+    """
+    permission = 'creer_influenceurs'
+
+class CanValidateProspects(_PermissionInfluenceur):
     """
     Permission pour valider des prospects
     """
-    def has_permission(self, request, view):
-        if not request.user.is_authenticated:
-            return False
-        
-        if request.user.is_superuser:
-            return True
-        
-        if hasattr(request.user, 'influenceur'):
-            return request.user.influenceur.has_permission('valider_prospects')
-        
-        return False
+    permission = 'valider_prospects'
 
-class CanPayRemises(BasePermission):
+class CanPayRemises(_PermissionInfluenceur):
     """
     Permission pour payer des remises
     """
-    def has_permission(self, request, view):
-        if not request.user.is_authenticated:
-            return False
-        
-        if request.user.is_superuser:
-            return True
-        
-        if hasattr(request.user, 'influenceur'):
-            return request.user.influenceur.has_permission('payer_remises')
-        
-        return False
+    permission = 'payer_remises'
 
-class CanViewStatistics(BasePermission):
+class CanViewStatistics(_PermissionInfluenceur):
     """
     Permission pour voir les statistiques
     """
-    def has_permission(self, request, view):
-        if not request.user.is_authenticated:
-            return False
-        
-        if request.user.is_superuser:
-            return True
-        
-        if hasattr(request.user, 'influenceur'):
-            return request.user.influenceur.has_permission('voir_statistiques')
-        
-        return False
+    permission = 'voir_statistiques'
 
 class IsOwnerOrAdmin(BasePermission):
     """
@@ -105,18 +82,15 @@ class IsOwnerOrAdmin(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_superuser:
             return True
-        
-        if hasattr(request.user, 'influenceur'):
+
+        influenceur = get_influenceur_for_permissions(request)
+        if influenceur is not None:
             # Admin peut tout voir
-            if request.user.influenceur.is_admin():
+            if influenceur.is_admin():
                 return True
-            
-            # Vérifier si l'objet appartient à l'influenceur
-            if hasattr(obj, 'influenceur'):
-                return obj.influenceur == request.user.influenceur
-            
-            # Pour les objets qui ont directement un influenceur
-            if hasattr(obj, 'influenceur'):
-                return obj.influenceur == request.user.influenceur
-        
-        return False 
\ No newline at end of file
+
+            # Vérifier si l'objet appartient à l'influenceur (claims du token ou instance)
+            if hasattr(obj, 'influenceur_id'):
+                return obj.influenceur_id == getattr(influenceur, 'influenceur_id', influenceur.pk)
+
+        return False
@@ -1,13 +1,14 @@
 from rest_framework import serializers
-from .models import Influenceur
+from .models import Influenceur, EmailSortant
 
 class InfluenceurSerializer(serializers.ModelSerializer):
     """
-    Serializer pour la lecture des influenceurs (tous les champs)
+    Serializer pour la lecture des influenceurs (tous les champs, sauf le compteur interne
+    de révocation des tokens)
     """
     class Meta:
         model = Influenceur
-        fields = '__all__'
+        exclude = ['version_permissions']
         extra_kwargs = {
             'password': {'write_only': True},
         }
@@ -33,6 +34,43 @@ class InfluenceurSerializer(serializers.ModelSerializer):
     def get_affiliation_link(self, obj):
         return obj.get_affiliation_link()
 
+class DepliableMixin:
+    """
+    Serializer de liste dont les détails imbriqués ne sont inclus que sur demande
+    (?expand=influenceur,remise). `champs_depliables` associe chaque valeur acceptée
+    par ?expand au champ de détail correspondant ; les champs non demandés sont retirés.
+    `select_related` liste les jointures toujours nécessaires, `jointures_depliables`
+    celles qui ne le sont que lorsqu'un détail est demandé.
+    """
+    champs_depliables = {}
+    select_related = ()
+    jointures_depliables = {}
+
+    @classmethod
+    def jointures(cls, demandes=()):
+        """Jointures à appliquer au queryset pour sérialiser une page en une seule requête"""
+        jointures = list(cls.select_related)
+        for nom in demandes:
+            jointures.extend(cls.jointures_depliables.get(nom, ()))
+        return jointures
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        demandes = self.context.get('expand', ())
+        for nom, champ in self.champs_depliables.items():
+            if nom not in demandes:
+                self.fields.pop(champ, None)
+
+
+class InfluenceurResumeSerializer(serializers.ModelSerializer):
+    """
+    Résumé d'un influenceur pour les listes (sans données sensibles)
+    """
+    class Meta:
+        model = Influenceur
+        fields = ['id', 'nom', 'code_affiliation']
+
+
 class InfluenceurUpdateSerializer(serializers.ModelSerializer):
     """
     Serializer pour la modification des influenceurs (champs modifiables uniquement)
@@ -70,6 +108,14 @@ class InfluenceurUpdateSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
+class InfluenceurProfilSerializer(InfluenceurUpdateSerializer):
+    """
+    Serializer pour la modification de son propre profil par un influenceur non admin :
+    le rôle, l'activation et les permissions ne sont modifiables que par un admin
+    """
+    class Meta(InfluenceurUpdateSerializer.Meta):
+        fields = ['nom', 'email', 'telephone', 'password']
+
 class InfluenceurCreateSerializer(serializers.ModelSerializer):
     """
     Serializer pour la création d'influenceurs (champs requis pour la création)
@@ -109,4 +155,15 @@ class InfluenceurCreateSerializer(serializers.ModelSerializer):
             )
         else:
             # Si pas de mot de passe, créer normalement
-            return super().create(validated_data)
\ No newline at end of file
+            return super().create(validated_data)
+
+
+class EmailSortantSerializer(serializers.ModelSerializer):
+    """Statut d'envoi d'un email de la file (destinataire d'une campagne)"""
+    # Listes servies depuis .values() (influenceur/lecture_rapide.py)
+    lecture_rapide = True
+
+    class Meta:
+        model = EmailSortant
+        fields = ['id', 'influenceur', 'destinataire', 'statut', 'nb_tentatives', 'derniere_erreur', 'date_envoi']
+        read_only_fields = fields
@@ -0,0 +1,128 @@
+from decimal import Decimal
+from django.core.signals import request_finished
+from django.db import close_old_connections, connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Influenceur, InfluenceurStats
+from . import activite, cache
+
+
+def _deltas_prospect(statut, signe):
+    return {'nb_prospects': signe, InfluenceurStats.CHAMPS_PROSPECTS[statut]: signe}
+
+
+def _deltas_remise(statut, montant, signe):
+    champ_nb, champ_montant = InfluenceurStats.CHAMPS_REMISES[statut]
+    return {'nb_remises': signe, champ_nb: signe, champ_montant: signe * Decimal(str(montant))}
+
+
+def _fusionner(*dicts):
+    resultat = {}
+    for d in dicts:
+        for champ, delta in d.items():
+            resultat[champ] = resultat.get(champ, 0) + delta
+    return resultat
+
+
+def _appliquer_transition(instance, calculer_deltas, champs):
+    """
+    Applique aux statistiques la transition entre l'état initial d'une instance
+    (mémorisé au chargement) et son état courant.
+    Retourne les identifiants des influenceurs concernés.
+    """
+    ancien = instance.get_etat_initial()
+    nouveau = {champ: getattr(instance, champ) for champ in champs}
+
+    if ancien is not None and any(champ not in ancien for champ in champs):
+        # Etat initial incomplet (champs différés) : recalcul complet
+        InfluenceurStats.recalculer(instance.influenceur_id)
+        if ancien.get('influenceur_id', instance.influenceur_id) != instance.influenceur_id:
+            InfluenceurStats.recalculer(ancien['influenceur_id'])
+    elif ancien != nouveau:
+        if ancien is None:
+            InfluenceurStats.appliquer(instance.influenceur_id, **calculer_deltas(nouveau, 1))
+        elif ancien['influenceur_id'] == nouveau['influenceur_id']:
+            InfluenceurStats.appliquer(
+                instance.influenceur_id,
+                **_fusionner(calculer_deltas(ancien, -1), calculer_deltas(nouveau, 1))
+            )
+        else:
+            InfluenceurStats.appliquer(ancien['influenceur_id'], **calculer_deltas(ancien, -1))
+            InfluenceurStats.appliquer(nouveau['influenceur_id'], **calculer_deltas(nouveau, 1))
+    instance.memoriser_etat()
+    return {instance.influenceur_id, (ancien or {}).get('influenceur_id')}
+
+
+def _prospect(etat, signe):
+    return _deltas_prospect(etat['statut'], signe)
+
+
+def _remise(etat, signe):
+    return _deltas_remise(etat['statut'], etat['montant'], signe)
+
+
+# Champs de l'influenceur repris dans les réponses mises en cache
+CHAMPS_INFLUENCEUR_EN_CACHE = {'nom', 'email', 'code_affiliation', 'date_creation'}
+
+
+@receiver(post_save, sender=Influenceur)
+def creer_stats_influenceur(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if created and not raw:
+        InfluenceurStats.objects.get_or_create(influenceur=instance)
+    # Les sauvegardes partielles (dernière connexion, tentatives...) n'invalident pas le cache
+    if update_fields is None or CHAMPS_INFLUENCEUR_EN_CACHE.intersection(update_fields):
+        cache.invalider(instance.pk)
+    # Résolution code -> influenceur : invalidée si le code ou l'activation a changé
+    ancien = instance.get_etat_initial() or {}
+    if any(ancien.get(champ) != getattr(instance, champ) for champ in ('code_affiliation', 'is_active')):
+        cache.invalider_codes(instance.code_affiliation, ancien.get('code_affiliation'))
+    # Résolution utilisateur -> influenceur : invalidée à chaque sauvegarde (ancien email compris)
+    cache.invalider_utilisateurs(instance.email, ancien.get('email'))
+    # Tokens JWT révoqués si les permissions ou le mot de passe ont changé
+    if getattr(instance, '_permissions_modifiees', False):
+        cache.enregistrer_version_permissions(instance.pk, instance.version_permissions)
+    instance.memoriser_etat()
+
+
+@receiver(post_delete, sender=Influenceur)
+def invalider_cache_influenceur(sender, instance, **kwargs):
+    cache.invalider(instance.pk)
+    cache.invalider_codes(instance.code_affiliation)
+    cache.invalider_utilisateurs(instance.email)
+    cache.enregistrer_version_permissions(instance.pk, -1)
+
+
+@receiver(post_save, sender='prospect.Prospect')
+def maj_stats_prospect(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cache.invalider(*_appliquer_transition(instance, _prospect, sender.champs_suivis))
+
+
+@receiver(post_delete, sender='prospect.Prospect')
+def retirer_stats_prospect(sender, instance, **kwargs):
+    InfluenceurStats.appliquer(instance.influenceur_id, creer=False, **_deltas_prospect(instance.statut, -1))
+    cache.invalider(instance.influenceur_id)
+
+
+@receiver(post_save, sender='remise.Remise')
+def maj_stats_remise(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cache.invalider(*_appliquer_transition(instance, _remise, sender.champs_suivis))
+
+
+@receiver(post_delete, sender='remise.Remise')
+def retirer_stats_remise(sender, instance, **kwargs):
+    InfluenceurStats.appliquer(
+        instance.influenceur_id, creer=False, **_deltas_remise(instance.statut, instance.montant, -1)
+    )
+    cache.invalider(instance.influenceur_id)
+
+
+@receiver(request_finished)
+def ecrire_activites(sender, **kwargs):
+    # Dernières activités écrites par lots, après l'envoi de la réponse (voir activite.py).
+    # close_old_connections de Django est déjà passé : la connexion rouverte par l'écriture
+    # est soumise ici aux mêmes règles (CONN_MAX_AGE, erreurs), hors transaction en cours
+    activite.vider()
+    if not connection.in_atomic_block:
+        close_old_connections()
@@ -0,0 +1,222 @@
+from django.db.models import F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from datetime import timedelta
+from prospect.models import Prospect
+from remise.models import Remise
+from .models import (Influenceur, InfluenceurStats, StatistiqueJournaliere, EtatCumul,
+                     calculer_taux_conversion)
+
+
+def derniers_mois(nb_mois, reference=None):
+    """
+    Retourne les premiers jours des `nb_mois` derniers mois (mois courant inclus),
+    du plus ancien au plus récent.
+    """
+    reference = reference or timezone.localdate()
+    annee, mois = reference.year, reference.month
+    resultat = []
+    for _ in range(nb_mois):
+        resultat.append(reference.replace(year=annee, month=mois, day=1))
+        mois -= 1
+        if mois == 0:
+            annee, mois = annee - 1, 12
+    return list(reversed(resultat))
+
+
+GRANULARITES = ('jour', 'semaine', 'mois')
+TRONCATURES = {'semaine': 'week', 'mois': 'month'}
+
+
+def debut_de_periode(jour, granularite):
+    """Premier jour de la période (jour, semaine commençant le lundi, mois) contenant `jour`"""
+    if granularite == 'semaine':
+        return jour - timedelta(days=jour.weekday())
+    if granularite == 'mois':
+        return jour.replace(day=1)
+    return jour
+
+
+def nb_periodes(debut, fin, granularite):
+    """Nombre de périodes couvrant [debut, fin], calculé sans les énumérer"""
+    if fin < debut:
+        return 0
+    if granularite == 'mois':
+        return (fin.year - debut.year) * 12 + fin.month - debut.month + 1
+    ecart = (debut_de_periode(fin, granularite) - debut_de_periode(debut, granularite)).days
+    return ecart // (7 if granularite == 'semaine' else 1) + 1
+
+
+def periodes(debut, fin, granularite):
+    """Liste des débuts de période couvrant [debut, fin]"""
+    resultat = []
+    courant = debut_de_periode(debut, granularite)
+    for i in range(nb_periodes(debut, fin, granularite)):
+        if i:
+            # Période suivante calculée seulement si elle existe (pas de dépassement en 9999)
+            if granularite == 'mois':
+                courant = (courant + timedelta(days=32)).replace(day=1)
+            else:
+                courant += timedelta(days=7 if granularite == 'semaine' else 1)
+        resultat.append(courant)
+    return resultat
+
+
+def serie_evolution(debut, fin, granularite='jour', influenceur_id=None):
+    """
+    Série d'évolution (prospects, confirmés, rejetés, remises, montant) sur [debut, fin].
+    Les jours déjà cumulés sont lus dans StatistiqueJournaliere et regroupés par la base
+    selon la granularité ; les jours suivants (normalement le jour courant) sont calculés
+    en direct depuis les tables brutes puis fusionnés. Le coût ne dépend pas de la
+    longueur de la plage mais du nombre de lignes pré-agrégées.
+    """
+    mesures = StatistiqueJournaliere.MESURES
+    dernier_jour = EtatCumul.lire(StatistiqueJournaliere.NOM_CUMUL)
+    filtres = {'influenceur_id': influenceur_id} if influenceur_id is not None else {}
+    totaux = {}
+
+    def ajouter(periode, valeurs):
+        cumul = totaux.setdefault(periode, dict.fromkeys(mesures, 0))
+        for mesure in mesures:
+            cumul[mesure] += valeurs[mesure] or 0
+
+    # Jours cumulés : regroupement par période directement en base
+    fin_cumul = min(fin, dernier_jour) if dernier_jour else None
+    if fin_cumul and debut <= fin_cumul:
+        periode = F('jour') if granularite == 'jour' else Trunc('jour', TRONCATURES[granularite])
+        lignes = (
+            StatistiqueJournaliere.objects.filter(jour__gte=debut, jour__lte=fin_cumul, **filtres)
+            .annotate(periode=periode)
+            .values('periode')
+            .annotate(**{mesure: Sum(mesure) for mesure in mesures})
+            .order_by()
+        )
+        for ligne in lignes:
+            ajouter(ligne['periode'], ligne)
+
+    # Jours non encore cumulés (jour courant) : calcul en direct
+    debut_direct = max(debut, dernier_jour + timedelta(days=1)) if dernier_jour else debut
+    if debut_direct <= fin:
+        for (_, jour), valeurs in StatistiqueJournaliere.agreger(debut_direct, fin, influenceur_id).items():
+            ajouter(debut_de_periode(jour, granularite), valeurs)
+
+    vide = dict.fromkeys(mesures, 0)
+    return [
+        dict(totaux.get(p, vide), periode=p, montant_remises=float(totaux.get(p, vide)['montant_remises']))
+        for p in periodes(debut, fin, granularite)
+    ]
+
+
+def tableau_de_bord_influenceur(influenceur, nb_mois=6):
+    """
+    Construit les données du tableau de bord d'un influenceur.
+    Le nombre de requêtes est borné quel que soit l'historique :
+    statistiques agrégées, évolution (cumuls + jour courant) et prospects récents.
+    """
+    prospects = Prospect.objects.filter(influenceur=influenceur)
+
+    # Compteurs lus dans la table de statistiques maintenue incrémentalement
+    stats = InfluenceurStats.pour(influenceur)
+
+    # Evolution mensuelle (prospects/remises par mois), servie par les cumuls journaliers
+    mois = derniers_mois(nb_mois)
+    evolution = [
+        {"mois": ligne['periode'].strftime('%b'), "prospects": ligne['nb_prospects'], "remises": ligne['nb_remises']}
+        for ligne in serie_evolution(mois[0], timezone.localdate(), 'mois', influenceur.pk)
+    ]
+
+    # Répartition des remises par statut
+    repartition_remises = [
+        {"statut": statut, "count": getattr(stats, InfluenceurStats.CHAMPS_REMISES[statut][0])}
+        for statut, _ in Remise.STATUT_CHOICES
+    ]
+
+    # Prospects récents (10 derniers), remise chargée par jointure
+    prospects_recents = [
+        {
+            "nom": p.nom,
+            "email": p.email,
+            "statut": p.statut,
+            "montant": p.remise.montant if p.remise else 0,
+            "date": p.date_inscription.strftime('%Y-%m-%d')
+        }
+        for p in prospects.select_related('remise').order_by('-date_inscription')[:10]
+    ]
+
+    return {
+        "total_prospects": stats.nb_prospects,
+        "total_remises": stats.nb_remises,
+        "total_gains": float(stats.montant_paye),
+        "taux_conversion": stats.taux_conversion,
+        "nb_prospects_confirmes": stats.nb_prospects_confirmes,
+        "nb_prospects_rejetes": stats.nb_prospects_rejetes,
+        "nb_prospects_en_attente": stats.nb_prospects_en_attente,
+        "evolution": evolution,
+        "repartition_remises": repartition_remises,
+        "prospects_recents": prospects_recents
+    }
+
+
+def classement_influenceurs(limite=5):
+    """
+    Retourne les `limite` meilleurs influenceurs (par nombre de prospects).
+    Une seule requête quel que soit le nombre d'influenceurs : le classement est lu
+    dans la table InfluenceurStats, jointe à l'influenceur.
+    """
+    top = (
+        InfluenceurStats.objects.select_related('influenceur')
+        .order_by('-nb_prospects', 'influenceur_id')[:limite]
+    )
+    classement = []
+    for stats in top:
+        i = stats.influenceur
+        classement.append({
+            'id': i.id,
+            'nom': i.nom,
+            'email': i.email,
+            'code_affiliation': i.code_affiliation,
+            'nb_prospects': stats.nb_prospects,
+            'nb_prospects_confirmes': stats.nb_prospects_confirmes,
+            'nb_prospects_rejetes': stats.nb_prospects_rejetes,
+            'nb_prospects_en_attente': stats.nb_prospects_en_attente,
+            'taux_conversion': stats.taux_conversion,
+            'nb_remises': stats.nb_remises,
+            'nb_remises_payees': stats.nb_remises_payees,
+            'total_gains': float(stats.montant_paye),
+            'date_creation': i.date_creation.strftime('%Y-%m-%d') if i.date_creation else None
+        })
+    return classement
+
+
+def evolution_prospects_par_jour(nb_jours=7):
+    """Nombre d'inscriptions par jour sur les `nb_jours` derniers jours"""
+    today = timezone.localdate()
+    return [
+        {'date': str(ligne['periode']), 'count': ligne['nb_prospects']}
+        for ligne in serie_evolution(today - timedelta(days=nb_jours - 1), today, 'jour')
+    ]
+
+
+def tableau_de_bord_global(nb_top=5, nb_jours=7):
+    """
+    Construit les données du dashboard global admin.
+    Le nombre de requêtes est borné quel que soit le volume de données.
+    """
+    total_influenceurs = Influenceur.objects.count()
+    totaux = InfluenceurStats.totaux()
+
+    return {
+        'total_influenceurs': total_influenceurs,
+        'total_prospects': totaux['nb_prospects'],
+        'prospects_en_attente': totaux['nb_prospects_en_attente'],
+        'prospects_confirmes': totaux['nb_prospects_confirmes'],
+        'prospects_rejetes': totaux['nb_prospects_rejetes'],
+        'taux_conversion_global': calculer_taux_conversion(totaux['nb_prospects_confirmes'], totaux['nb_prospects_rejetes']),
+        'total_primes': totaux['nb_remises'],
+        'primes_payees': totaux['nb_remises_payees'],
+        'primes_en_attente': totaux['nb_remises_en_attente'],
+        'total_gains_global': float(totaux['montant_paye']),
+        'total_gains_en_attente': float(totaux['montant_en_attente']),
+        'top_influenceurs': classement_influenceurs(nb_top),
+        'evolution_prospects': evolution_prospects_par_jour(nb_jours),
+    }
@@ -0,0 +1,1411 @@
+from datetime import timedelta
+from io import StringIO
+import json
+import os
+import re
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from prospect.models import Prospect
+from remise.models import Remise
+from .email_service import EmailService, LimiteurDebit
+from .models import Influenceur, InfluenceurStats, StatistiqueJournaliere, EmailSortant, CampagneEmail
+from .statistiques import serie_evolution
+from . import activite, cache as cache_stats, detecteur_n1, instrumentation
+from .detecteur_n1 import BudgetRequetesMixin
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class DashboardInfluenceurTests(TestCase):
+    """
+    Tests du tableau de bord d'un influenceur
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.influenceur = Influenceur.create_influenceur(nom='Awa Traoré', email='awa@example.com', password='secret')
+        self.nb_prospects = 0
+
+    def creer_historique(self, nb_mois):
+        """Crée des prospects et remises répartis sur `nb_mois` mois"""
+        maintenant = timezone.now()
+        for i in range(nb_mois):
+            date = maintenant - timedelta(days=30 * i)
+            remise = Remise.objects.create(influenceur=self.influenceur, montant=Decimal('10.00'), statut='payee')
+            Remise.objects.filter(pk=remise.pk).update(date_creation=date)
+            for statut in ['confirme', 'rejeter', 'en_attente']:
+                self.nb_prospects += 1
+                Prospect.objects.create(
+                    nom=f'Prospect {self.nb_prospects}',
+                    email=f'prospect{self.nb_prospects}@example.com',
+                    telephone=f'{self.nb_prospects:08d}',
+                    statut=statut,
+                    influenceur=self.influenceur,
+                    remise=remise if statut == 'confirme' else None,
+                    date_inscription=date,
+                )
+
+    def get_dashboard(self):
+        return self.client.get(reverse('influenceur_dashboard', args=[self.influenceur.pk]))
+
+    def test_statistiques(self):
+        self.creer_historique(3)
+        response = self.get_dashboard()
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total_prospects'], 9)
+        self.assertEqual(data['nb_prospects_confirmes'], 3)
+        self.assertEqual(data['nb_prospects_rejetes'], 3)
+        self.assertEqual(data['nb_prospects_en_attente'], 3)
+        self.assertEqual(data['taux_conversion'], 50.0)
+        self.assertEqual(data['total_remises'], 3)
+        self.assertEqual(data['total_gains'], 30.0)
+        self.assertEqual(len(data['evolution']), 6)
+        self.assertEqual(sum(m['prospects'] for m in data['evolution']), 9)
+        self.assertEqual(data['repartition_remises'], [
+            {'statut': 'en_attente', 'count': 0},
+            {'statut': 'payee', 'count': 3},
+        ])
+        self.assertEqual(len(data['prospects_recents']), 9)
+
+    def test_nombre_de_requetes_constant(self):
+        # influenceur + statistiques + état du cumul + cumuls journaliers
+        # + jour courant (prospects, remises) + prospects récents ;
+        # l'utilisateur courant est résolu depuis le cache après la première requête
+        self.creer_historique(1)
+        StatistiqueJournaliere.cumuler()
+        with self.assertNumQueries(8):
+            self.get_dashboard()
+        self.creer_historique(12)
+        StatistiqueJournaliere.cumuler(depuis=timezone.localdate() - timedelta(days=400))
+        with self.assertNumQueries(7):
+            self.get_dashboard()
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class DashboardGlobalAdminTests(TestCase):
+    """
+    Tests du dashboard global admin
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.nb_influenceurs = 0
+        self.nb_prospects = 0
+
+    def creer_influenceurs(self, nb, prospects_par_influenceur=2):
+        for _ in range(nb):
+            self.nb_influenceurs += 1
+            influenceur = Influenceur.create_influenceur(
+                nom=f'Influenceur {self.nb_influenceurs}',
+                email=f'influenceur{self.nb_influenceurs}@example.com',
+                password='secret',
+            )
+            remise = Remise.objects.create(influenceur=influenceur, montant=Decimal('20.00'), statut='payee')
+            Remise.objects.create(influenceur=influenceur, montant=Decimal('5.00'))
+            for k in range(prospects_par_influenceur):
+                self.nb_prospects += 1
+                Prospect.objects.create(
+                    nom=f'Prospect {self.nb_prospects}',
+                    email=f'prospect{self.nb_prospects}@example.com',
+                    telephone=f'{self.nb_prospects:08d}',
+                    statut='confirme' if k % 2 == 0 else 'rejeter',
+                    influenceur=influenceur,
+                    remise=remise if k % 2 == 0 else None,
+                )
+            prospects_par_influenceur += 1
+
+    def test_classement_sans_surcomptage(self):
+        self.creer_influenceurs(3)
+        response = self.client.get(reverse('dashboard_global_admin'), {'top': 2, 'jours': 3})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total_influenceurs'], 3)
+        self.assertEqual(data['total_prospects'], 9)
+        self.assertEqual(data['total_primes'], 6)
+        self.assertEqual(data['total_gains_global'], 60.0)
+        self.assertEqual(data['total_gains_en_attente'], 15.0)
+        self.assertEqual(len(data['evolution_prospects']), 3)
+        self.assertEqual(data['evolution_prospects'][-1]['count'], 9)
+
+        top = data['top_influenceurs']
+        self.assertEqual([i['nb_prospects'] for i in top], [4, 3])
+        # Les remises ne doivent pas être multipliées par le nombre de prospects
+        self.assertEqual(top[0]['nb_remises'], 2)
+        self.assertEqual(top[0]['nb_remises_payees'], 1)
+        self.assertEqual(top[0]['total_gains'], 20.0)
+        self.assertEqual(top[0]['taux_conversion'], 50.0)
+
+    def test_nombre_de_requetes_constant(self):
+        self.creer_influenceurs(2)
+        StatistiqueJournaliere.cumuler()
+        with self.assertNumQueries(7):
+            self.client.get(reverse('dashboard_global_admin'))
+        self.creer_influenceurs(10)
+        with self.assertNumQueries(7):
+            self.client.get(reverse('dashboard_global_admin'), {'top': 10, 'jours': 30})
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class InfluenceurStatsTests(TestCase):
+    """
+    Tests de la maintenance incrémentale de InfluenceurStats
+    """
+
+    def setUp(self):
+        self.influenceur = Influenceur.create_influenceur(nom='Moussa Diarra', email='moussa@example.com', password='secret')
+
+    def creer_prospect(self, numero, **kwargs):
+        return Prospect.objects.create(
+            nom=f'Prospect {numero}', email=f'p{numero}@example.com', telephone=f'{numero:08d}',
+            influenceur=self.influenceur, **kwargs
+        )
+
+    def stats(self):
+        return InfluenceurStats.objects.get(influenceur=self.influenceur)
+
+    def test_creee_avec_influenceur(self):
+        self.assertEqual(self.stats().nb_prospects, 0)
+
+    def test_transition_concurrente_appliquee_une_fois(self):
+        prospect = self.creer_prospect(1)
+        # Deux copies chargées depuis le même état, sauvegardées l'une après l'autre
+        premiere = Prospect.objects.get(pk=prospect.pk)
+        seconde = Prospect.objects.get(pk=prospect.pk)
+        premiere.statut = 'confirme'
+        premiere.save()
+        seconde.statut = 'confirme'
+        seconde.save()
+        stats = self.stats()
+        self.assertEqual((stats.nb_prospects_en_attente, stats.nb_prospects_confirmes), (0, 1))
+
+        seconde = Prospect.objects.get(pk=prospect.pk)
+        premiere.statut = 'rejeter'
+        premiere.save()
+        seconde.nom = 'Renommé'  # Réécrit le statut chargé (confirme) : transition rejeter -> confirme
+        seconde.save()
+        stats = self.stats()
+        self.assertEqual((stats.nb_prospects_confirmes, stats.nb_prospects_rejetes), (1, 0))
+
+    def test_cycle_de_vie_prospect(self):
+        p1 = self.creer_prospect(1)
+        p2 = self.creer_prospect(2)
+        stats = self.stats()
+        self.assertEqual((stats.nb_prospects, stats.nb_prospects_en_attente), (2, 2))
+
+        p1 = Prospect.objects.get(pk=p1.pk)
+        p1.statut = 'confirme'
+        p1.save()
+        p2.statut = 'rejeter'
+        p2.save()
+        p2.save()  # un second save sans changement ne modifie pas les compteurs
+        stats = self.stats()
+        self.assertEqual(stats.nb_prospects_en_attente, 0)
+        self.assertEqual(stats.nb_prospects_confirmes, 1)
+        self.assertEqual(stats.nb_prospects_rejetes, 1)
+        self.assertEqual(stats.taux_conversion, 50.0)
+
+        p2.delete()
+        self.assertEqual((self.stats().nb_prospects, self.stats().nb_prospects_rejetes), (1, 0))
+
+    def test_cycle_de_vie_remise(self):
+        remise = Remise.objects.create(influenceur=self.influenceur, montant=Decimal('30.00'))
+        stats = self.stats()
+        self.assertEqual((stats.nb_remises_en_attente, stats.montant_en_attente), (1, Decimal('30.00')))
+
+        Remise.objects.get(pk=remise.pk).marquer_comme_payee()
+        stats = self.stats()
+        self.assertEqual((stats.nb_remises_en_attente, stats.montant_en_attente), (0, Decimal('0.00')))
+        self.assertEqual((stats.nb_remises_payees, stats.montant_paye), (1, Decimal('30.00')))
+
+    def test_recalcul_si_ligne_absente(self):
+        self.creer_prospect(1, statut='confirme')
+        InfluenceurStats.objects.all().delete()
+        self.creer_prospect(2)
+        stats = self.stats()
+        self.assertEqual((stats.nb_prospects, stats.nb_prospects_confirmes), (2, 1))
+
+    def test_commande_reconstruction(self):
+        self.creer_prospect(1, statut='confirme')
+        Remise.objects.create(influenceur=self.influenceur, montant=Decimal('10.00'))
+        InfluenceurStats.objects.filter(influenceur=self.influenceur).update(nb_prospects=42)
+        self.assertTrue(InfluenceurStats.verifier())
+        call_command('rebuild_influenceur_stats', stdout=StringIO())
+        self.assertEqual(InfluenceurStats.verifier(), [])
+        self.assertEqual(self.stats().nb_prospects, 1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class StatistiqueJournaliereTests(TestCase):
+    """
+    Tests des cumuls journaliers et des séries d'évolution
+    """
+
+    def setUp(self):
+        self.influenceur = Influenceur.create_influenceur(nom='Fanta Keita', email='fanta@example.com', password='secret')
+        self.today = timezone.localdate()
+        self.nb_prospects = 0
+        for jours in [0, 0, 1, 3, 10, 40, 75]:
+            self.creer_prospect(jours, statut='confirme' if jours % 2 else 'en_attente')
+            remise = Remise.objects.create(influenceur=self.influenceur, montant=Decimal('10.00'))
+            Remise.objects.filter(pk=remise.pk).update(date_creation=timezone.now() - timedelta(days=jours))
+
+    def creer_prospect(self, jours, **kwargs):
+        self.nb_prospects += 1
+        return Prospect.objects.create(
+            nom=f'Prospect {self.nb_prospects}', email=f'p{self.nb_prospects}@example.com',
+            telephone=f'{self.nb_prospects:08d}', influenceur=self.influenceur,
+            date_inscription=timezone.now() - timedelta(days=jours), **kwargs
+        )
+
+    def test_cumul_identique_au_calcul_direct(self):
+        debut = self.today - timedelta(days=90)
+        attendu = {g: serie_evolution(debut, self.today, g) for g in ['jour', 'semaine', 'mois']}
+        StatistiqueJournaliere.cumuler()
+        self.assertTrue(StatistiqueJournaliere.objects.exists())
+        for granularite, serie in attendu.items():
+            self.assertEqual(serie_evolution(debut, self.today, granularite), serie)
+        jour = serie_evolution(debut, self.today, 'jour')
+        self.assertEqual(len(jour), 91)
+        self.assertEqual(jour[-1]['nb_prospects'], 2)
+        self.assertEqual(jour[-1]['nb_remises'], 2)
+        self.assertEqual(sum(l['nb_prospects'] for l in jour), 7)
+        self.assertEqual(sum(l['montant_remises'] for l in jour), 70.0)
+
+    def test_recalcul_des_jours_recents(self):
+        StatistiqueJournaliere.cumuler()
+        prospect = Prospect.objects.get(nom='Prospect 3')  # inscrit hier
+        prospect.statut = 'rejeter'
+        prospect.save()
+        StatistiqueJournaliere.cumuler(jours_a_recalculer=3)
+        hier = StatistiqueJournaliere.objects.get(jour=self.today - timedelta(days=1))
+        self.assertEqual((hier.nb_prospects_rejetes, hier.nb_prospects_confirmes), (1, 0))
+
+    def test_endpoint_evolution(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        StatistiqueJournaliere.cumuler()
+        response = client.get(reverse('statistiques_evolution'), {
+            'debut': str(self.today - timedelta(days=365)), 'granularite': 'mois', 'influenceur': self.influenceur.pk,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(l['nb_prospects'] for l in response.json()['evolution']), 7)
+        response = client.get(reverse('statistiques_evolution'), {'granularite': 'annee'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_endpoint_evolution_parametres_invalides(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        for params in (
+            {'debut': '2024-02-30'},
+            {'influenceur': 'abc'},
+            {'debut': '0001-01-01', 'fin': '9999-12-31', 'granularite': 'semaine'},
+            {'debut': '2024-03-01', 'fin': '2024-02-01'},
+        ):
+            response = client.get(reverse('statistiques_evolution'), params)
+            self.assertEqual(response.status_code, 400, params)
+        response = client.get(reverse('statistiques_evolution'), {'influenceur': 999999})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CacheStatistiquesTests(TestCase):
+    """
+    Tests du cache versionné des dashboards et statistiques
+    """
+
+    def setUp(self):
+        cache.clear()
+        cache_stats.reinitialiser_compteurs()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.influenceur = Influenceur.create_influenceur(nom='Ibrahim Coulibaly', email='ibrahim@example.com', password='secret')
+        self.autre = Influenceur.create_influenceur(nom='Aminata Sidibé', email='aminata@example.com', password='secret')
+        self.prospect = Prospect.objects.create(nom='Prospect', telephone='70000001', email='p@example.com', influenceur=self.influenceur)
+
+    def test_hit_puis_invalidation(self):
+        url = reverse('influenceur_dashboard', args=[self.influenceur.pk])
+        self.assertEqual(self.client.get(url).json()['nb_prospects_confirmes'], 0)
+        # Hit : seule la lecture de l'influenceur demandé reste (utilisateur courant en cache)
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+        self.prospect.statut = 'confirme'
+        self.prospect.save()
+        self.assertEqual(self.client.get(url).json()['nb_prospects_confirmes'], 1)
+        self.assertEqual(cache_stats.compteurs()['dashboard_influenceur']['hits'], 1)
+        self.assertEqual(cache_stats.compteurs()['dashboard_influenceur']['misses'], 2)
+
+    def test_invalidation_par_influenceur(self):
+        url_autre = reverse('influenceur_dashboard', args=[self.autre.pk])
+        url_global = reverse('prospects_statistiques')
+        self.client.get(url_autre)
+        self.client.get(url_global)
+        Prospect.objects.create(nom='Nouveau', telephone='70000002', email='n@example.com', influenceur=self.influenceur)
+        # Le dashboard d'un autre influenceur reste en cache, les statistiques globales non
+        self.client.get(url_autre)
+        self.assertEqual(self.client.get(url_global).json()['total'], 2)
+        compteurs = cache_stats.compteurs()
+        self.assertEqual(compteurs['dashboard_influenceur']['hits'], 1)
+        self.assertEqual(compteurs['statistiques_prospects']['misses'], 2)
+
+    def test_sauvegarde_partielle_sans_invalidation(self):
+        version = cache_stats.version(self.influenceur.pk)
+        self.influenceur.update_last_login()
+        self.assertEqual(cache_stats.version(self.influenceur.pk), version)
+        self.influenceur.nom = 'Ibrahim C.'
+        self.influenceur.save()
+        self.assertNotEqual(cache_stats.version(self.influenceur.pk), version)
+
+    def test_endpoint_compteurs(self):
+        self.client.get(reverse('statistiques_remises'))
+        self.client.get(reverse('statistiques_remises'))
+        data = self.client.get(reverse('cache_statistiques')).json()
+        self.assertEqual(data['portees']['statistiques_remises'], {'hits': 1, 'misses': 1, 'taux_hit': 50.0})
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LectureRapideParityTests(TestCase):
+    """
+    La lecture rapide (.values()) doit produire exactement le JSON des serializers
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        awa = Influenceur.create_influenceur(nom='Awa Traoré', email='awa@example.com', password='secret',
+                                             telephone='70000000')
+        moussa = Influenceur.create_influenceur(nom='Moussa Diarra', email='moussa@example.com', password='secret',
+                                                role='admin', peut_payer_remises=True)
+        Influenceur.objects.filter(pk=moussa.pk).update(date_derniere_connexion=timezone.now())
+        payee = Remise.objects.create(influenceur=awa, montant=Decimal('12.5'), statut='payee',
+                                      justificatif='justificatifs/recu.png', date_paiement=timezone.now())
+        en_attente = Remise.objects.create(influenceur=moussa, montant=Decimal('7'), description='Commission « été »')
+        variantes = [
+            {'statut': 'confirme', 'remise': payee, 'niveau_etude': 'bac', 'serie_bac': 'tse'},
+            {'statut': 'confirme', 'remise': en_attente, 'niveau_etude': 'autre', 'niveau_etude_autre': 'BTS'},
+            {'statut': 'rejeter', 'serie_bac': 'autre', 'serie_bac_autre': ''},
+            {'statut': 'en_attente', 'filiere_souhaitee': 'autre', 'filiere_autre': 'Médecine'},
+            {'statut': 'en_attente', 'filiere_souhaitee': 'gpg', 'email': ''},
+            {'statut': 'en_attente', 'niveau_etude': 'inconnu'},
+        ]
+        for i, variante in enumerate(variantes):
+            Prospect.objects.create(**{
+                'nom': f'Prospect {i}', 'email': f'prospect{i}@example.com', 'telephone': f'{i:08d}',
+                'influenceur': awa if i % 2 else moussa, **variante,
+            })
+
+    def assertJsonIdentique(self, serializer_class, queryset, expand=()):
+        from rest_framework.renderers import JSONRenderer
+        from .lecture_rapide import serialiser
+        attendu = JSONRenderer().render(serializer_class(queryset, many=True, context={'expand': set(expand)}).data)
+        self.assertEqual(JSONRenderer().render(serialiser(serializer_class, queryset, expand)), attendu)
+
+    def test_prospects(self):
+        from prospect.serializers import ProspectListeSerializer
+        queryset = Prospect.objects.order_by('id')
+        for expand in ((), ('influenceur',), ('remise',), ('influenceur', 'remise')):
+            with self.subTest(expand=expand):
+                self.assertJsonIdentique(ProspectListeSerializer, queryset, expand)
+
+    def test_remises(self):
+        from remise.serializers import RemiseListeSerializer
+        for expand in ((), ('influenceur',)):
+            with self.subTest(expand=expand):
+                self.assertJsonIdentique(RemiseListeSerializer, Remise.objects.order_by('id'), expand)
+
+    def test_exports(self):
+        from prospect.serializers import ProspectExportSerializer
+        from remise.serializers import RemiseExportSerializer
+        self.assertJsonIdentique(ProspectExportSerializer, Prospect.objects.order_by('id'))
+        self.assertJsonIdentique(RemiseExportSerializer, Remise.objects.order_by('id'))
+
+    def test_influenceurs(self):
+        from .serializers import InfluenceurSerializer
+        self.assertJsonIdentique(InfluenceurSerializer, Influenceur.objects.order_by('id'))
+
+    def test_expand_inconnu_ne_cree_pas_de_plan(self):
+        from prospect.serializers import ProspectListeSerializer
+        from .lecture_rapide import _plan, plan_de_lecture
+        plan = plan_de_lecture(ProspectListeSerializer, {'remise'})
+        taille = _plan.cache_info().currsize
+        for i in range(20):
+            self.assertIs(plan_de_lecture(ProspectListeSerializer, {'remise', f'inconnu{i}'}), plan)
+        self.assertEqual(_plan.cache_info().currsize, taille)
+
+    def test_endpoints(self):
+        from rest_framework.renderers import JSONRenderer
+        from prospect.serializers import ProspectListeSerializer
+        response = self.client.get(reverse('prospect_view'), {'pagination': 'false', 'expand': 'remise'})
+        attendu = ProspectListeSerializer(
+            Prospect.objects.order_by('-date_inscription', '-id'), many=True, context={'expand': {'remise'}}
+        ).data
+        self.assertEqual(response.content, JSONRenderer().render(attendu))
+
+
+class PlansDeRequeteTests(TestCase):
+    """
+    Les requêtes chaudes des listes doivent être servies par un index, jamais par un
+    parcours séquentiel de la table (EXPLAIN sur un jeu de données généré).
+    """
+    NB_PROSPECTS = 3000
+
+    @classmethod
+    def setUpTestData(cls):
+        from .benchmark import creer_jeu_de_donnees
+        cls.influenceur = creer_jeu_de_donnees(cls.NB_PROSPECTS, nb_influenceurs=20)[3]
+        with connection.cursor() as curseur:
+            curseur.execute('ANALYZE')
+
+    def assertPasDeParcoursSequentiel(self, queryset):
+        plan = queryset.explain()
+        tables = (Prospect._meta.db_table, Remise._meta.db_table)
+        if connection.vendor == 'postgresql':
+            parcours = [t for t in tables if f'Seq Scan on {t}' in plan]
+        else:
+            # SQLite : « SCAN <table> » sans « USING ... INDEX » est un parcours complet de la table
+            parcours = [t for t in tables if re.search(rf'\bSCAN {t}\b(?! USING)', plan)]
+        self.assertFalse(parcours, f'Parcours séquentiel de {parcours} :\n{queryset.query}\n{plan}')
+
+    def test_prospects(self):
+        ordre = ('-date_inscription', '-id')
+        maintenant = timezone.now()
+        requetes = {
+            'liste': Prospect.objects.all(),
+            'par influenceur': Prospect.objects.filter(influenceur=self.influenceur),
+            'par influenceur et statut': Prospect.objects.filter(influenceur=self.influenceur, statut='en_attente'),
+            'par statut': Prospect.objects.filter(statut='rejeter'),
+            'sans remise': Prospect.objects.filter(statut='confirme', remise__isnull=True),
+            'sans remise par influenceur': Prospect.objects.filter(
+                influenceur=self.influenceur, statut='confirme', remise__isnull=True),
+            'période': Prospect.objects.filter(
+                date_inscription__gte=maintenant - timedelta(days=1), date_inscription__lt=maintenant),
+        }
+        for nom, queryset in requetes.items():
+            with self.subTest(nom):
+                self.assertPasDeParcoursSequentiel(queryset.order_by(*ordre)[:21])
+
+    def test_remises(self):
+        ordre = ('-date_creation', '-id')
+        maintenant = timezone.now()
+        requetes = {
+            'liste': Remise.objects.all(),
+            'par influenceur': Remise.objects.filter(influenceur=self.influenceur),
+            'par influenceur et statut': Remise.objects.filter(influenceur=self.influenceur, statut='payee'),
+            'par statut': Remise.objects.filter(statut='payee'),
+            'période': Remise.objects.filter(
+                date_creation__gte=maintenant - timedelta(days=1), date_creation__lt=maintenant),
+        }
+        for nom, queryset in requetes.items():
+            with self.subTest(nom):
+                self.assertPasDeParcoursSequentiel(queryset.order_by(*ordre)[:21])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+                   EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_BACKOFF=60)
+class EmailSortantTests(TestCase):
+    """
+    Tests de la file d'envoi des emails (EmailSortant et run_email_dispatcher)
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def creer_influenceur(self):
+        response = self.client.post(reverse('influenceur_view'), {
+            'nom': 'Awa Traoré', 'email': 'awa@example.com', 'password': 'secret',
+        })
+        self.assertEqual(response.status_code, 201)
+        return Influenceur.objects.get(pk=response.data['id'])
+
+    def test_creation_sans_envoi(self):
+        influenceur = self.creer_influenceur()
+        # Aucun email envoyé pendant la requête : ils attendent dans la file
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            sorted(EmailSortant.objects.filter(influenceur=influenceur, statut='en_attente')
+                   .values_list('type_email', flat=True)),
+            ['affiliation', 'bienvenue'],
+        )
+
+    def test_dispatcher_une_connexion_par_lot(self):
+        self.creer_influenceur()
+        with mock.patch('influenceur.email_service.get_connection', wraps=get_connection) as connexions:
+            call_command('run_email_dispatcher', '--once', stdout=StringIO())
+        self.assertEqual(connexions.call_count, 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual({m.to[0] for m in mail.outbox}, {'awa@example.com'})
+        self.assertTrue(all(m.alternatives[0][1] == 'text/html' for m in mail.outbox))
+        self.assertFalse(EmailSortant.objects.exclude(statut='envoye').exists())
+        # Rien à renvoyer au passage suivant
+        call_command('run_email_dispatcher', '--once', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_nouvelle_tentative_puis_abandon(self):
+        self.creer_influenceur()
+        refus = mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                           side_effect=OSError('refusé'))
+        with refus, self.assertLogs('influenceur.email_service', 'ERROR'):
+            self.assertEqual(EmailService.envoyer_file(), (0, 2))
+        email_sortant = EmailSortant.objects.first()
+        self.assertEqual((email_sortant.statut, email_sortant.nb_tentatives), ('en_attente', 1))
+        self.assertGreater(email_sortant.prochaine_tentative, timezone.now() + timedelta(seconds=50))
+        # Pas de nouvelle tentative avant le délai
+        self.assertEqual(EmailService.envoyer_file(), (0, 0))
+
+        EmailSortant.objects.update(prochaine_tentative=timezone.now())
+        with refus, self.assertLogs('influenceur.email_service', 'ERROR'):
+            EmailService.envoyer_file()
+        self.assertEqual(EmailSortant.objects.filter(statut='echec', nb_tentatives=2).count(), 2)
+        self.assertEqual(EmailSortant.objects.first().derniere_erreur, 'refusé')
+
+    def test_lot_reserve(self):
+        self.creer_influenceur()
+        self.assertEqual(len(EmailSortant.reserver_lot(10)), 2)
+        # Réservés par un dispatcher : invisibles pour les autres
+        self.assertEqual(EmailSortant.reserver_lot(10), [])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+                   EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class CampagneEmailTests(TestCase):
+    """
+    Tests du renvoi des liens d'affiliation en masse (CampagneEmail, send_affiliation_campaign)
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.actifs = [
+            Influenceur.create_influenceur(nom=f'Influenceur {n}', email=f'i{n}@example.com', password='x')
+            for n in range(7)
+        ]
+        Influenceur.create_influenceur(nom='Inactif', email='inactif@example.com', password='x', is_active=False)
+
+    def test_commande_envoie_aux_actifs(self):
+        sortie = StringIO()
+        with mock.patch('influenceur.email_service.get_connection', wraps=get_connection) as connexions:
+            call_command('send_affiliation_campaign', '--chunk-size', '3', '--batch-size', '4',
+                         '--concurrency', '2', stdout=sortie)
+        # Deux lots (4 + 3 emails), chacun réparti sur deux connexions réutilisées
+        self.assertEqual(connexions.call_count, 4)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(i.email for i in self.actifs))
+        self.assertTrue(all(i.get_affiliation_link() in m.body for i, m in zip(
+            sorted(self.actifs, key=lambda i: i.email), sorted(mail.outbox, key=lambda m: m.to[0]))))
+        campagne = CampagneEmail.objects.get()
+        rapport = campagne.rapport()
+        self.assertEqual((rapport['statut'], rapport['nb_destinataires'], rapport['nb_envoyes']), ('terminee', 7, 7))
+        self.assertIn('7/7 envoyé(s)', sortie.getvalue())
+
+    def test_reprise_sans_doublon(self):
+        # Préparation interrompue : le curseur est resté en deçà des emails déjà en file
+        campagne = CampagneEmail.objects.create()
+        EmailSortant.objects.bulk_create([
+            EmailSortant(type_email='affiliation', campagne=campagne, influenceur=i, destinataire=i.email)
+            for i in self.actifs[:3]
+        ])
+        campagne.nb_destinataires = 3
+        campagne.dernier_influenceur_id = self.actifs[1].pk
+        campagne.save()
+
+        call_command('send_affiliation_campaign', '--resume', str(campagne.pk), stdout=StringIO())
+        self.assertEqual(campagne.emails.count(), 7)
+        self.assertEqual(CampagneEmail.objects.get(pk=campagne.pk).nb_destinataires, 7)
+        self.assertEqual(len(mail.outbox), 7)
+        # Relancer une campagne terminée n'envoie rien de plus
+        call_command('send_affiliation_campaign', '--resume', str(campagne.pk), stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 7)
+
+    def test_dispatcher_prepare_et_envoie(self):
+        self.client.post(reverse('campagne_affiliation'))
+        call_command('run_email_dispatcher', '--once', '--chunk-size', '3', stdout=StringIO())
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(i.email for i in self.actifs))
+        self.assertEqual(CampagneEmail.objects.get().rapport()['statut'], 'terminee')
+
+    def test_limite_de_debit(self):
+        limiteur = LimiteurDebit(100)
+        debut = time.monotonic()
+        for _ in range(6):
+            limiteur.attendre()
+        self.assertGreaterEqual(time.monotonic() - debut, 0.05)
+
+    def test_endpoints_admin(self):
+        # Aucune mise en file dans la requête : création de la campagne et rapport
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse('campagne_affiliation'))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['campagne']['statut'], 'preparation')
+        self.assertEqual(response.data['campagne']['nb_destinataires'], 0)
+        self.assertFalse(EmailSortant.objects.exists())
+
+        # Le dispatcher prépare un lot à la fois, entre deux lots d'envoi
+        campagne = CampagneEmail.objects.get()
+        self.assertTrue(CampagneEmail.preparer_en_attente(taille_lot=4))
+        self.assertEqual(campagne.emails.count(), 4)
+        self.assertTrue(CampagneEmail.preparer_en_attente(taille_lot=4))
+        self.assertFalse(CampagneEmail.preparer_en_attente(taille_lot=4))
+        self.assertEqual(len(mail.outbox), 0)
+
+        EmailService.envoyer_file(taille_lot=5)
+        suivi = self.client.get(response.data['suivi']).data
+        self.assertEqual((suivi['nb_envoyes'], suivi['nb_en_attente'], suivi['statut']), (5, 2, 'envoi'))
+        en_attente = self.client.get(response.data['destinataires'], {'statut': 'en_attente'}).data['results']
+        self.assertEqual(len(en_attente), 2)
+        self.assertEqual(en_attente[0]['statut'], 'en_attente')
+
+
+class BenchmarkApiTests(TestCase):
+    """
+    Exécution du benchmark des vues sur un petit jeu de données (toutes les vues répondent)
+    """
+
+    def test_resultats_json(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, 'benchmark.json')
+            call_command('benchmark_api', influenceurs=3, prospects=60, repeat=2, warmup=0,
+                         output=chemin, stdout=StringIO())
+            with open(chemin, encoding='utf-8') as fichier:
+                rapport = json.load(fichier)
+            # Comparaison avec lui-même : aucune requête SQL en plus
+            sortie = StringIO()
+            call_command('benchmark_api', influenceurs=3, prospects=60, repeat=2, warmup=0,
+                         only='prospects_liste,remises_liste', compare=chemin, threshold=1000, stdout=sortie)
+
+        self.assertEqual(rapport['meta']['prospects'], 60)
+        self.assertIn('requêtes 2 -> 2', sortie.getvalue())
+        # Les vues qui consomment un objet par requête peuvent épuiser un si petit jeu de données
+        consommateurs = {'prospect_valider', 'remise_payer', 'calculer_remise_influenceur'}
+        for nom, resultat in rapport['resultats'].items():
+            attendus = ('2', '404') if nom in consommateurs else ('2',)
+            self.assertTrue(all(statut.startswith(attendus) for statut in resultat['statuts']), (nom, resultat['statuts']))
+            self.assertLessEqual(resultat['p50_ms'], resultat['p99_ms'])
+        # Le jeu de données est annulé
+        self.assertFalse(Prospect.objects.exists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SeedAffiliationTests(TestCase):
+    """Générateur de données synthétiques (generation.py, commande seed_affiliation)"""
+
+    def test_repartitions_couvrent_les_choix_du_modele(self):
+        from .generation import REPARTITION_FILIERES, REPARTITION_NIVEAUX, REPARTITION_SERIES_BAC, REPARTITION_STATUTS
+        for repartition, choix in ((REPARTITION_STATUTS, Prospect.STATUT_CHOICES),
+                                   (REPARTITION_NIVEAUX, Prospect.NIVEAU_ETUDE_CHOICES),
+                                   (REPARTITION_SERIES_BAC, Prospect.SERIE_BAC_CHOICES),
+                                   (REPARTITION_FILIERES, Prospect.FILIERE_CHOICES)):
+            self.assertEqual(set(repartition), {code for code, _ in choix})
+
+    def test_generation_coherente_et_reproductible(self):
+        call_command('seed_affiliation', influenceurs=5, prospects=300, seed=7, batch_size=70, stdout=StringIO())
+        self.assertEqual(Influenceur.objects.count(), 5)
+        self.assertEqual(Prospect.objects.count(), 300)
+        for prospect in Prospect.objects.all():
+            prospect.full_clean()
+            self.assertEqual(prospect.serie_bac is not None, prospect.niveau_etude == 'bac')
+        # Montant des remises = 10 par prospect rattaché ; statistiques reconstruites
+        for remise in Remise.objects.all():
+            self.assertEqual(remise.montant, Decimal('10.00') * remise.prospects.count())
+        for influenceur in Influenceur.objects.all():
+            self.assertEqual(influenceur.stats.nb_prospects, influenceur.prospects.count())
+
+        premiers = list(Prospect.objects.order_by('id').values_list('telephone', 'statut', 'filiere_souhaitee')[:50])
+        Prospect.objects.all().delete()
+        Remise.objects.all().delete()
+        Influenceur.objects.all().delete()
+        call_command('seed_affiliation', influenceurs=5, prospects=300, seed=7, batch_size=300, stdout=StringIO())
+        self.assertEqual(
+            list(Prospect.objects.order_by('id').values_list('telephone', 'statut', 'filiere_souhaitee')[:50]),
+            premiers,
+        )
+
+    def test_graine_deja_semee_refusee(self):
+        call_command('seed_affiliation', influenceurs=2, prospects=10, seed=3, skip_stats=True, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('seed_affiliation', influenceurs=2, prospects=10, seed=3, stdout=StringIO())
+        call_command('seed_affiliation', influenceurs=2, prospects=10, seed=4, skip_stats=True, stdout=StringIO())
+        self.assertEqual(Prospect.objects.count(), 20)
+
+    def test_telephones_deja_utilises_evites(self):
+        from .generation import NB_TELEPHONES, telephone
+        import zlib
+        influenceur = Influenceur.objects.create(nom='Awa', email='awa@example.com', password='x')
+        premier = telephone(zlib.crc32(b's5') % NB_TELEPHONES, 0)
+        Prospect.objects.create(nom='Existant', telephone=premier, email='existant@example.com', influenceur=influenceur)
+        call_command('seed_affiliation', influenceurs=2, prospects=10, seed=5, skip_stats=True, stdout=StringIO())
+        self.assertEqual(Prospect.objects.filter(telephone=premier).count(), 1)
+        self.assertEqual(Prospect.objects.count(), 11)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class InstrumentationTests(TestCase):
+    """Middleware d'instrumentation et vue instrumentation_vues"""
+
+    def setUp(self):
+        cache.clear()
+        instrumentation.reinitialiser()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        influenceur = Influenceur.objects.create(nom='Awa', email='awa@example.com', password='x')
+        for n in range(3):
+            Prospect.objects.create(nom=f'P{n}', telephone=f'{n:08d}', email=f'p{n}@example.com',
+                                    influenceur=influenceur)
+
+    def test_mesures_par_vue(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse('influenceur_view')).status_code, 200)
+        vues = self.client.get(reverse('instrumentation_vues')).json()['vues']
+        mesures = vues['influenceur_view']
+        self.assertEqual(mesures['nb_mesures'], 3)
+        self.assertGreater(mesures['requetes_max'], 0)
+        self.assertLessEqual(mesures['duree_ms']['p50'], mesures['duree_ms']['p99'])
+
+        self.assertEqual(self.client.delete(reverse('instrumentation_vues')).status_code, 204)
+        self.assertNotIn('influenceur_view', self.client.get(reverse('instrumentation_vues')).json()['vues'])
+
+    def test_requetes_repetees_comptees(self):
+        compteur = instrumentation.CompteurRequetes()
+        with connection.execute_wrapper(compteur):
+            for prospect in Prospect.objects.all():
+                prospect.influenceur.nom  # N+1 volontaire
+        self.assertEqual(compteur.nb_requetes, 4)
+        self.assertEqual(compteur.nb_repetees, 2)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0, SERVER_TIMING_HEADER=True)
+    def test_requete_lente_journalisee_en_json(self):
+        with self.assertLogs('influenceur.instrumentation', 'WARNING') as journal:
+            response = self.client.get(reverse('influenceur_view'))
+        ligne = json.loads(journal.records[0].getMessage())
+        self.assertEqual(ligne['evenement'], 'requete_lente')
+        self.assertEqual(ligne['vue'], 'influenceur_view')
+        self.assertEqual(ligne['taille_octets'], len(response.content))
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+    def test_flux_mesure_a_la_fin_de_l_iteration(self):
+        response = self.client.get(reverse('prospects_export'))
+        self.assertNotIn('prospects_export', instrumentation.percentiles())
+        contenu = b''.join(response.streaming_content)
+        response.close()
+        # Les requêtes exécutées pendant l'itération sont comptées, avec la taille envoyée
+        mesure = list(instrumentation._mesures['prospects_export'])[-1]
+        self.assertGreater(mesure['requetes'], 0)
+        self.assertEqual(mesure['taille_octets'], len(contenu))
+        self.assertEqual(len(instrumentation._mesures['prospects_export']), 1)
+
+    def test_reserve_aux_admins(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('instrumentation_vues')).status_code, 401)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], N1_DETECTION='raise',
+                   N1_THRESHOLD=5)
+class DetecteurN1Tests(BudgetRequetesMixin, TestCase):
+    """Détection des requêtes N+1 et budgets de requêtes des vues"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.force_authenticate(self.admin)
+        self.influenceurs = [
+            Influenceur.objects.create(nom=f'Influenceur {n}', email=f'i{n}@example.com', password='x')
+            for n in range(3)
+        ]
+        for n in range(30):
+            Prospect.objects.create(nom=f'P{n}', telephone=f'{n:08d}', email=f'p{n}@example.com',
+                                    influenceur=self.influenceurs[n % 3], statut='confirme' if n % 2 else 'en_attente')
+
+    def test_empreinte_ignore_valeurs_et_listes(self):
+        self.assertEqual(
+            detecteur_n1.empreinte('SELECT * FROM t WHERE id IN (%s, %s, %s) AND x = 3'),
+            detecteur_n1.empreinte('SELECT * FROM t WHERE id IN (%s) AND x = 12'),
+        )
+
+    def test_n1_leve_une_exception(self):
+        with self.assertRaises(detecteur_n1.RequetesN1):
+            with detecteur_n1.surveiller('test'):
+                for prospect in Prospect.objects.all():
+                    prospect.influenceur.nom
+        # La même boucle est tolérée explicitement, et une jointure ne déclenche rien
+        with detecteur_n1.surveiller('test'):
+            with detecteur_n1.tolerer():
+                for prospect in Prospect.objects.all():
+                    prospect.influenceur.nom
+            for prospect in Prospect.objects.select_related('influenceur'):
+                prospect.influenceur.nom
+
+    @override_settings(N1_DETECTION='log')
+    def test_production_journalise_la_pile(self):
+        with self.assertLogs('influenceur.detecteur_n1', 'WARNING') as journal:
+            with detecteur_n1.surveiller('test'):
+                for prospect in Prospect.objects.all():
+                    prospect.influenceur.nom
+        self.assertEqual(len(journal.records), 1)
+        self.assertIn('test_production_journalise_la_pile', journal.records[0].getMessage())
+
+    def test_flux_surveille_pendant_l_iteration(self):
+        from django.http import StreamingHttpResponse
+
+        def export_n1(request):
+            return StreamingHttpResponse(f'{p.influenceur.nom}\n' for p in Prospect.objects.all())
+
+        middleware = detecteur_n1.DetectionN1Middleware(export_n1)
+        response = middleware(RequestFactory().get('/export/'))
+        with self.assertRaises(detecteur_n1.RequetesN1):
+            b''.join(response.streaming_content)
+        response.close()
+        # Le détecteur n'est plus actif une fois le flux terminé
+        self.assertIsNone(detecteur_n1._detecteur_actif.get())
+        self.assertEqual(connection.execute_wrappers, [])
+
+    def test_budgets_des_vues(self):
+        influenceur = self.influenceurs[0]
+        budgets = [
+            (reverse('influenceur_view'), 4),
+            (reverse('influenceur_dashboard', args=[influenceur.pk]), 10),
+            (reverse('influenceur_prospects', args=[influenceur.pk]), 5),
+            (reverse('dashboard_global_admin'), 10),
+            (reverse('prospect_view'), 5),
+            (reverse('remise_view'), 5),
+        ]
+        for url, maximum in budgets:
+            with self.subTest(url=url), self.assertBudgetRequetes(maximum):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_cleanup_users_sans_n1(self):
+        User.objects.create_user('orphelin', 'orphelin@example.com', 'x')
+        User.objects.create_user('i0@example.com', 'i0@example.com', 'x', first_name='Ancien')
+        with self.assertBudgetRequetes(16):
+            call_command('cleanup_users', stdout=StringIO())
+        self.assertFalse(User.objects.filter(username='orphelin').exists())
+        self.assertEqual(User.objects.get(email='i0@example.com').first_name, 'Influenceur')
+        self.assertEqual(User.objects.filter(email__in=[i.email for i in self.influenceurs]).count(), 3)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ResolutionInfluenceurTests(TestCase):
+    """Résolution utilisateur -> influenceur : mémorisée par requête et en cache entre requêtes"""
+
+    def setUp(self):
+        cache.clear()
+        self.influenceur = Influenceur.objects.create(nom='Awa Traoré', email='awa@example.com', password='x')
+        self.user = User.objects.create_user('awa@example.com', 'awa@example.com', 'x')
+
+    def requete(self, user=None):
+        from django.http import HttpRequest
+        request = HttpRequest()
+        request.user = user or self.user
+        return request
+
+    def test_une_requete_puis_cache(self):
+        from .auth import get_influenceur_from_request
+        request = self.requete()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_influenceur_from_request(request), self.influenceur)
+            self.assertEqual(get_influenceur_from_request(request), self.influenceur)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_influenceur_from_request(self.requete()), self.influenceur)
+        # Les utilisateurs sans influenceur (superusers) sont aussi mis en cache
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.assertIsNone(get_influenceur_from_request(self.requete(admin)))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_influenceur_from_request(self.requete(admin)))
+
+    def test_cache_sans_donnees_sensibles(self):
+        from .auth import get_influenceur_from_user
+        from .cache import _cle_utilisateur
+        get_influenceur_from_user(self.user)
+        entree = cache.get(_cle_utilisateur(self.user.pk))
+        self.assertNotIn(self.influenceur.password, entree[2])
+        self.assertNotIsInstance(entree[2], Influenceur)
+        with self.assertNumQueries(0):
+            influenceur = get_influenceur_from_user(self.user)
+            self.assertEqual(influenceur.pk, self.influenceur.pk)
+            self.assertTrue(influenceur.is_active)
+            self.assertFalse(influenceur.is_admin())
+            self.assertTrue(influenceur.has_permission('voir_statistiques'))
+        # Les autres champs sont lus en base à la demande
+        with self.assertNumQueries(1):
+            self.assertEqual(influenceur.nom, 'Awa Traoré')
+
+    def test_invalidation_a_la_sauvegarde_et_a_la_suppression(self):
+        from .auth import get_influenceur_from_user
+        get_influenceur_from_user(self.user)
+        self.influenceur.peut_valider_prospects = True
+        self.influenceur.save()
+        self.assertTrue(get_influenceur_from_user(self.user).peut_valider_prospects)
+
+        self.influenceur.email = 'awa.traore@example.com'
+        self.influenceur.save()
+        self.assertIsNone(get_influenceur_from_user(self.user))
+        self.influenceur.email = 'awa@example.com'
+        self.influenceur.save()
+        self.assertEqual(get_influenceur_from_user(self.user), self.influenceur)
+
+        self.influenceur.delete()
+        self.assertIsNone(get_influenceur_from_user(self.user))
+
+    def test_permissions_des_influenceurs(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.get(reverse('prospect_view'))
+        # Permission puis vue : une seule résolution, servie par le cache
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(reverse('prospect_view')).status_code, 200)
+        self.assertEqual(client.post(reverse('influenceur_view'), {}, format='json').status_code, 403)
+        self.influenceur.is_active = False
+        self.influenceur.save()
+        self.assertEqual(client.get(reverse('prospect_view')).status_code, 403)
+
+
+class JwtInfluenceurTests(TestCase):
+    """Tokens JWT portant l'identité et les permissions de l'influenceur"""
+
+    def setUp(self):
+        cache.clear()
+        activite.reinitialiser()
+        self.addCleanup(activite.reinitialiser)
+        self.influenceur = Influenceur.create_influenceur(nom='Awa Traoré', email='awa@example.com', password='secret',
+                                                         peut_valider_prospects=True)
+        self.client = APIClient()
+
+    def connecter(self):
+        response = self.client.post(reverse('influenceur_login'), {'email': 'awa@example.com', 'password': 'secret'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def authentifier(self, jetons):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {jetons["access_token"]}')
+
+    def test_claims_et_requete_authentifiee_sans_acces_base(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        jetons = self.connecter()
+        claims = AccessToken(jetons['access_token'])
+        self.assertEqual(claims['influenceur_id'], self.influenceur.pk)
+        self.assertEqual(claims['role'], 'influenceur')
+        self.assertTrue(claims['permissions']['peut_valider_prospects'])
+
+        self.authentifier(jetons)
+        self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 200)
+        # Cache propre au processus (locmem) : la version des permissions est relue en base
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 200)
+        # Cache partagé : authentification, permission et influenceur courant servis par le token et le cache
+        with mock.patch('influenceur.cache.cache_partage', return_value=True):
+            self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 200)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 200)
+
+    def test_modification_de_son_profil_sans_elevation_de_privileges(self):
+        self.authentifier(self.connecter())
+        url = reverse('influenceur_detail', args=[self.influenceur.pk])
+        response = self.client.patch(url, {
+            'nom': 'Awa T.', 'role': 'admin', 'is_active': False, 'peut_payer_remises': True,
+            'peut_creer_influenceurs': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.influenceur.refresh_from_db()
+        self.assertEqual(self.influenceur.nom, 'Awa T.')
+        self.assertEqual(self.influenceur.role, 'influenceur')
+        self.assertTrue(self.influenceur.is_active)
+        self.assertFalse(self.influenceur.peut_payer_remises)
+        self.assertFalse(self.influenceur.peut_creer_influenceurs)
+
+        # Un superutilisateur peut toujours modifier les permissions
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        self.assertEqual(admin.patch(url, {'peut_payer_remises': True}, format='json').status_code, 200)
+        self.influenceur.refresh_from_db()
+        self.assertTrue(self.influenceur.peut_payer_remises)
+
+    def test_auto_modification_sans_changement_de_permissions(self):
+        self.authentifier(self.connecter())
+        url = reverse('influenceur_detail', args=[self.influenceur.pk])
+        response = self.client.patch(url, {'telephone': '70000002', 'role': 'admin', 'peut_payer_remises': True},
+                                     format='json')
+        self.assertEqual(response.status_code, 200)
+        # Compteur interne absent des réponses, permissions et tokens inchangés
+        self.assertNotIn('version_permissions', response.json())
+        self.assertNotIn('version_permissions', self.client.get(url).json())
+        self.influenceur.refresh_from_db()
+        self.assertEqual(self.influenceur.version_permissions, 0)
+        self.assertFalse(self.influenceur.has_permission('payer_remises'))
+        self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 200)
+
+    def test_inscription_delivre_des_tokens_d_influenceur(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        response = self.client.post(reverse('auth_register'), {
+            'nom': 'Moussa Koné', 'email': 'moussa@example.com', 'password': 'secret', 'telephone': '70000001'},
+            format='json')
+        self.assertEqual(response.status_code, 201)
+        inscrit = Influenceur.objects.get(email='moussa@example.com')
+        self.assertEqual(AccessToken(response.json()['access_token'])['influenceur_id'], inscrit.pk)
+        self.assertEqual(User.objects.get(username='moussa@example.com').first_name, 'Moussa')
+
+    def test_revocation_par_changement_de_permissions(self):
+        jetons = self.connecter()
+        self.authentifier(jetons)
+        self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 200)
+
+        # Une sauvegarde sans changement de permission ne révoque rien
+        self.influenceur.nom = 'Awa T.'
+        self.influenceur.save()
+        self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 200)
+
+        self.influenceur.peut_valider_prospects = False
+        self.influenceur.save()
+        self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 401)
+        refresh = self.client.post(reverse('auth_refresh'), {'refresh_token': jetons['refresh_token']}, format='json')
+        self.assertEqual(refresh.status_code, 401)
+
+        jetons = self.connecter()
+        self.authentifier(jetons)
+        self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 200)
+        refresh = self.client.post(reverse('auth_refresh'), {'refresh_token': jetons['refresh_token']}, format='json')
+        self.assertEqual(refresh.status_code, 200)
+
+    def test_revocation_vue_par_tous_les_processus_sous_locmem(self):
+        self.authentifier(self.connecter())
+        self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 200)
+        # Révocation publiée par un autre worker : le cache de ce processus n'en sait rien
+        Influenceur.objects.filter(pk=self.influenceur.pk).update(version_permissions=F('version_permissions') + 1)
+        self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 401)
+
+    def test_revocation_par_mot_de_passe_et_suppression(self):
+        self.authentifier(self.connecter())
+        self.influenceur.set_password('nouveau')
+        self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 401)
+
+        self.client.credentials()
+        self.authentifier(self.client.post(reverse('influenceur_login'),
+                                           {'email': 'awa@example.com', 'password': 'nouveau'}, format='json').json())
+        self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 200)
+        self.influenceur.delete()
+        self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 401)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ConnexionInfluenceurTests(TestCase):
+    """Écritures de la connexion d'un influenceur (utilisateur Django, dernière connexion)"""
+
+    def setUp(self):
+        cache.clear()
+        activite.reinitialiser()
+        self.addCleanup(activite.reinitialiser)
+        self.influenceur = Influenceur.create_influenceur(nom='Awa Traoré', email='awa@example.com', password='secret')
+        self.client = APIClient()
+
+    def connecter(self, password='secret'):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.post(reverse('influenceur_login'), {'email': 'awa@example.com', 'password': password},
+                                        format='json')
+        ecritures = [q['sql'] for q in requetes.captured_queries
+                     if q['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        return response, ecritures
+
+    def test_connexions_successives_sans_ecriture_redondante(self):
+        response, ecritures = self.connecter()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ecritures), 3)  # utilisateur Django, token, dernière connexion
+        user = User.objects.get(username='awa@example.com')
+        self.assertEqual((user.first_name, user.last_name, user.is_active), ('Awa', 'Traoré', True))
+        self.influenceur.refresh_from_db()
+        self.assertIsNotNone(self.influenceur.date_derniere_connexion)
+
+        # Dans l'intervalle : seul le token (blacklist) est écrit
+        response, ecritures = self.connecter()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ecritures), 1)
+        self.assertIn('token_blacklist_outstandingtoken', ecritures[0])
+
+    def test_utilisateur_reecrit_seulement_si_modifie(self):
+        self.connecter()
+        self.influenceur.nom = 'Awa Traoré Diallo'
+        self.influenceur.save()
+        response, ecritures = self.connecter()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum('auth_user' in sql for sql in ecritures), 1)
+        self.assertEqual(User.objects.get(username='awa@example.com').last_name, 'Traoré Diallo')
+
+    def test_tentatives_effacees_et_intervalle(self):
+        self.connecter()
+        self.assertEqual(self.connecter('mauvais')[0].status_code, 401)
+        self.influenceur.refresh_from_db()
+        self.assertEqual(self.influenceur.nombre_tentatives_connexion, 1)
+
+        # Des tentatives à effacer forcent l'écriture malgré l'intervalle
+        self.connecter()
+        self.influenceur.refresh_from_db()
+        self.assertEqual(self.influenceur.nombre_tentatives_connexion, 0)
+
+        precedente = self.influenceur.date_derniere_connexion
+        with override_settings(LAST_LOGIN_UPDATE_INTERVAL=0):
+            self.connecter()
+        self.influenceur.refresh_from_db()
+        self.assertGreater(self.influenceur.date_derniere_connexion, precedente)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher',
+                                     'django.contrib.auth.hashers.UnsaltedMD5PasswordHasher'])
+class HachageMotDePasseTests(TestCase):
+    """Algorithmes reconnus par identify_hasher, mise à niveau à la connexion, pool borné"""
+
+    def setUp(self):
+        cache.clear()
+        activite.reinitialiser()
+        self.addCleanup(activite.reinitialiser)
+        self.client = APIClient()
+
+    def connecter(self, password='secret'):
+        return self.client.post(reverse('influenceur_login'), {'email': 'awa@example.com', 'password': password},
+                                format='json')
+
+    def test_hachage_reconnu_quel_que_soit_l_algorithme(self):
+        from .hachage import est_hache
+        influenceur = Influenceur.create_influenceur(nom='Awa', email='awa@example.com', password='secret')
+        self.assertTrue(influenceur.password.startswith('md5$'))
+        self.assertTrue(est_hache(influenceur.password))
+        self.assertFalse(est_hache('secret'))
+
+        # Une sauvegarde ou un changement de mot de passe ne rehache pas un hachage existant
+        influenceur.nom = 'Awa Traoré'
+        influenceur.save()
+        influenceur.set_password('nouveau')
+        influenceur.save()
+        self.assertEqual(self.connecter('nouveau').status_code, 200)
+
+    def test_mise_a_niveau_a_la_connexion_sans_revocation(self):
+        from django.contrib.auth.hashers import make_password
+        influenceur = Influenceur.create_influenceur(nom='Awa', email='awa@example.com',
+                                                     password=make_password('secret', hasher='unsalted_md5'))
+        self.assertEqual(self.connecter('mauvais').status_code, 401)
+        influenceur.refresh_from_db()
+        self.assertNotIn('$', influenceur.password)  # Pas de mise à niveau sans mot de passe valide
+
+        response = self.connecter()
+        self.assertEqual(response.status_code, 200)
+        influenceur.refresh_from_db()
+        self.assertTrue(influenceur.password.startswith('md5$'))
+        self.assertEqual(influenceur.version_permissions, 0)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.json()["access_token"]}')
+        self.assertEqual(self.client.get(reverse('prospect_view')).status_code, 200)
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE=0)
+    def test_pool_sature(self):
+        import threading
+        from . import hachage
+        Influenceur.create_influenceur(nom='Awa', email='awa@example.com', password='secret')
+        demarre, liberer = threading.Event(), threading.Event()
+
+        def occuper():
+            demarre.set()
+            liberer.wait(5)
+
+        fil = threading.Thread(target=hachage.executer, args=(occuper,))
+        fil.start()
+        try:
+            demarre.wait(5)
+            with self.assertLogs('django.request', 'ERROR'):
+                response = self.connecter()
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+        finally:
+            liberer.set()
+            fil.join()
+        self.assertEqual(self.connecter().status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SauvegardeInfluenceurTests(TestCase):
+    """Détection du changement de mot de passe par l'état initial, sans relecture en base"""
+
+    def setUp(self):
+        cache.clear()
+        activite.reinitialiser()
+        self.addCleanup(activite.reinitialiser)
+        Influenceur.create_influenceur(nom='Awa', email='awa@example.com', password='secret')
+        self.influenceur = Influenceur.objects.get(email='awa@example.com')
+        self.client = APIClient()
+
+    def connecter(self, password='secret'):
+        return self.client.post(reverse('influenceur_login'), {'email': 'awa@example.com', 'password': password},
+                                format='json')
+
+    def test_sauvegardes_partielles_en_une_requete(self):
+        with self.assertNumQueries(1):
+            self.influenceur.increment_login_attempts()
+        with self.assertNumQueries(1):
+            self.influenceur.update_last_login()
+        with self.assertNumQueries(1):
+            self.influenceur.nom = 'Awa Traoré'
+            self.influenceur.save()
+        self.influenceur.refresh_from_db()
+        self.assertEqual(self.influenceur.version_permissions, 0)
+
+    def test_changement_de_mot_de_passe_sans_select(self):
+        hachage_initial = self.influenceur.password
+        with self.assertNumQueries(1):
+            self.influenceur.password = 'nouveau'
+            self.influenceur.save()
+        self.influenceur.refresh_from_db()
+        self.assertNotEqual(self.influenceur.password, hachage_initial)
+        self.assertTrue(self.influenceur.check_password('nouveau'))
+        self.assertEqual(self.influenceur.version_permissions, 1)
+        self.assertIsNotNone(self.influenceur.date_derniere_modification_password)
+
+        # Un hachage existant n'est pas rehaché et ne révoque rien s'il est inchangé
+        self.influenceur.save()
+        self.influenceur.refresh_from_db()
+        self.assertTrue(self.influenceur.check_password('nouveau'))
+        self.assertEqual(self.influenceur.version_permissions, 1)
+
+    def test_sauvegarde_apres_rechargement_sans_revocation(self):
+        autre = Influenceur.objects.get(pk=self.influenceur.pk)
+        autre.peut_payer_remises = True
+        autre.save()
+        self.influenceur.refresh_from_db()
+        self.assertEqual(self.influenceur.version_permissions, 1)
+        # L'état rechargé est la nouvelle référence : rien n'a changé, rien n'est révoqué
+        self.influenceur.save()
+        self.influenceur.refresh_from_db(fields=['peut_payer_remises', 'version_permissions'])
+        self.influenceur.save()
+        self.assertEqual(Influenceur.objects.get(pk=self.influenceur.pk).version_permissions, 1)
+
+    def test_mot_de_passe_differe(self):
+        partiel = Influenceur.objects.defer('password').get(pk=self.influenceur.pk)
+        with self.assertNumQueries(1):
+            partiel.nom = 'Awa T.'
+            partiel.save(update_fields=['nom'])
+        partiel.password = 'autre'
+        partiel.save()
+        self.assertTrue(Influenceur.objects.get(pk=self.influenceur.pk).check_password('autre'))
+
+    def test_chemin_de_connexion(self):
+        self.assertEqual(self.connecter().status_code, 200)
+        # Connexion suivante : influenceur, utilisateur Django, token (plus le savepoint)
+        with self.assertNumQueries(5):
+            self.assertEqual(self.connecter().status_code, 200)
+        # Échec : lecture de l'influenceur et UPDATE des tentatives
+        with self.assertNumQueries(2):
+            self.assertEqual(self.connecter('mauvais').status_code, 401)
+
+
+class ActiviteTests(TestCase):
+    """Dernière activité notée en mémoire et écrite par lots (influenceur.activite)"""
+
+    def setUp(self):
+        cache.clear()
+        activite.reinitialiser()
+        self.addCleanup(activite.reinitialiser)
+        self.influenceur = Influenceur.create_influenceur(nom='Awa', email='awa@example.com', password='secret')
+        self.client = APIClient()
+
+    def ecritures_activite(self, requetes):
+        return [q['sql'] for q in requetes.captured_queries
+                if q['sql'].startswith('UPDATE') and 'date_derniere_connexion' in q['sql']]
+
+    def test_requetes_jwt_sans_ecriture_puis_lot(self):
+        jetons = self.client.post(reverse('influenceur_login'), {'email': 'awa@example.com', 'password': 'secret'},
+                                  format='json').json()
+        Influenceur.objects.filter(pk=self.influenceur.pk).update(date_derniere_connexion=None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {jetons["access_token"]}')
+        with CaptureQueriesContext(connection) as requetes:
+            for _ in range(5):
+                self.assertEqual(self.client.get(reverse('auth_profile')).status_code, 200)
+        self.assertEqual(self.ecritures_activite(requetes), [])
+        self.assertEqual(activite.en_attente(), 1)
+
+        # Lot dû : écrit en fin de requête, une seule fois
+        with override_settings(LAST_SEEN_FLUSH_INTERVAL=0), CaptureQueriesContext(connection) as requetes:
+            for _ in range(3):
+                self.client.get(reverse('auth_profile'))
+        self.assertEqual(len(self.ecritures_activite(requetes)), 1)
+        self.assertEqual(activite.en_attente(), 0)
+        self.influenceur.refresh_from_db()
+        self.assertIsNotNone(self.influenceur.date_derniere_connexion)
+
+    def test_lot_groupe_et_verrou_partage(self):
+        autres = [Influenceur.create_influenceur(nom=f'Autre {i}', email=f'autre{i}@example.com', password='x')
+                  for i in range(3)]
+        for influenceur in [self.influenceur, *autres]:
+            self.assertTrue(activite.signaler(influenceur.pk))
+        self.assertFalse(activite.signaler(self.influenceur.pk))
+        with self.assertNumQueries(1):
+            self.assertEqual(activite.vider(force=True), 4)
+        self.assertEqual(Influenceur.objects.filter(date_derniere_connexion__isnull=False).count(), 4)
+
+        # Un autre processus (état local vide) trouve le verrou du cache dans l'intervalle
+        activite.reinitialiser()
+        self.assertFalse(activite.signaler(self.influenceur.pk))
+        self.assertEqual(activite.en_attente(), 0)
+
+    def test_authentification_par_token_drf(self):
+        from rest_framework.authtoken.models import Token
+        from .auth import InfluenceurTokenAuthentication, utilisateur_pour_influenceur
+        token = Token.objects.create(user=utilisateur_pour_influenceur(self.influenceur))
+        authentification = InfluenceurTokenAuthentication()
+        with CaptureQueriesContext(connection) as requetes:
+            for _ in range(5):
+                authentification.authenticate_credentials(token.key)
+        self.assertEqual(self.ecritures_activite(requetes), [])
+        self.assertEqual(activite.en_attente(), 1)
+
+    def test_minuterie_sans_nouvelle_requete(self):
+        autre = Influenceur.create_influenceur(nom='Autre', email='autre@example.com', password='x')
+        with mock.patch('influenceur.activite.threading.Timer') as minuterie:
+            activite.signaler(self.influenceur.pk)
+            activite.signaler(autre.pk)
+            # Une seule minuterie pour le lot en attente
+            minuterie.assert_called_once_with(30, activite._vidage_differe)
+            minuterie.return_value.start.assert_called_once_with()
+            with mock.patch('influenceur.activite.connections') as connexions:
+                activite._vidage_differe()
+            connexions.close_all.assert_called_once_with()
+            self.assertEqual(activite.en_attente(), 0)
+            self.assertEqual(Influenceur.objects.filter(date_derniere_connexion__isnull=False).count(), 2)
+
+            activite.signaler(Influenceur.create_influenceur(nom='X', email='x@example.com', password='x').pk)
+            self.assertEqual(minuterie.call_count, 2)
+            activite.reinitialiser()
+            minuterie.return_value.cancel.assert_called_once_with()
+
+    def test_connexions_refermees_apres_ecriture(self):
+        from . import signals
+        with mock.patch.object(signals, 'close_old_connections') as fermer:
+            signals.ecrire_activites(None)
+            # Dans une transaction (TestCase), la connexion n'est pas refermée
+            fermer.assert_not_called()
+            with mock.patch.object(signals, 'connection', in_atomic_block=False):
+                signals.ecrire_activites(None)
+            fermer.assert_called_once_with()
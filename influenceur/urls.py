@@ -3,7 +3,9 @@ from .auth_views import (admin_login_view, influenceur_login_view, logout_view,
                         refresh_token_view)
 from .views import (influenceur_view, influenceur_detail_view,
                     influenceur_dashboard_view, influenceur_prospects_view, 
-                    influenceur_remises_view, dashboard_global_admin_view)
+                    influenceur_remises_view, dashboard_global_admin_view, evolution_view,
+                    cache_statistiques_view, instrumentation_vues_view, campagne_affiliation_view, campagne_detail_view,
+                    campagne_destinataires_view)
 
 urlpatterns = [
     # URLs d'authentification JWT
@@ -23,5 +25,11 @@ urlpatterns = [
     path('influenceurs/<int:pk>/prospects/', influenceur_prospects_view, name='influenceur_prospects'),
     path('influenceurs/<int:pk>/remises/', influenceur_remises_view, name='influenceur_remises'),
     path('dashboard-global/', dashboard_global_admin_view, name='dashboard_global_admin'),
+    path('statistiques/evolution/', evolution_view, name='statistiques_evolution'),
+    path('cache/statistiques/', cache_statistiques_view, name='cache_statistiques'),
+    path('instrumentation/vues/', instrumentation_vues_view, name='instrumentation_vues'),  # GET, DELETE (admin)
+    path('campagnes/affiliation/', campagne_affiliation_view, name='campagne_affiliation'),  # POST (admin)
+    path('campagnes/<int:pk>/', campagne_detail_view, name='campagne_detail'),
+    path('campagnes/<int:pk>/destinataires/', campagne_destinataires_view, name='campagne_destinataires'),
 ]
 
@@ -3,25 +3,34 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from .models import Influenceur
-from .serializers import InfluenceurSerializer, InfluenceurUpdateSerializer, InfluenceurCreateSerializer
+from django.urls import reverse
+from .models import Influenceur, CampagneEmail, EmailSortant
+from .serializers import (InfluenceurSerializer, InfluenceurUpdateSerializer, InfluenceurProfilSerializer,
+                          InfluenceurCreateSerializer, EmailSortantSerializer)
 from .permissions import IsInfluenceurOrAdmin
+from .auth import get_influenceur_from_request, get_influenceur_for_permissions
 from .email_service import EmailService
+from .hachage import HachageSature
+from . import cache, instrumentation, lecture_rapide
+from .pagination import reponse_paginee, ProspectCursorPagination, RemiseCursorPagination, EmailSortantCursorPagination
+from .statistiques import (tableau_de_bord_influenceur, tableau_de_bord_global, serie_evolution,
+                           nb_periodes, GRANULARITES)
+from .filtres import lire_date, FiltreInvalide
 from prospect.models import Prospect
-from prospect.serializers import ProspectSerializers
+from prospect.serializers import ProspectListeSerializer
 from remise.models import Remise
-from remise.serializers import RemiseSerializers
-from django.db.models import Count, Sum, Q
+from remise.serializers import RemiseListeSerializer
 from django.utils import timezone
 from datetime import timedelta
 import json
 
-def get_influenceur_from_user(user):
-    """Récupère l'influenceur correspondant à un utilisateur Django"""
+def _parametre_entier(request, nom, defaut, minimum, maximum):
+    """Lit un paramètre GET entier et le borne entre minimum et maximum"""
     try:
-        return Influenceur.objects.get(email=user.email)
-    except Influenceur.DoesNotExist:
-        return None
+        valeur = int(request.GET.get(nom, defaut))
+    except (TypeError, ValueError):
+        return defaut
+    return max(minimum, min(valeur, maximum))
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAdminUser])
@@ -29,11 +38,11 @@ def influenceur_view(request):
     """
     Vue API pour lister tous les influenceurs (GET) ou en créer un (POST).
     Seuls les admins peuvent accéder à cette vue.
+    La liste est construite depuis .values() (JSON identique à InfluenceurSerializer).
     """
     if request.method == 'GET':
         influenceurs = Influenceur.objects.all()
-        serializer = InfluenceurSerializer(influenceurs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(lecture_rapide.serialiser(InfluenceurSerializer, influenceurs), status=status.HTTP_200_OK)
     elif request.method == 'POST':
         # Récupérer les données
         nom = request.data.get('nom')
@@ -64,22 +73,15 @@ def influenceur_view(request):
                 role=role
             )
             
-            # Envoi des emails avec le nouveau service
-            try:
-                # Email d'affiliation avec le lien
-                EmailService.send_affiliation_link(influenceur)
-                
-                # Email de bienvenue
-                EmailService.send_welcome_email(influenceur)
-                
-            except Exception as e:
-                print(f"Erreur lors de l'envoi des emails : {e}")
-                # On continue même si l'email échoue
+            # Emails d'affiliation et de bienvenue mis en file, envoyés par run_email_dispatcher
+            EmailService.mettre_en_file_creation(influenceur)
             
             # Sérialiser la réponse
             serializer = InfluenceurSerializer(influenceur)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
             
+        except HachageSature as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
         except Exception as e:
             return Response({
                 'error': f'Erreur lors de la création : {str(e)}'
@@ -95,7 +97,7 @@ def influenceur_detail_view(request, pk):
     influenceur = get_object_or_404(Influenceur, pk=pk)
     
     # Vérifier les permissions
-    current_influenceur = get_influenceur_from_user(request.user)
+    current_influenceur = get_influenceur_from_request(request)
     if not request.user.is_superuser and current_influenceur and current_influenceur.id != influenceur.id:
         return Response({'error': 'Accès non autorisé'}, status=status.HTTP_403_FORBIDDEN)
     
@@ -106,8 +108,14 @@ def influenceur_detail_view(request, pk):
     
     elif request.method in ['PUT', 'PATCH']:
         # Modification
-        # Utiliser le serializer de mise à jour qui limite les champs modifiables
-        serializer = InfluenceurUpdateSerializer(influenceur, data=request.data, partial=(request.method == 'PATCH'))
+        # Utiliser le serializer de mise à jour qui limite les champs modifiables ; hors admins,
+        # le rôle, l'activation et les permissions ne sont pas modifiables (profil seulement)
+        demandeur = get_influenceur_for_permissions(request)
+        if request.user.is_superuser or (demandeur is not None and demandeur.is_admin()):
+            serializer_class = InfluenceurUpdateSerializer
+        else:
+            serializer_class = InfluenceurProfilSerializer
+        serializer = serializer_class(influenceur, data=request.data, partial=(request.method == 'PATCH'))
         
         if serializer.is_valid():
             try:
@@ -149,74 +157,20 @@ def influenceur_detail_view(request, pk):
 def influenceur_dashboard_view(request, pk):
     """
     Vue API pour afficher le tableau de bord d'un influenceur avec toutes les stats nécessaires au frontend.
+    Le nombre de requêtes est constant quel que soit l'historique de l'influenceur.
+    Paramètre optionnel : ?mois={nombre de mois de l'évolution} (défaut 6, max 36)
     """
-    
-
     influenceur = get_object_or_404(Influenceur, pk=pk)
-    current_influenceur = get_influenceur_from_user(request.user)
+    current_influenceur = get_influenceur_from_request(request)
     if not request.user.is_superuser and current_influenceur and current_influenceur.id != influenceur.id:
         return Response({'error': 'Accès non autorisé'}, status=status.HTTP_403_FORBIDDEN)
 
-    # Prospects et remises de l'influenceur
-    prospects = Prospect.objects.filter(influenceur=influenceur)
-    remises = Remise.objects.filter(influenceur=influenceur)
-
-    # Statistiques globales
-    total_prospects = prospects.count()
-    total_remises = remises.count()
-    total_gains = remises.filter(statut='payee').aggregate(total=Sum('montant'))['total'] or 0
-    nb_prospects_confirmes = prospects.filter(statut='confirme').count()
-    nb_prospects_rejetes = prospects.filter(statut='rejeter').count()
-    nb_prospects_en_attente = prospects.filter(statut='en_attente').count()
-    
-    # Taux de conversion (confirmés / (confirmés + rejetés))
-    prospects_traites = nb_prospects_confirmes + nb_prospects_rejetes
-    taux_conversion = round((nb_prospects_confirmes / prospects_traites) * 100, 2) if prospects_traites > 0 else 0
-
-    # Evolution mensuelle (prospects/remises par mois sur 6 derniers mois)
-    today = timezone.now().date()
-    first_month = (today.replace(day=1) - timezone.timedelta(days=180)).replace(day=1)
-    evolution = []
-    for i in range(6):
-        month = (today.replace(day=1) - timezone.timedelta(days=30*i)).replace(day=1)
-        month_str = month.strftime('%b')
-        nb_prospects = prospects.filter(date_inscription__year=month.year, date_inscription__month=month.month).count()
-        nb_remises = remises.filter(date_creation__year=month.year, date_creation__month=month.month).count()
-        evolution.append({"mois": month_str, "prospects": nb_prospects, "remises": nb_remises})
-    evolution = list(reversed(evolution))
-
-    # Répartition des remises par statut
-    repartition_remises = []
-    for statut, _ in Remise.STATUT_CHOICES:
-        count = remises.filter(statut=statut).count()
-        repartition_remises.append({"statut": statut, "count": count})
-
-    # Prospects récents (10 derniers)
-    prospects_recents_qs = prospects.order_by('-date_inscription')[:10]
-    prospects_recents = []
-    for p in prospects_recents_qs:
-        # Trouver la remise associée (si existe)
-        montant = p.remise.montant if p.remise else 0
-        prospects_recents.append({
-            "nom": p.nom,
-            "email": p.email,
-            "statut": p.statut,
-            "montant": montant,
-            "date": p.date_inscription.strftime('%Y-%m-%d')
-        })
-
-    dashboard_data = {
-        "total_prospects": total_prospects,
-        "total_remises": total_remises,
-        "total_gains": float(total_gains),
-        "taux_conversion": taux_conversion,
-        "nb_prospects_confirmes": nb_prospects_confirmes,
-        "nb_prospects_rejetes": nb_prospects_rejetes,
-        "nb_prospects_en_attente": nb_prospects_en_attente,
-        "evolution": evolution,
-        "repartition_remises": repartition_remises,
-        "prospects_recents": prospects_recents
-    }
+    nb_mois = _parametre_entier(request, 'mois', defaut=6, minimum=1, maximum=36)
+    dashboard_data = cache.obtenir(
+        'dashboard_influenceur', influenceur.pk,
+        lambda: tableau_de_bord_influenceur(influenceur, nb_mois=nb_mois),
+        parametres=(nb_mois,)
+    )
     return Response(dashboard_data, status=status.HTTP_200_OK)
 
 @api_view(['GET'])
@@ -225,17 +179,17 @@ def influenceur_prospects_view(request, pk):
     """
     Vue API pour lister tous les prospects d'un influenceur donné.
     L'influenceur peut voir ses propres prospects, les admins peuvent voir tous.
+    Pagination par curseur (?cursor=...&page_size=...), ?pagination=false pour la liste complète.
     """
     influenceur = get_object_or_404(Influenceur, pk=pk)
     
     # Vérifier les permissions
-    current_influenceur = get_influenceur_from_user(request.user)
+    current_influenceur = get_influenceur_from_request(request)
     if not request.user.is_superuser and current_influenceur and current_influenceur.id != influenceur.id:
         return Response({'error': 'Accès non autorisé'}, status=status.HTTP_403_FORBIDDEN)
     
     prospects = Prospect.objects.filter(influenceur=influenceur)
-    serializer = ProspectSerializers(prospects, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return reponse_paginee(request, prospects, ProspectListeSerializer, ProspectCursorPagination)
 
 @api_view(['GET'])
 @permission_classes([IsInfluenceurOrAdmin])
@@ -243,98 +197,157 @@ def influenceur_remises_view(request, pk):
     """
     Vue API pour lister toutes les remises d'un influenceur donné.
     L'influenceur peut voir ses propres remises, les admins peuvent voir tous.
+    Pagination par curseur (?cursor=...&page_size=...), ?pagination=false pour la liste complète.
     """
     influenceur = get_object_or_404(Influenceur, pk=pk)
     
     # Vérifier les permissions
-    current_influenceur = get_influenceur_from_user(request.user)
+    current_influenceur = get_influenceur_from_request(request)
     if not request.user.is_superuser and current_influenceur and current_influenceur.id != influenceur.id:
         return Response({'error': 'Accès non autorisé'}, status=status.HTTP_403_FORBIDDEN)
     
     remises = Remise.objects.filter(influenceur=influenceur)
-    serializer = RemiseSerializers(remises, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return reponse_paginee(request, remises, RemiseListeSerializer, RemiseCursorPagination)
 
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def dashboard_global_admin_view(request):
     """
     Vue API pour le dashboard global admin (statistiques générales)
+    Paramètres optionnels : ?top={nombre d'influenceurs classés}&jours={longueur de l'évolution}
     """
-    # Statistiques globales
-    total_influenceurs = Influenceur.objects.count()
-    total_prospects = Prospect.objects.count()
-    prospects_en_attente = Prospect.objects.filter(statut='en_attente').count()
-    prospects_confirmes = Prospect.objects.filter(statut='confirme').count()
-    prospects_rejetes = Prospect.objects.filter(statut='rejeter').count()
-    total_primes = Remise.objects.count()
-    primes_payees = Remise.objects.filter(statut='payee').count()
-    primes_en_attente = Remise.objects.filter(statut='en_attente').count()
-    
-    # Calculer le taux de conversion global
-    prospects_traites_global = prospects_confirmes + prospects_rejetes
-    taux_conversion_global = round((prospects_confirmes / prospects_traites_global) * 100, 2) if prospects_traites_global > 0 else 0
-    
-    # Calculer le montant total des gains
-    total_gains_global = Remise.objects.filter(statut='payee').aggregate(total=Sum('montant'))['total'] or 0
-    total_gains_en_attente = Remise.objects.filter(statut='en_attente').aggregate(total=Sum('montant'))['total'] or 0
+    nb_top = _parametre_entier(request, 'top', defaut=5, minimum=1, maximum=50)
+    nb_jours = _parametre_entier(request, 'jours', defaut=7, minimum=1, maximum=90)
+    data = cache.obtenir(
+        'dashboard_global', None,
+        lambda: tableau_de_bord_global(nb_top=nb_top, nb_jours=nb_jours),
+        parametres=(nb_top, nb_jours)
+    )
+    return Response(data)
 
-    # Top influenceurs (par nombre de prospects)
-    top_influenceurs_qs = Influenceur.objects.annotate(
-        nb_prospects=Count('prospects'),
-        nb_prospects_confirmes=Count('prospects', filter=Q(prospects__statut='confirme')),
-        nb_prospects_rejetes=Count('prospects', filter=Q(prospects__statut='rejeter')),
-        nb_prospects_en_attente=Count('prospects', filter=Q(prospects__statut='en_attente'))
-    ).order_by('-nb_prospects')[:5]
-    
-    top_influenceurs = []
-    for i in top_influenceurs_qs:
-        # Calculer le taux de conversion
-        prospects_traites = i.nb_prospects_confirmes + i.nb_prospects_rejetes
-        taux_conversion = round((i.nb_prospects_confirmes / prospects_traites) * 100, 2) if prospects_traites > 0 else 0
+@api_view(['GET'])
+@permission_classes([IsInfluenceurOrAdmin])
+def evolution_view(request):
+    """
+    Vue API pour obtenir l'évolution des prospects et remises sur une période.
+    Paramètres : ?debut=AAAA-MM-JJ&fin=AAAA-MM-JJ&granularite={jour|semaine|mois}
+    Les admins peuvent filtrer par influenceur (?influenceur={id}),
+    les influenceurs ne voient que leur propre évolution.
+    """
+    granularite = request.GET.get('granularite', 'jour')
+    if granularite not in GRANULARITES:
+        return Response({'error': 'Granularité invalide (jour, semaine ou mois)'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        fin = lire_date(request.GET, 'fin') or timezone.localdate()
+        debut = lire_date(request.GET, 'debut') or fin - timedelta(days=29)
+    except FiltreInvalide as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except OverflowError:
+        return Response({'error': 'Période invalide'}, status=status.HTTP_400_BAD_REQUEST)
+    if debut > fin:
+        return Response({'error': 'Période invalide'}, status=status.HTTP_400_BAD_REQUEST)
+    if nb_periodes(debut, fin, granularite) > 400:
+        return Response({'error': 'Période trop longue pour cette granularité'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Correction : compter et sommer les remises sans surcomptage
-        nb_remises = Remise.objects.filter(influenceur=i).count()
-        nb_remises_payees = Remise.objects.filter(influenceur=i, statut='payee').count()
-        total_gains = Remise.objects.filter(influenceur=i, statut='payee').aggregate(total=Sum('montant'))['total'] or 0
+    current_influenceur = get_influenceur_from_request(request)
+    if not request.user.is_superuser and current_influenceur:
+        influenceur_id = current_influenceur.id
+    else:
+        influenceur_id = request.GET.get('influenceur')
+        if influenceur_id is not None:
+            if not influenceur_id.isdigit():
+                return Response({'error': 'Identifiant d\'influenceur invalide'}, status=status.HTTP_400_BAD_REQUEST)
+            influenceur_id = get_object_or_404(Influenceur, pk=int(influenceur_id)).pk
 
-        top_influenceurs.append({
-            'id': i.id,
-            'nom': i.nom,
-            'email': i.email,
-            'code_affiliation': i.code_affiliation,
-            'nb_prospects': i.nb_prospects,
-            'nb_prospects_confirmes': i.nb_prospects_confirmes,
-            'nb_prospects_rejetes': i.nb_prospects_rejetes,
-            'nb_prospects_en_attente': i.nb_prospects_en_attente,
-            'taux_conversion': taux_conversion,
-            'nb_remises': nb_remises,
-            'nb_remises_payees': nb_remises_payees,
-            'total_gains': float(total_gains),
-            'date_creation': i.date_creation.strftime('%Y-%m-%d') if i.date_creation else None
-        })
+    def calculer():
+        serie = serie_evolution(debut, fin, granularite, influenceur_id)
+        for ligne in serie:
+            ligne['periode'] = str(ligne['periode'])
+        return serie
 
-    # Evolution prospects (nombre d'inscriptions par jour sur les 7 derniers jours)
-    today = timezone.now().date()
-    evolution_prospects = []
-    for i in range(7):
-        day = today - timedelta(days=6-i)
-        count = Prospect.objects.filter(date_inscription__date=day).count()
-        evolution_prospects.append({'date': str(day), 'count': count})
+    serie = cache.obtenir('evolution', influenceur_id, calculer, parametres=(debut, fin, granularite))
+    return Response({
+        'debut': str(debut),
+        'fin': str(fin),
+        'granularite': granularite,
+        'evolution': serie,
+    }, status=status.HTTP_200_OK)
 
-    data = {
-        'total_influenceurs': total_influenceurs,
-        'total_prospects': total_prospects,
-        'prospects_en_attente': prospects_en_attente,
-        'prospects_confirmes': prospects_confirmes,
-        'prospects_rejetes': prospects_rejetes,
-        'taux_conversion_global': taux_conversion_global,
-        'total_primes': total_primes,
-        'primes_payees': primes_payees,
-        'primes_en_attente': primes_en_attente,
-        'total_gains_global': float(total_gains_global),
-        'total_gains_en_attente': float(total_gains_en_attente),
-        'top_influenceurs': top_influenceurs,
-        'evolution_prospects': evolution_prospects,
-    }
-    return Response(data)
\ No newline at end of file
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_statistiques_view(request):
+    """
+    Vue API exposant les hits/misses du cache des statistiques par portée
+    (compteurs du processus courant), pour dimensionner le cache.
+    """
+    from django.conf import settings
+    config = settings.CACHES['default']
+    return Response({
+        'backend': config['BACKEND'],
+        'timeout': getattr(settings, 'STATS_CACHE_TIMEOUT', 300),
+        'max_entries': config.get('OPTIONS', {}).get('MAX_ENTRIES'),
+        'portees': cache.compteurs(),
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def instrumentation_vues_view(request):
+    """
+    Vue API exposant les percentiles de durée (totale et en base) et le nombre de requêtes SQL
+    des dernières requêtes de chaque vue (mesures du processus courant, voir
+    instrumentation.py). DELETE vide les mesures.
+    """
+    if request.method == 'DELETE':
+        instrumentation.reinitialiser()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    from django.conf import settings
+    return Response({
+        'taille_tampon': getattr(settings, 'INSTRUMENTATION_BUFFER_SIZE', 1000),
+        'seuil_requete_lente_ms': getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500),
+        'vues': instrumentation.percentiles(),
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def campagne_affiliation_view(request):
+    """
+    Vue API lançant le renvoi du lien d'affiliation à tous les influenceurs actifs.
+    La campagne est seulement créée : run_email_dispatcher (ou send_affiliation_campaign
+    --resume) met les destinataires en file par lots puis envoie les emails.
+    Réponse 202 avec le rapport de la campagne.
+    """
+    campagne = CampagneEmail.objects.create(type_email='affiliation', demande_par=request.user.get_username())
+    return Response({
+        'detail': 'Campagne créée, destinataires mis en file par le dispatcher.',
+        'campagne': campagne.rapport(),
+        'suivi': reverse('campagne_detail', args=[campagne.pk]),
+        'destinataires': reverse('campagne_destinataires', args=[campagne.pk]),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def campagne_detail_view(request, pk):
+    """
+    Vue API de suivi d'une campagne : destinataires par statut et débit d'envoi.
+    """
+    campagne = get_object_or_404(CampagneEmail, pk=pk)
+    return Response(campagne.rapport(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def campagne_destinataires_view(request, pk):
+    """
+    Vue API listant le statut d'envoi de chaque destinataire d'une campagne.
+    Filtre : ?statut={en_attente|envoye|echec}. Pagination par curseur.
+    """
+    campagne = get_object_or_404(CampagneEmail, pk=pk)
+    emails = EmailSortant.objects.filter(campagne=campagne)
+    statut = request.GET.get('statut')
+    if statut in dict(EmailSortant.STATUT_CHOICES):
+        emails = emails.filter(statut=statut)
+    return reponse_paginee(request, emails, EmailSortantSerializer, EmailSortantCursorPagination)
@@ -0,0 +1,79 @@
+"""
+Lecture et contrôle des soumissions du formulaire d'affiliation (affiliation_form_view),
+communs à l'inscription directe et à la file d'inscriptions (InscriptionEnAttente).
+"""
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from .models import Prospect
+
+# Champs du formulaire enregistrés sur le prospect
+CHAMPS_FORMULAIRE = (
+    'nom', 'telephone', 'email',
+    'niveau_etude', 'niveau_etude_autre',
+    'serie_bac', 'serie_bac_autre',
+    'filiere_souhaitee', 'filiere_autre',
+)
+
+
+class InscriptionInvalide(ValueError):
+    """Soumission incomplète ou incohérente (réponse 400)"""
+
+
+def lire_inscription(data):
+    """
+    Extrait et valide les champs d'une soumission (dict JSON).
+    Retourne les champs du prospect ; lève InscriptionInvalide.
+    """
+    if not isinstance(data, dict):
+        raise InscriptionInvalide('Données JSON invalides')
+    champs = {champ: data.get(champ) for champ in CHAMPS_FORMULAIRE}
+    for champ, valeur in champs.items():
+        if valeur is not None and not isinstance(valeur, str):
+            raise InscriptionInvalide(f'Champ {champ} invalide')
+    # L'email est facultatif : NULL en base, plusieurs prospects peuvent ne pas en avoir
+    champs['email'] = champs['email'] or None
+
+    if not champs['nom'] or not champs['telephone']:
+        raise InscriptionInvalide('Nom et Téléphone requis')
+
+    # Validation des champs conditionnels
+    if champs['niveau_etude'] == 'autre' and not champs['niveau_etude_autre']:
+        raise InscriptionInvalide('Veuillez préciser votre niveau d\'étude')
+
+    if champs['niveau_etude'] == 'bac':
+        if not champs['serie_bac']:
+            raise InscriptionInvalide('Veuillez sélectionner votre série du bac')
+        if champs['serie_bac'] == 'autre' and not champs['serie_bac_autre']:
+            raise InscriptionInvalide('Veuillez préciser votre série du bac')
+
+    if not champs['filiere_souhaitee']:
+        raise InscriptionInvalide('Veuillez sélectionner une filière souhaitée')
+    if champs['filiere_souhaitee'] == 'autre' and not champs['filiere_autre']:
+        raise InscriptionInvalide('Veuillez préciser votre filière souhaitée')
+
+    # Contraintes des colonnes (longueur, format de l'email, choix) : refusées ici plutôt
+    # qu'à l'insertion, où elles échoueraient selon la base (DataError sur PostgreSQL)
+    for champ, valeur in champs.items():
+        try:
+            Prospect._meta.get_field(champ).clean(valeur, None)
+        except ValidationError as e:
+            raise InscriptionInvalide(f'Champ {champ} invalide : {e.messages[0]}')
+
+    return champs
+
+
+def champs_en_double(telephone, email):
+    """
+    Champs uniques (telephone, email) déjà utilisés par un prospect, en une requête
+    sur les index uniques. Un email absent n'est pas comparé.
+    """
+    condition = Q(telephone=telephone)
+    if email:
+        condition |= Q(email=email)
+    doublons = set()
+    for telephone_existant, email_existant in Prospect.objects.filter(condition).values_list('telephone', 'email'):
+        if telephone_existant == telephone:
+            doublons.add('telephone')
+        if email and email_existant == email:
+            doublons.add('email')
+    return sorted(doublons)
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prospect', '0004_add_rejeter_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prospect',
+            index=models.Index(fields=['-date_inscription', '-id'], name='prospect_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prospect',
+            index=models.Index(fields=['influenceur', '-date_inscription', '-id'], name='prospect_infl_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prospect', '0005_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='prospect',
+            options={'verbose_name': 'Prospect', 'verbose_name_plural': 'Prospects'},
+        ),
+        migrations.AddIndex(
+            model_name='prospect',
+            index=models.Index(fields=['influenceur', 'statut', '-date_inscription', '-id'], name='prospect_infl_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prospect',
+            index=models.Index(fields=['statut', '-date_inscription', '-id'], name='prospect_statut_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prospect',
+            index=models.Index(condition=models.Q(('remise__isnull', True), ('statut', 'confirme')), fields=['influenceur', '-date_inscription', '-id'], name='prospect_a_remunerer_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('influenceur', '0007_campagneemail'),
+        ('prospect', '0006_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InscriptionEnAttente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jeton', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('donnees', models.JSONField()),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('importee', 'Importée'), ('conflit', 'Conflit')], default='en_attente', max_length=20)),
+                ('erreur', models.CharField(blank=True, max_length=255)),
+                ('date_reception', models.DateTimeField(default=django.utils.timezone.now)),
+                ('date_traitement', models.DateTimeField(blank=True, null=True)),
+                ('influenceur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inscriptions_en_attente', to='influenceur.influenceur')),
+                ('prospect', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='prospect.prospect')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['statut', 'id'], name='inscription_statut_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prospect', '0007_inscriptionenattente'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inscriptionenattente',
+            name='statut',
+            field=models.CharField(choices=[('en_attente', 'En attente'), ('importee', 'Importée'), ('conflit', 'Conflit'), ('invalide', 'Invalide')], default='en_attente', max_length=20),
+        ),
+    ]
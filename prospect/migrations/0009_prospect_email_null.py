@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:35
+
+from django.db import migrations, models
+
+
+def emails_vides_en_null(apps, schema_editor):
+    """Les prospects enregistrés sans email ('') passent à NULL"""
+    Prospect = apps.get_model('prospect', 'Prospect')
+    Prospect.objects.filter(email='').update(email=None)
+
+
+def emails_null_en_vides(apps, schema_editor):
+    Prospect = apps.get_model('prospect', 'Prospect')
+    Prospect.objects.filter(email__isnull=True).update(email='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prospect', '0008_inscription_statut_invalide'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='prospect',
+            name='email',
+            field=models.EmailField(blank=True, max_length=254, null=True, unique=True),
+        ),
+        migrations.RunPython(emails_vides_en_null, emails_null_en_vides),
+    ]
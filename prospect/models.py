@@ -1,15 +1,21 @@
-from django.db import models
+from django.db import DataError, IntegrityError, models, transaction
 from django.utils import timezone
-from influenceur.models import Influenceur
+from influenceur.models import Influenceur, InfluenceurStats, SuiviModificationsMixin
+from influenceur import cache
 from remise.models import Remise
+import uuid
 
 # Create your models here.
-class Prospect(models.Model):
+class Prospect(SuiviModificationsMixin, models.Model):
     STATUT_CHOICES = [
         ('en_attente', 'En attente'),
         ('confirme', 'Confirmé'),
         ('rejeter', 'Rejeté'),
     ]
+
+    # Champs dont les changements sont répercutés sur InfluenceurStats
+    champs_suivis = ('statut', 'influenceur_id')
+    verrouiller_transitions = True
     
     # Choix pour le niveau d'étude
     NIVEAU_ETUDE_CHOICES = [
@@ -48,9 +54,17 @@ class Prospect(models.Model):
         ('autre', 'Autre'),
     ]
     
+    # Champ de texte libre remplaçant le libellé quand le choix vaut 'autre'
+    CHAMPS_AUTRE = {
+        'niveau_etude': 'niveau_etude_autre',
+        'serie_bac': 'serie_bac_autre',
+        'filiere_souhaitee': 'filiere_autre',
+    }
+    
     # Champs existants
     nom = models.CharField(max_length=100)
-    email = models.EmailField(blank=True, unique=True)
+    # Facultatif : NULL en l'absence d'email, l'index unique ne compare pas les NULL
+    email = models.EmailField(blank=True, null=True, unique=True)
     telephone = models.CharField(max_length=8, blank=False, unique=True)
     date_inscription = models.DateTimeField(default=timezone.now)
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
@@ -69,24 +83,31 @@ class Prospect(models.Model):
 
     def __str__(self):
         return self.nom
+
+    def save(self, *args, **kwargs):
+        # Un email vide ('' depuis un formulaire ou l'API) est enregistré NULL
+        if self.email == '':
+            self.email = None
+        super().save(*args, **kwargs)
     
+    def _libelle_choix(self, champ):
+        """Libellé d'un choix, remplacé par le texte personnalisé si 'autre'"""
+        texte_autre = getattr(self, self.CHAMPS_AUTRE[champ])
+        if getattr(self, champ) == 'autre' and texte_autre:
+            return texte_autre
+        return self._get_FIELD_display(self._meta.get_field(champ))
+
     def get_niveau_etude_display(self):
         """Retourne le niveau d'étude avec le texte personnalisé si 'autre'"""
-        if self.niveau_etude == 'autre' and self.niveau_etude_autre:
-            return self.niveau_etude_autre
-        return super().get_niveau_etude_display()
+        return self._libelle_choix('niveau_etude')
     
     def get_serie_bac_display(self):
         """Retourne la série du bac avec le texte personnalisé si 'autre'"""
-        if self.serie_bac == 'autre' and self.serie_bac_autre:
-            return self.serie_bac_autre
-        return super().get_serie_bac_display()
+        return self._libelle_choix('serie_bac')
     
     def get_filiere_souhaitee_display(self):
         """Retourne la filière souhaitée avec le texte personnalisé si 'autre'"""
-        if self.filiere_souhaitee == 'autre' and self.filiere_autre:
-            return self.filiere_autre
-        return super().get_filiere_souhaitee_display()
+        return self._libelle_choix('filiere_souhaitee')
     
     def get_serie_bac_required(self):
         """Retourne True si la série du bac est requise (niveau = bac)"""
@@ -95,4 +116,168 @@ class Prospect(models.Model):
     class Meta:
         verbose_name = "Prospect"
         verbose_name_plural = "Prospects"
-        ordering = ['-date_inscription']
\ No newline at end of file
+        # Pas d'ordre par défaut : chaque liste précise le sien (voir influenceur/pagination.py)
+        indexes = [
+            # Pagination par curseur et périodes d'inscription (globale et par influenceur)
+            models.Index(fields=['-date_inscription', '-id'], name='prospect_date_id_idx'),
+            models.Index(fields=['influenceur', '-date_inscription', '-id'], name='prospect_infl_date_id_idx'),
+            # Filtres par statut (par influenceur ou global), dans l'ordre des listes
+            models.Index(fields=['influenceur', 'statut', '-date_inscription', '-id'], name='prospect_infl_statut_idx'),
+            models.Index(fields=['statut', '-date_inscription', '-id'], name='prospect_statut_date_idx'),
+            # Prospects confirmés sans remise (à rémunérer) : index partiel, petit par construction
+            models.Index(
+                fields=['influenceur', '-date_inscription', '-id'],
+                condition=models.Q(statut='confirme', remise__isnull=True),
+                name='prospect_a_remunerer_idx',
+            ),
+        ]
+
+
+class InscriptionEnAttente(models.Model):
+    """
+    File d'inscriptions du formulaire d'affiliation (mode AFFILIATION_INTAKE_BUFFERED) :
+    la soumission est enregistrée telle quelle (une insertion) puis importée par lots
+    en prospects (commande flush_affiliation_queue). Chaque inscription garde le résultat
+    de son import : prospect créé, conflit sur un champ unique, ou données invalides.
+    """
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('importee', 'Importée'),
+        ('conflit', 'Conflit'),
+        ('invalide', 'Invalide'),
+    ]
+
+    jeton = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    influenceur = models.ForeignKey(Influenceur, on_delete=models.CASCADE, related_name='inscriptions_en_attente')
+    donnees = models.JSONField()
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    prospect = models.ForeignKey(Prospect, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    erreur = models.CharField(max_length=255, blank=True)
+    date_reception = models.DateTimeField(default=timezone.now)
+    date_traitement = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['statut', 'id'], name='inscription_statut_idx'),
+        ]
+
+    def __str__(self):
+        return f"Inscription {self.jeton} - {self.statut}"
+
+    @classmethod
+    def importer(cls, taille_lot=500):
+        """
+        Importe jusqu'à `taille_lot` inscriptions en attente, dans l'ordre de réception :
+        doublons détectés en une requête (prospects existants et inscriptions du lot),
+        prospects créés avec bulk_create, statistiques mises à jour en masse.
+        Les données sont revalidées (lire_inscription) : une inscription invalide est marquée
+        comme telle sans interrompre le lot.
+        Retourne {'importees': n, 'conflits': n, 'invalides': n}.
+        """
+        from .inscriptions import InscriptionInvalide, lire_inscription
+
+        with transaction.atomic():
+            lot = list(
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(statut='en_attente').order_by('pk')[:taille_lot]
+            )
+            if not lot:
+                return {'importees': 0, 'conflits': 0, 'invalides': 0}
+
+            valides = []
+            for inscription in lot:
+                try:
+                    inscription.donnees = lire_inscription(inscription.donnees)
+                except InscriptionInvalide as e:
+                    inscription.marquer_invalide(str(e))
+                else:
+                    valides.append(inscription)
+
+            telephones = {i.donnees['telephone'] for i in valides}
+            emails = {i.donnees['email'] for i in valides if i.donnees['email']}
+            existants = Prospect.objects.filter(
+                models.Q(telephone__in=telephones) | models.Q(email__in=emails)
+            ).values_list('telephone', 'email')
+            pris = {'telephone': set(), 'email': set()}
+            for telephone, email in existants:
+                pris['telephone'].add(telephone)
+                pris['email'].add(email)
+
+            a_creer = []
+            for inscription in valides:
+                conflits = [
+                    champ for champ in ('telephone', 'email')
+                    if inscription.donnees[champ] and inscription.donnees[champ] in pris[champ]
+                ]
+                if conflits:
+                    inscription.marquer_conflit(conflits)
+                    continue
+                for champ in ('telephone', 'email'):
+                    pris[champ].add(inscription.donnees[champ])
+                a_creer.append(inscription)
+
+            cls._creer_prospects(a_creer)
+
+            maintenant = timezone.now()
+            for inscription in lot:
+                inscription.date_traitement = maintenant
+            cls.objects.bulk_update(lot, ['statut', 'prospect', 'erreur', 'date_traitement'])
+
+            # Statistiques : les prospects sont créés en attente
+            deltas = {}
+            for inscription in lot:
+                if inscription.statut == 'importee':
+                    d = deltas.setdefault(inscription.influenceur_id, {'nb_prospects': 0, InfluenceurStats.CHAMPS_PROSPECTS['en_attente']: 0})
+                    for champ in d:
+                        d[champ] += 1
+            InfluenceurStats.appliquer_en_masse(deltas)
+            cache.invalider(*deltas)
+
+        return {
+            'importees': sum(1 for i in lot if i.statut == 'importee'),
+            'conflits': sum(1 for i in lot if i.statut == 'conflit'),
+            'invalides': sum(1 for i in lot if i.statut == 'invalide'),
+        }
+
+    @classmethod
+    def _creer_prospects(cls, inscriptions):
+        """
+        Crée les prospects en une requête ; si un doublon est apparu entre-temps (inscription
+        directe concurrente) ou qu'une ligne est refusée par la base, repli sur une création
+        par prospect pour isoler l'inscription en cause.
+        """
+        prospects = [inscription.nouveau_prospect() for inscription in inscriptions]
+        try:
+            with transaction.atomic():
+                Prospect.objects.bulk_create(prospects)
+        except (IntegrityError, DataError):
+            for inscription, prospect in zip(inscriptions, prospects):
+                prospect.pk = None
+                try:
+                    # bulk_create : pas de signal, les statistiques sont appliquées en masse
+                    with transaction.atomic():
+                        Prospect.objects.bulk_create([prospect])
+                except IntegrityError:
+                    inscription.marquer_conflit(None)
+                except DataError as e:
+                    inscription.marquer_invalide(str(e))
+                else:
+                    inscription.marquer_importee(prospect)
+            return
+        for inscription, prospect in zip(inscriptions, prospects):
+            inscription.marquer_importee(prospect)
+
+    def nouveau_prospect(self):
+        return Prospect(influenceur_id=self.influenceur_id, date_inscription=self.date_reception, **self.donnees)
+
+    def marquer_importee(self, prospect):
+        self.statut = 'importee'
+        self.prospect = prospect
+
+    def marquer_conflit(self, champs):
+        self.statut = 'conflit'
+        self.erreur = f"Déjà inscrit ({', '.join(champs)})" if champs else 'Déjà inscrit'
+
+    def marquer_invalide(self, erreur):
+        self.statut = 'invalide'
+        self.erreur = erreur[:255]
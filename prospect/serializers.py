@@ -1,8 +1,8 @@
 from rest_framework import serializers
 from .models import Prospect
-from influenceur.serializers import InfluenceurSerializer
+from influenceur.serializers import InfluenceurSerializer, InfluenceurResumeSerializer, DepliableMixin
 from influenceur.models import Influenceur
-from remise.serializers import RemiseSerializers
+from remise.serializers import RemiseSerializers, RemiseListeSerializer
 from remise.models import Remise
 
 
@@ -20,3 +20,70 @@ class ProspectSerializers(serializers.ModelSerializer) :
         model = Prospect
         fields = '__all__'
 
+
+class RemiseResumeSerializer(serializers.ModelSerializer):
+    """
+    Résumé de la remise d'un prospect pour les listes
+    """
+    class Meta:
+        model = Remise
+        fields = ['id', 'montant', 'statut']
+
+
+class ProspectListeSerializer(DepliableMixin, serializers.ModelSerializer):
+    """
+    Serializer de liste (lecture seule) : influenceur et remise sont représentés par leur id
+    et un résumé chargé par jointure. Les détails complets ne sont inclus qu'avec
+    ?expand=influenceur et/ou ?expand=remise.
+    """
+    # Listes servies depuis .values() (influenceur/lecture_rapide.py)
+    lecture_rapide = True
+    # Jointures nécessaires pour sérialiser une page en une seule requête
+    select_related = ('influenceur', 'remise')
+    champs_depliables = {'influenceur': 'influenceur_details', 'remise': 'remise_details'}
+    jointures_depliables = {'remise': ('remise__influenceur',)}
+
+    statut_display = serializers.CharField(source='get_statut_display', read_only=True)
+    niveau_etude_display = serializers.CharField(source='get_niveau_etude_display', read_only=True)
+    serie_bac_display = serializers.CharField(source='get_serie_bac_display', read_only=True)
+    filiere_souhaitee_display = serializers.CharField(source='get_filiere_souhaitee_display', read_only=True)
+    influenceur_resume = InfluenceurResumeSerializer(source='influenceur', read_only=True)
+    remise_resume = RemiseResumeSerializer(source='remise', read_only=True)
+    influenceur_details = InfluenceurSerializer(source='influenceur', read_only=True)
+    remise_details = RemiseListeSerializer(source='remise', read_only=True)
+
+    class Meta:
+        model = Prospect
+        fields = [
+            'id', 'nom', 'email', 'telephone', 'date_inscription', 'statut', 'statut_display',
+            'influenceur', 'influenceur_resume', 'remise', 'remise_resume',
+            'niveau_etude', 'niveau_etude_display', 'niveau_etude_autre',
+            'serie_bac', 'serie_bac_display', 'serie_bac_autre',
+            'filiere_souhaitee', 'filiere_souhaitee_display', 'filiere_autre',
+            'influenceur_details', 'remise_details',
+        ]
+        read_only_fields = fields
+
+
+class ProspectExportSerializer(serializers.ModelSerializer):
+    """
+    Colonnes des exports CSV/NDJSON (lecture rapide) : libellés à la place des codes
+    de choix, influenceur et remise aplatis.
+    """
+    statut = serializers.CharField(source='get_statut_display', read_only=True)
+    niveau_etude = serializers.CharField(source='get_niveau_etude_display', read_only=True)
+    serie_bac = serializers.CharField(source='get_serie_bac_display', read_only=True)
+    filiere_souhaitee = serializers.CharField(source='get_filiere_souhaitee_display', read_only=True)
+    influenceur_nom = serializers.CharField(source='influenceur.nom', read_only=True)
+    influenceur_code = serializers.CharField(source='influenceur.code_affiliation', read_only=True)
+    remise_montant = serializers.DecimalField(source='remise.montant', max_digits=10, decimal_places=2,
+                                              read_only=True, allow_null=True)
+
+    class Meta:
+        model = Prospect
+        fields = [
+            'id', 'nom', 'email', 'telephone', 'date_inscription', 'statut',
+            'niveau_etude', 'serie_bac', 'filiere_souhaitee',
+            'influenceur', 'influenceur_nom', 'influenceur_code', 'remise', 'remise_montant',
+        ]
+        read_only_fields = fields
@@ -1,3 +1,374 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+import json
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from influenceur.models import Influenceur, InfluenceurStats
+from remise.models import Remise
+from .models import Prospect, InscriptionEnAttente
 
-# Create your tests here.
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProspectPaginationTests(TestCase):
+    """
+    Tests de la pagination par curseur des listes de prospects
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.influenceur = Influenceur.create_influenceur(nom='Awa Traoré', email='awa@example.com', password='secret')
+        maintenant = timezone.now()
+        # Deux prospects par date pour vérifier le départage des ex aequo
+        for i in range(25):
+            Prospect.objects.create(
+                nom=f'Prospect {i}',
+                email=f'prospect{i}@example.com',
+                telephone=f'{i:08d}',
+                statut='confirme' if i % 2 else 'en_attente',
+                influenceur=self.influenceur,
+                date_inscription=maintenant - timedelta(hours=i // 2),
+            )
+
+    def parcourir(self, url, **params):
+        """Parcourt toutes les pages et retourne les ids dans l'ordre"""
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids.extend(p['id'] for p in data['results'])
+            if not data['next']:
+                return ids
+            response = self.client.get(data['next'])
+
+    def ids_attendus(self, **filtres):
+        return list(
+            Prospect.objects.filter(**filtres)
+            .order_by('-date_inscription', '-id').values_list('id', flat=True)
+        )
+
+    def test_parcours_complet_sans_doublon(self):
+        ids = self.parcourir(reverse('prospect_view'), page_size=7)
+        self.assertEqual(ids, self.ids_attendus())
+
+    def test_filtre_statut(self):
+        ids = self.parcourir(reverse('prospect_view'), statut='confirme', page_size=5)
+        self.assertEqual(ids, self.ids_attendus(statut='confirme'))
+
+    def test_prospects_influenceur(self):
+        url = reverse('influenceur_prospects', args=[self.influenceur.pk])
+        self.assertEqual(self.parcourir(url, page_size=10), self.ids_attendus())
+
+    def test_prospects_sans_remise(self):
+        ids = self.parcourir(reverse('prospects_sans_remise'), page_size=4)
+        self.assertEqual(ids, self.ids_attendus(statut='confirme', remise__isnull=True))
+
+    def test_taille_de_page_bornee(self):
+        response = self.client.get(reverse('prospect_view'), {'page_size': 1000})
+        self.assertEqual(len(response.json()['results']), 25)
+        response = self.client.get(reverse('prospect_view'))
+        self.assertEqual(len(response.json()['results']), 20)
+
+    def test_mode_compatibilite(self):
+        response = self.client.get(reverse('prospect_view'), {'pagination': 'false'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['id'] for p in response.json()], self.ids_attendus())
+
+    def test_page_profonde_sans_offset(self):
+        # Une page profonde coûte autant de requêtes que la première, sans OFFSET
+        url = reverse('prospect_view')
+        self.client.get(url, {'page_size': 5})  # utilisateur courant mis en cache
+        with CaptureQueriesContext(connection) as premiere:
+            page = self.client.get(url, {'page_size': 5})
+        nb_requetes = len(premiere)
+        for _ in range(3):
+            page = self.client.get(page.json()['next'])
+        with self.assertNumQueries(nb_requetes) as profonde:
+            self.client.get(page.json()['next'])
+        self.assertFalse(any('OFFSET' in q['sql'] for q in profonde.captured_queries))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProspectListeSerializerTests(TestCase):
+    """
+    Tests du serializer de liste des prospects (résumés, ?expand, requêtes)
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.influenceur = Influenceur.create_influenceur(nom='Awa Traoré', email='awa@example.com', password='secret')
+        self.remise = Remise.objects.create(influenceur=self.influenceur, montant=Decimal('20.00'))
+        for i in range(10):
+            Prospect.objects.create(
+                nom=f'Prospect {i}',
+                email=f'prospect{i}@example.com',
+                telephone=f'{i:08d}',
+                statut='confirme',
+                influenceur=self.influenceur,
+                remise=self.remise if i % 2 else None,
+                niveau_etude='bac',
+                serie_bac='autre',
+                serie_bac_autre='Série F',
+            )
+
+    def test_resumes_sans_details(self):
+        prospect = self.client.get(reverse('prospect_view')).json()['results'][0]
+        self.assertEqual(prospect['influenceur'], self.influenceur.pk)
+        self.assertEqual(prospect['influenceur_resume'], {
+            'id': self.influenceur.pk, 'nom': 'Awa Traoré', 'code_affiliation': self.influenceur.code_affiliation,
+        })
+        self.assertEqual(prospect['remise_resume'], {'id': self.remise.pk, 'montant': '20.00', 'statut': 'en_attente'})
+        self.assertNotIn('influenceur_details', prospect)
+        self.assertNotIn('remise_details', prospect)
+
+    def test_libelles(self):
+        prospect = self.client.get(reverse('prospect_view')).json()['results'][0]
+        self.assertEqual(prospect['statut_display'], 'Confirmé')
+        self.assertEqual(prospect['niveau_etude_display'], 'Baccalauréat')
+        # Texte libre saisi pour « autre »
+        self.assertEqual(prospect['serie_bac_display'], 'Série F')
+        self.assertIsNone(prospect['filiere_souhaitee_display'])
+
+    def test_expand(self):
+        prospect = self.client.get(reverse('prospect_view'), {'expand': 'influenceur,remise'}).json()['results'][0]
+        self.assertEqual(prospect['influenceur_details']['email'], 'awa@example.com')
+        self.assertNotIn('password', prospect['influenceur_details'])
+        self.assertEqual(prospect['remise_details']['montant'], '20.00')
+        self.assertEqual(prospect['remise_details']['influenceur_resume']['nom'], 'Awa Traoré')
+
+    def test_une_requete_par_page(self):
+        # Une requête pour la page, détails compris (influenceur connecté résolu une fois puis en cache)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('prospect_view'))
+        for params in ({}, {'expand': 'influenceur,remise'}, {'pagination': 'false'}):
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('prospect_view'), params)
+            self.assertEqual(response.status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], EXPORT_CHUNK_SIZE=3)
+class ProspectExportTests(TestCase):
+    """
+    Tests de l'export en flux des prospects (endpoint et commande)
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.awa = Influenceur.create_influenceur(nom='Awa Traoré', email='awa@example.com', password='secret')
+        self.moussa = Influenceur.create_influenceur(nom='Moussa Diarra', email='moussa@example.com', password='secret')
+        maintenant = timezone.now()
+        for i in range(8):
+            Prospect.objects.create(
+                nom=f'Prospect {i}',
+                email=f'prospect{i}@example.com',
+                telephone=f'{i:08d}',
+                statut='confirme' if i % 2 else 'en_attente',
+                influenceur=self.awa if i < 5 else self.moussa,
+                date_inscription=maintenant - timedelta(days=i),
+                filiere_souhaitee='autre',
+                filiere_autre='Médecine',
+            )
+
+    def lire_csv(self, response):
+        import csv
+        import io
+        self.assertTrue(response.streaming)
+        contenu = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.DictReader(io.StringIO(contenu)))
+
+    def test_csv(self):
+        response = self.client.get(reverse('prospects_export'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="prospects-', response['Content-Disposition'])
+        lignes = self.lire_csv(response)
+        self.assertEqual(len(lignes), 8)
+        self.assertEqual(lignes[0]['nom'], 'Prospect 0')
+        # Libellés à la place des codes
+        self.assertEqual(lignes[0]['statut'], 'En attente')
+        self.assertEqual(lignes[1]['statut'], 'Confirmé')
+        self.assertEqual(lignes[0]['filiere_souhaitee'], 'Médecine')
+        self.assertEqual(lignes[0]['influenceur_nom'], 'Awa Traoré')
+
+    def test_filtres(self):
+        aujourd_hui = timezone.localdate()
+        response = self.client.get(reverse('prospects_export'), {
+            'influenceur': self.awa.pk, 'statut': 'confirme',
+            'depuis': str(aujourd_hui - timedelta(days=3)), 'jusqu_au': str(aujourd_hui),
+        })
+        self.assertEqual([l['nom'] for l in self.lire_csv(response)], ['Prospect 1', 'Prospect 3'])
+
+    def test_ndjson(self):
+        import json
+        response = self.client.get(reverse('prospects_export'), HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lignes = [json.loads(l) for l in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual(len(lignes), 8)
+        self.assertEqual(lignes[0]['statut'], 'En attente')
+        self.assertIsNone(lignes[0]['remise_montant'])
+
+    def test_parametres_invalides(self):
+        self.assertEqual(self.client.get(reverse('prospects_export'), {'type': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('prospects_export'), {'depuis': '2024-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('prospects_export'), {'influenceur': 9999}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('prospect_view'), {'influenceur': 'abc'}).status_code, 400)
+
+    def test_commande(self):
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from io import StringIO
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, 'prospects.csv')
+            sortie = StringIO()
+            call_command('export_data', 'prospects', '--output', chemin, '--statut', 'confirme', stdout=sortie)
+            with open(chemin, encoding='utf-8', newline='') as fichier:
+                contenu = fichier.read()
+        self.assertIn('4 ligne(s) exportée(s)', sortie.getvalue())
+        response = self.client.get(reverse('prospects_export'), {'statut': 'confirme'})
+        self.assertEqual(contenu, b''.join(response.streaming_content).decode('utf-8'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AffiliationFormTests(TestCase):
+    """
+    Tests du formulaire d'affiliation : résolution du code en cache, doublons, mode file
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.influenceur = Influenceur.create_influenceur(nom='Awa Traoré', email='awa@example.com', password='secret')
+        self.url = reverse('affiliation_form', args=[self.influenceur.code_affiliation])
+
+    def soumettre(self, n, url=None, **champs):
+        donnees = {'nom': f'Prospect {n}', 'telephone': f'{n:08d}', 'email': f'p{n}@example.com',
+                   'filiere_souhaitee': 'ig', **champs}
+        return self.client.post(url or self.url, json.dumps(donnees), content_type='application/json')
+
+    def test_code_resolu_depuis_le_cache(self):
+        self.assertEqual(self.soumettre(1).status_code, 200)
+        # Code en cache : vérification des doublons, insertion et statistiques uniquement
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertEqual(self.soumettre(2).status_code, 200)
+        self.assertFalse([q for q in requetes.captured_queries if 'code_affiliation' in q['sql']])
+        self.assertEqual(Prospect.objects.filter(influenceur=self.influenceur).count(), 2)
+        self.assertEqual(InfluenceurStats.verifier(), [])
+
+    def test_desactivation_invalide_le_code(self):
+        self.assertEqual(self.soumettre(1).status_code, 200)
+        self.influenceur.is_active = False
+        self.influenceur.save()
+        self.assertEqual(self.soumettre(2).status_code, 404)
+        self.influenceur.is_active = True
+        self.influenceur.save()
+        self.assertEqual(self.soumettre(3).status_code, 200)
+
+    def test_code_inconnu(self):
+        url = reverse('affiliation_form', args=['inconnu1'])
+        self.assertEqual(self.soumettre(1, url=url).status_code, 404)
+        # Mis en cache négatif : plus de requête
+        with self.assertNumQueries(0):
+            self.assertEqual(self.soumettre(1, url=url).status_code, 404)
+
+    def test_doublon_409(self):
+        self.assertEqual(self.soumettre(1).status_code, 200)
+        response = self.soumettre(1, email='autre@example.com')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['champs'], ['telephone'])
+        response = self.soumettre(2, email='p1@example.com')
+        self.assertEqual(response.json()['champs'], ['email'])
+
+    def test_validation(self):
+        self.assertEqual(self.soumettre(1, nom='').status_code, 400)
+        self.assertEqual(self.soumettre(1, niveau_etude='bac').status_code, 400)
+        response = self.client.post(self.url, 'pas du json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, '[1, 2]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_plusieurs_inscriptions_sans_email(self):
+        self.assertEqual(self.soumettre(1, email='').status_code, 200)
+        self.assertEqual(self.soumettre(2, email=None).status_code, 200)
+        with override_settings(AFFILIATION_INTAKE_BUFFERED=True):
+            self.assertEqual(self.soumettre(3, email='').status_code, 202)
+            self.assertEqual(self.soumettre(4, email='').status_code, 202)
+        self.assertEqual(InscriptionEnAttente.importer()['importees'], 2)
+        self.assertEqual(Prospect.objects.filter(email__isnull=True).count(), 4)
+
+    def test_validation_des_colonnes(self):
+        for champs in (
+            {'nom': ['Awa']},
+            {'telephone': 12345678},
+            {'telephone': '123456789'},
+            {'nom': 'x' * 101},
+            {'email': 'pas-un-email'},
+            {'filiere_souhaitee': 'inconnue'},
+            {'niveau_etude': 'doctorat'},
+        ):
+            with self.subTest(champs=champs):
+                self.assertEqual(self.soumettre(1, **champs).status_code, 400)
+        self.assertFalse(Prospect.objects.exists())
+
+    def test_import_inscription_invalide(self):
+        # Inscriptions enregistrées sans contrôle (file antérieure) : le lot n'est pas interrompu
+        valide = {'nom': 'Valide', 'telephone': '00000001', 'email': '', 'filiere_souhaitee': 'ig'}
+        for donnees in (valide, {**valide, 'telephone': ['00000002']}, {**valide, 'telephone': '000000003'}, []):
+            InscriptionEnAttente.objects.create(influenceur=self.influenceur, donnees=donnees)
+        self.assertEqual(InscriptionEnAttente.importer(), {'importees': 1, 'conflits': 0, 'invalides': 3})
+        self.assertEqual(Prospect.objects.get().telephone, '00000001')
+        invalides = InscriptionEnAttente.objects.filter(statut='invalide')
+        self.assertTrue(all(i.erreur for i in invalides))
+        self.assertEqual(InfluenceurStats.verifier(), [])
+
+    @override_settings(AFFILIATION_INTAKE_BUFFERED=True)
+    def test_mode_file(self):
+        Prospect.objects.create(nom='Existant', telephone='00000009', email='existant@example.com', influenceur=self.influenceur)
+        reponses = [self.soumettre(n) for n in (1, 2, 3)]
+        # Doublon d'une inscription encore en file : détecté à l'import
+        reponses.append(self.soumettre(4, telephone='00000001'))
+        self.assertEqual({r.status_code for r in reponses}, {202})
+        self.assertEqual(Prospect.objects.count(), 1)
+
+        self.assertEqual(InscriptionEnAttente.importer(taille_lot=10), {'importees': 3, 'conflits': 1, 'invalides': 0})
+        self.assertEqual(Prospect.objects.count(), 4)
+        self.assertEqual(InfluenceurStats.verifier(), [])
+
+        suivi = self.client.get(reponses[0].json()['suivi']).json()
+        self.assertEqual(suivi['statut'], 'importee')
+        self.assertEqual(suivi['prospect_id'], Prospect.objects.get(telephone='00000001').pk)
+        conflit = self.client.get(reponses[3].json()['suivi']).json()
+        self.assertEqual((conflit['statut'], conflit['erreur']), ('conflit', 'Déjà inscrit (telephone)'))
+
+    def test_import_conflit_concurrent(self):
+        inscription = InscriptionEnAttente.objects.create(influenceur=self.influenceur, donnees={
+            'nom': 'Tardif', 'telephone': '00000005', 'email': '', 'niveau_etude': None, 'niveau_etude_autre': None,
+            'serie_bac': None, 'serie_bac_autre': None, 'filiere_souhaitee': 'ig', 'filiere_autre': None,
+        })
+        # Prospect créé entre la détection des doublons et l'insertion
+        creer = Prospect.objects.bulk_create
+
+        def creer_apres_doublon(prospects, *args, **kwargs):
+            if not Prospect.objects.filter(telephone='00000005').exists():
+                creer([Prospect(nom='Direct', telephone='00000005', email='d@example.com', influenceur=self.influenceur)])
+            return creer(prospects, *args, **kwargs)
+
+        with mock.patch.object(Prospect.objects, 'bulk_create', side_effect=creer_apres_doublon):
+            self.assertEqual(InscriptionEnAttente.importer(), {'importees': 0, 'conflits': 1, 'invalides': 0})
+        inscription.refresh_from_db()
+        self.assertEqual(inscription.statut, 'conflit')
@@ -1,12 +1,14 @@
 from django.urls import path
-from .views import prospect_view, prospect_detail_view, prospect_valider_view, prospect_rejeter_view, prospects_sans_remise_view, prospects_statistiques_view, affiliation_form_view
+from .views import prospect_view, prospect_detail_view, prospect_valider_view, prospect_rejeter_view, prospects_sans_remise_view, prospects_statistiques_view, affiliation_form_view, prospects_export_view, affiliation_inscription_view
 
 urlpatterns = [
     path('prospects/', prospect_view, name='prospect_view'),  # GET (liste)
+    path('prospects/export/', prospects_export_view, name='prospects_export'),  # GET (CSV/NDJSON en flux)
     path('prospects/<int:pk>/', prospect_detail_view, name='prospect_detail'),  # GET
     path('prospects/<int:pk>/valider/', prospect_valider_view, name='prospect_valider'),
     path('prospects/<int:pk>/rejeter/', prospect_rejeter_view, name='prospect_rejeter'),
     path('prospects/sans-remise/', prospects_sans_remise_view, name='prospects_sans_remise'),
     path('prospects/statistiques/', prospects_statistiques_view, name='prospects_statistiques'),
+    path('affiliation/inscriptions/<uuid:jeton>/', affiliation_inscription_view, name='affiliation_inscription'),  # GET (suivi)
     path('affiliation/<str:code_affiliation>/', affiliation_form_view, name='affiliation_form'),
 ]
\ No newline at end of file
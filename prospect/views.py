@@ -1,20 +1,53 @@
 from django.shortcuts import get_object_or_404
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
-from .models import Prospect
-from .serializers import ProspectSerializers
-from influenceur.models import Influenceur
+from .models import Prospect, InscriptionEnAttente
+from .inscriptions import lire_inscription, champs_en_double, InscriptionInvalide
+from .serializers import ProspectSerializers, ProspectListeSerializer, ProspectExportSerializer
+from influenceur.models import Influenceur, InfluenceurStats, calculer_taux_conversion
 from influenceur.permissions import CanValidateProspects, IsInfluenceurOrAdmin
-from influenceur.auth import get_influenceur_from_user
+from influenceur.auth import get_influenceur_from_request
+from influenceur import cache, export
+from influenceur.filtres import lire_filtres, appliquer_filtres, FiltreInvalide
+from influenceur.pagination import reponse_paginee, ProspectCursorPagination
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import IntegrityError
+from django.urls import reverse
+from django.forms.models import model_to_dict
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
 
+def _prospects_filtres(request):
+    """
+    Prospects visibles par l'utilisateur, filtrés selon les paramètres GET
+    (communs à la liste et à l'export). Retourne (queryset, None) ou (None, réponse d'erreur).
+    """
+    try:
+        filtres = lire_filtres(request.GET, dict(Prospect.STATUT_CHOICES))
+    except FiltreInvalide as e:
+        return None, Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Filtrer par influenceur si ce n'est pas un admin
+    current_influenceur = get_influenceur_from_request(request)
+    if not request.user.is_superuser and current_influenceur:
+        # Influenceur connecté: voir seulement ses prospects
+        prospects = Prospect.objects.filter(influenceur=current_influenceur)
+        filtres['influenceur'] = None
+    else:
+        # Admin: voir tous les prospects, filtre par influenceur si spécifié
+        prospects = Prospect.objects.all()
+        if filtres['influenceur'] and not Influenceur.objects.filter(pk=filtres['influenceur']).exists():
+            return None, Response({
+                'error': 'Influenceur non trouvé'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+    return appliquer_filtres(prospects, filtres, 'date_inscription'), None
+
 @api_view(['GET'])
 @permission_classes([IsInfluenceurOrAdmin])
 def prospect_view(request):
@@ -23,38 +56,33 @@ def prospect_view(request):
     Seuls les influenceurs connectés et admins peuvent accéder.
     Support du filtre par influenceur: ?influenceur={id}
     Support du filtre par statut: ?statut={en_attente|confirme|rejeter}
+    Support du filtre par date d'inscription: ?depuis=AAAA-MM-JJ&jusqu_au=AAAA-MM-JJ
+    Pagination par curseur (?cursor=...&page_size=...), ?pagination=false pour la liste complète.
     """
     if request.method == 'GET':
-        # Récupérer les filtres depuis les paramètres GET
-        influenceur_id = request.GET.get('influenceur')
-        statut = request.GET.get('statut')
-        
-        # Filtrer par influenceur si ce n'est pas un admin
-        current_influenceur = get_influenceur_from_user(request.user)
-        
-        if not request.user.is_superuser and current_influenceur:
-            # Influenceur connecté: voir seulement ses prospects
-            prospects = Prospect.objects.filter(influenceur=current_influenceur)
-        else:
-            # Admin: voir tous les prospects
-            prospects = Prospect.objects.all()
-            
-            # Appliquer le filtre par influenceur si spécifié
-            if influenceur_id:
-                try:
-                    influenceur = Influenceur.objects.get(id=influenceur_id)
-                    prospects = prospects.filter(influenceur=influenceur)
-                except Influenceur.DoesNotExist:
-                    return Response({
-                        'error': 'Influenceur non trouvé'
-                    }, status=status.HTTP_404_NOT_FOUND)
-        
-        # Appliquer le filtre par statut si spécifié
-        if statut and statut in ['en_attente', 'confirme', 'rejeter']:
-            prospects = prospects.filter(statut=statut)
-            
-        serializer = ProspectSerializers(prospects, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        prospects, erreur = _prospects_filtres(request)
+        if erreur:
+            return erreur
+        return reponse_paginee(request, prospects, ProspectListeSerializer, ProspectCursorPagination)
+
+@api_view(['GET'])
+@renderer_classes(export.RENDERERS)
+@permission_classes([IsInfluenceurOrAdmin])
+def prospects_export_view(request):
+    """
+    Vue API d'export des prospects en flux (GET), au format ?type={csv|ndjson}
+    (ou négocié par l'en-tête Accept, csv par défaut).
+    Mêmes filtres et mêmes droits que la liste ; les codes de choix sont remplacés par leurs libellés.
+    """
+    format_export = export.format_demande(request)
+    if format_export not in export.FORMATS:
+        return Response({'error': 'Type d\'export invalide (csv ou ndjson)'}, status=status.HTTP_400_BAD_REQUEST)
+
+    prospects, erreur = _prospects_filtres(request)
+    if erreur:
+        return erreur
+    prospects = prospects.order_by('-date_inscription', '-id')
+    return export.reponse_export(ProspectExportSerializer, prospects, format_export, 'prospects')
 
 @api_view(['GET'])
 @permission_classes([IsInfluenceurOrAdmin])
@@ -65,7 +93,7 @@ def prospect_detail_view(request, pk):
     prospect = get_object_or_404(Prospect, pk=pk)
     
     # Vérifier les permissions
-    current_influenceur = get_influenceur_from_user(request.user)
+    current_influenceur = get_influenceur_from_request(request)
     if not request.user.is_superuser and current_influenceur and prospect.influenceur != current_influenceur:
         return Response({'error': 'Accès non autorisé'}, status=status.HTTP_403_FORBIDDEN)
     
@@ -84,7 +112,7 @@ def prospect_valider_view(request, pk):
     prospect = get_object_or_404(Prospect, pk=pk)
     
     # Vérifier les permissions pour ce prospect spécifique
-    current_influenceur = get_influenceur_from_user(request.user)
+    current_influenceur = get_influenceur_from_request(request)
     if not request.user.is_superuser and current_influenceur and prospect.influenceur != current_influenceur:
         return Response({'error': 'Accès non autorisé'}, status=status.HTTP_403_FORBIDDEN)
     
@@ -105,7 +133,7 @@ def prospect_rejeter_view(request, pk):
     prospect = get_object_or_404(Prospect, pk=pk)
     
     # Vérifier les permissions pour ce prospect spécifique
-    current_influenceur = get_influenceur_from_user(request.user)
+    current_influenceur = get_influenceur_from_request(request)
     if not request.user.is_superuser and current_influenceur and prospect.influenceur != current_influenceur:
         return Response({'error': 'Accès non autorisé'}, status=status.HTTP_403_FORBIDDEN)
     
@@ -122,8 +150,9 @@ def prospects_sans_remise_view(request):
     """
     Vue API pour lister tous les prospects confirmés sans remise associée.
     Seuls les admins peuvent voir tous les prospects confirmés sans remise.
+    Pagination par curseur (?cursor=...&page_size=...), ?pagination=false pour la liste complète.
     """
-    current_influenceur = get_influenceur_from_user(request.user)
+    current_influenceur = get_influenceur_from_request(request)
     if not request.user.is_superuser and current_influenceur:
         prospects = Prospect.objects.filter(
             remise__isnull=True, 
@@ -136,8 +165,7 @@ def prospects_sans_remise_view(request):
             statut='confirme'  # Seulement les prospects confirmés
         )
         
-    serializer = ProspectSerializers(prospects, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return reponse_paginee(request, prospects, ProspectListeSerializer, ProspectCursorPagination)
 
 @api_view(['GET'])
 @permission_classes([IsInfluenceurOrAdmin])
@@ -145,30 +173,29 @@ def prospects_statistiques_view(request):
     """
     Vue API pour obtenir les statistiques des prospects par statut.
     """
-    current_influenceur = get_influenceur_from_user(request.user)
+    current_influenceur = get_influenceur_from_request(request)
     
-    if not request.user.is_superuser and current_influenceur:
-        # Influenceur connecté: voir seulement ses prospects
-        prospects = Prospect.objects.filter(influenceur=current_influenceur)
-    else:
-        # Admin: voir tous les prospects
-        prospects = Prospect.objects.all()
-    
-    # Statistiques par statut
-    stats = {
-        'total': prospects.count(),
-        'en_attente': prospects.filter(statut='en_attente').count(),
-        'confirme': prospects.filter(statut='confirme').count(),
-        'rejeter': prospects.filter(statut='rejeter').count(),
-    }
+    # Influenceur connecté: ses statistiques, admin: celles de tous les influenceurs
+    influenceur_id = current_influenceur.id if not request.user.is_superuser and current_influenceur else None
     
-    # Calculer le taux de conversion (confirmés / (confirmés + rejetés))
-    prospects_traites = stats['confirme'] + stats['rejeter']
-    if prospects_traites > 0:
-        stats['taux_conversion'] = round((stats['confirme'] / prospects_traites) * 100, 2)
-    else:
-        stats['taux_conversion'] = 0
+    def calculer():
+        if influenceur_id:
+            # Une seule ligne de statistiques
+            compteurs = model_to_dict(InfluenceurStats.pour(current_influenceur))
+        else:
+            # Somme des statistiques de tous les influenceurs
+            compteurs = InfluenceurStats.totaux()
+        
+        # Statistiques par statut
+        return {
+            'total': compteurs['nb_prospects'],
+            'en_attente': compteurs['nb_prospects_en_attente'],
+            'confirme': compteurs['nb_prospects_confirmes'],
+            'rejeter': compteurs['nb_prospects_rejetes'],
+            'taux_conversion': calculer_taux_conversion(compteurs['nb_prospects_confirmes'], compteurs['nb_prospects_rejetes']),
+        }
     
+    stats = cache.obtenir('statistiques_prospects', influenceur_id, calculer)
     return Response(stats, status=status.HTTP_200_OK)
 
 @csrf_exempt
@@ -177,67 +204,60 @@ def affiliation_form_view(request, code_affiliation):
     """
     Vue pour traiter les soumissions.
     Cette vue est publique (pas d'authentification requise).
+    Le code d'affiliation est résolu depuis le cache (voir influenceur/cache.py) et les
+    doublons (téléphone, email) sont refusés avec un 409 avant toute écriture.
+    Avec AFFILIATION_INTAKE_BUFFERED=True, la soumission est mise en file (202) et importée
+    par lots par la commande flush_affiliation_queue.
     """
-    try:
-        influenceur = Influenceur.objects.get(code_affiliation=code_affiliation, is_active=True)
-    except Influenceur.DoesNotExist:
+    influenceur_id = cache.influenceur_pour_code(code_affiliation)
+    if influenceur_id is None:
         return HttpResponse('<h1>Code d\'affiliation invalide</h1>', status=404)
-    
-    if request.method == 'POST':
-        try:
-            data = json.loads(request.body)
-            nom = data.get('nom')
-            telephone = data.get('telephone')
-            email = data.get('email')
-            
-            # Nouveaux champs éducatifs
-            niveau_etude = data.get('niveau_etude')
-            niveau_etude_autre = data.get('niveau_etude_autre')
-            serie_bac = data.get('serie_bac')
-            serie_bac_autre = data.get('serie_bac_autre')
-            filiere_souhaitee = data.get('filiere_souhaitee')
-            filiere_autre = data.get('filiere_autre')
-
-            if not nom or not telephone:
-                return JsonResponse({'error': 'Nom et Téléphone requis'}, status=400)
-            
-            # Validation des champs conditionnels
-            if niveau_etude == 'autre' and not niveau_etude_autre:
-                return JsonResponse({'error': 'Veuillez préciser votre niveau d\'étude'}, status=400)
-            
-            if niveau_etude == 'bac':
-                if not serie_bac:
-                    return JsonResponse({'error': 'Veuillez sélectionner votre série du bac'}, status=400)
-                if serie_bac == 'autre' and not serie_bac_autre:
-                    return JsonResponse({'error': 'Veuillez préciser votre série du bac'}, status=400)
-            
-            if not filiere_souhaitee:
-                return JsonResponse({'error': 'Veuillez sélectionner une filière souhaitée'}, status=400)
-            if filiere_souhaitee == 'autre' and not filiere_autre:
-                return JsonResponse({'error': 'Veuillez préciser votre filière souhaitée'}, status=400)
-            
-            # Créer le prospect avec les nouveaux champs
-            prospect = Prospect.objects.create(
-                nom=nom,
-                telephone=telephone,
-                email=email,
-                influenceur=influenceur,
-                niveau_etude=niveau_etude,
-                niveau_etude_autre=niveau_etude_autre,
-                serie_bac=serie_bac,
-                serie_bac_autre=serie_bac_autre,
-                filiere_souhaitee=filiere_souhaitee,
-                filiere_autre=filiere_autre
-            )
-            
-            return JsonResponse({
-                'success': True,
-                'message': 'Inscription réussie !',
-                'prospect_id': prospect.id
-            })
-            
-        except json.JSONDecodeError:
-            return JsonResponse({'error': 'Données JSON invalides'}, status=400)
-        except Exception as e:
-            return JsonResponse({'error': str(e)}, status=500)
-    
+
+    try:
+        champs = lire_inscription(json.loads(request.body))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'error': 'Données JSON invalides'}, status=400)
+    except InscriptionInvalide as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    doublons = champs_en_double(champs['telephone'], champs['email'])
+    if doublons:
+        return JsonResponse({'error': 'Vous êtes déjà inscrit', 'champs': doublons}, status=409)
+
+    if getattr(settings, 'AFFILIATION_INTAKE_BUFFERED', False):
+        inscription = InscriptionEnAttente.objects.create(influenceur_id=influenceur_id, donnees=champs)
+        return JsonResponse({
+            'success': True,
+            'message': 'Inscription reçue !',
+            'inscription': str(inscription.jeton),
+            'suivi': reverse('affiliation_inscription', args=[inscription.jeton]),
+        }, status=202)
+
+    try:
+        # Créer le prospect avec les nouveaux champs
+        prospect = Prospect.objects.create(influenceur_id=influenceur_id, **champs)
+    except IntegrityError:
+        # Doublon enregistré entre la vérification et la création
+        return JsonResponse({'error': 'Vous êtes déjà inscrit'}, status=409)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'message': 'Inscription réussie !',
+        'prospect_id': prospect.id
+    })
+
+
+@require_http_methods(["GET"])
+def affiliation_inscription_view(request, jeton):
+    """
+    Vue publique de suivi d'une inscription mise en file : statut de l'import
+    (en_attente, importee, conflit, invalide), prospect créé ou motif du refus.
+    """
+    inscription = get_object_or_404(InscriptionEnAttente, jeton=jeton)
+    return JsonResponse({
+        'statut': inscription.statut,
+        'prospect_id': inscription.prospect_id,
+        'erreur': inscription.erreur,
+    })
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('remise', '0002_remise_date_creation_remise_date_paiement_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='remise',
+            index=models.Index(fields=['-date_creation', '-id'], name='remise_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='remise',
+            index=models.Index(fields=['influenceur', '-date_creation', '-id'], name='remise_infl_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('remise', '0003_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='remise',
+            index=models.Index(fields=['influenceur', 'statut', '-date_creation', '-id'], name='remise_infl_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='remise',
+            index=models.Index(fields=['statut', '-date_creation', '-id'], name='remise_statut_date_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('remise', '0004_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalculRemises',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('termine', 'Terminé'), ('echec', 'Echec')], default='en_attente', max_length=20)),
+                ('montant_par_prospect', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('demande_par', models.CharField(blank=True, max_length=150)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_debut', models.DateTimeField(blank=True, null=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True)),
+                ('nb_influenceurs_total', models.PositiveIntegerField(default=0)),
+                ('nb_influenceurs_traites', models.PositiveIntegerField(default=0)),
+                ('nb_remises', models.PositiveIntegerField(default=0)),
+                ('montant_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('erreurs', models.JSONField(blank=True, default=list)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['statut', 'date_creation'], name='calcul_remises_statut_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='remise',
+            name='calcul',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='remises', to='remise.calculremises'),
+        ),
+    ]
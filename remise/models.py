@@ -1,14 +1,33 @@
-from django.db import models
-from influenceur.models import Influenceur
-from django.db.models import Sum
+from django.db import models, transaction
+from django.utils import timezone
+from influenceur.models import Influenceur, InfluenceurStats, SuiviModificationsMixin
+from influenceur import cache
+from django.db.models import Case, Count, Value, When
+from datetime import timedelta
 from decimal import Decimal
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ConflitCalculRemises(Exception):
+    """Les prospects à rémunérer ont changé pendant le calcul des remises (rien n'est créé)"""
+
 
 # Create your models here.
-class Remise(models.Model):
+class Remise(SuiviModificationsMixin, models.Model):
     STATUT_CHOICES = [
         ('en_attente', 'En attente'),
         ('payee', 'Payée')
     ]
+
+    # Champs dont les changements sont répercutés sur InfluenceurStats
+    champs_suivis = ('statut', 'montant', 'influenceur_id')
+    verrouiller_transitions = True
+
+    # Nombre d'influenceurs traités par requête lors du calcul des remises en masse
+    TAILLE_LOT = 500
+
     montant = models.DecimalField(max_digits=10, decimal_places=2)
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
     influenceur = models.ForeignKey(Influenceur, on_delete=models.CASCADE, related_name='remises')
@@ -16,6 +35,17 @@ class Remise(models.Model):
     date_creation = models.DateTimeField(auto_now_add=True)
     date_paiement = models.DateTimeField(null=True, blank=True)
     description = models.TextField(blank=True, help_text="Description de la remise (ex: commission pour 5 prospects)")
+    calcul = models.ForeignKey('CalculRemises', on_delete=models.SET_NULL, null=True, blank=True, related_name='remises')
+
+    class Meta:
+        indexes = [
+            # Pagination par curseur et périodes de création (globale et par influenceur)
+            models.Index(fields=['-date_creation', '-id'], name='remise_date_id_idx'),
+            models.Index(fields=['influenceur', '-date_creation', '-id'], name='remise_infl_date_id_idx'),
+            # Filtres par statut (par influenceur ou global), dans l'ordre des listes
+            models.Index(fields=['influenceur', 'statut', '-date_creation', '-id'], name='remise_infl_statut_idx'),
+            models.Index(fields=['statut', '-date_creation', '-id'], name='remise_statut_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.influenceur.nom} - {self.montant} F CFA - {self.statut}"
@@ -34,33 +64,8 @@ class Remise(models.Model):
         basée sur ses prospects confirmés sans remise
         Le montant est exprimé en F CFA.
         """
-        from prospect.models import Prospect
-        
-        # Prendre seulement les prospects confirmés sans remise
-        prospects_a_remunerer = Prospect.objects.filter(
-            influenceur=influenceur,
-            statut='confirme',  # Seulement les prospects confirmés
-            remise__isnull=True
-        )
-        
-        nb_prospects = prospects_a_remunerer.count()
-        
-        if nb_prospects > 0:
-            montant_total = nb_prospects * montant_par_prospect
-            
-            # Créer la remise
-            remise = cls.objects.create(
-                influenceur=influenceur,
-                montant=montant_total,
-                description=f"Commission pour {nb_prospects} prospect(s) confirmé(s) à {montant_par_prospect} F CFA chacun"
-            )
-            
-            # Associer la remise aux prospects
-            prospects_a_remunerer.update(remise=remise)
-            
-            return remise
-        
-        return None
+        remises = cls._generer_remises(montant_par_prospect, influenceur_ids=[influenceur.pk])
+        return remises[0] if remises else None
 
     @classmethod
     def generer_remises_pour_tous(cls, montant_par_prospect=Decimal('10.00')):
@@ -68,16 +73,202 @@ class Remise(models.Model):
         Génère automatiquement des remises pour tous les influenceurs
         ayant des prospects confirmés sans remise
         """
-        influenceurs_avec_prospects = Influenceur.objects.filter(
-            prospects__statut='confirme',  # Seulement les prospects confirmés
-            prospects__remise__isnull=True
-        ).distinct()
-        
-        remises_creees = []
-        for influenceur in influenceurs_avec_prospects:
-            remise = cls.calculer_remise_automatique(influenceur, montant_par_prospect)
-            if remise:
-                remises_creees.append(remise)
-        
-        return remises_creees
+        return cls._generer_remises(montant_par_prospect)
+
+    @classmethod
+    def _generer_remises(cls, montant_par_prospect, influenceur_ids=None, calcul=None):
+        """
+        Crée une remise par influenceur ayant des prospects confirmés sans remise, en
+        quelques requêtes quel que soit le nombre d'influenceurs : un comptage groupé, un
+        bulk_create, une affectation des prospects et une mise à jour des statistiques par
+        lot de TAILLE_LOT influenceurs.
+        Le tout est atomique. Les influenceurs concernés sont verrouillés (SELECT ... FOR UPDATE,
+        dans un ordre fixe) : un calcul concurrent attend la fin de celui-ci et ne retrouve
+        alors plus ces prospects sans remise. Si l'affectation ne porte pas exactement sur
+        les prospects comptés, la transaction est annulée (ConflitCalculRemises).
+        Les remises créées sont rattachées au `calcul` (CalculRemises) qui les a demandées.
+        """
+        from prospect.models import Prospect
+
+        a_remunerer = Prospect.objects.filter(statut='confirme', remise__isnull=True)
+        if influenceur_ids is not None:
+            a_remunerer = a_remunerer.filter(influenceur_id__in=influenceur_ids)
+
+        with transaction.atomic():
+            list(
+                Influenceur.objects.select_for_update()
+                .filter(pk__in=a_remunerer.values('influenceur_id'))
+                .order_by('pk').values_list('pk', flat=True)
+            )
+            comptes = dict(
+                a_remunerer.order_by().values('influenceur_id').annotate(nb=Count('id'))
+                .values_list('influenceur_id', 'nb')
+            )
+            if not comptes:
+                return []
+
+            remises = cls.objects.bulk_create([
+                cls(
+                    influenceur_id=influenceur_id,
+                    calcul=calcul,
+                    montant=nb * montant_par_prospect,
+                    description=f"Commission pour {nb} prospect(s) confirmé(s) à {montant_par_prospect} F CFA chacun"
+                )
+                for influenceur_id, nb in sorted(comptes.items())
+            ], batch_size=cls.TAILLE_LOT)
+
+            # Affectation des prospects : une requête UPDATE (CASE par influenceur) par lot
+            nb_affectes = 0
+            for debut in range(0, len(remises), cls.TAILLE_LOT):
+                lot = remises[debut:debut + cls.TAILLE_LOT]
+                nb_affectes += a_remunerer.filter(influenceur_id__in=[r.influenceur_id for r in lot]).update(
+                    remise_id=Case(
+                        *[When(influenceur_id=r.influenceur_id, then=Value(r.pk)) for r in lot],
+                        output_field=models.IntegerField(),
+                    )
+                )
+            if nb_affectes != sum(comptes.values()):
+                raise ConflitCalculRemises(
+                    f'{nb_affectes} prospect(s) affecté(s) pour {sum(comptes.values())} compté(s)'
+                )
+
+            # bulk_create ne déclenche pas les signaux : statistiques et cache mis à jour ici
+            champ_nb, champ_montant = InfluenceurStats.CHAMPS_REMISES['en_attente']
+            InfluenceurStats.appliquer_en_masse({
+                r.influenceur_id: {'nb_remises': 1, champ_nb: 1, champ_montant: r.montant} for r in remises
+            })
+            for remise in remises:
+                remise.memoriser_etat()
+            cache.invalider(*comptes)
+
+        return remises
+
+
+class CalculRemises(models.Model):
+    """
+    Calcul des remises en arrière-plan : la demande est enregistrée par l'API puis
+    exécutée par le worker (commande run_commission_worker), par lots d'influenceurs.
+    La progression, les compteurs et les erreurs sont consultables pendant le calcul.
+    """
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('termine', 'Terminé'),
+        ('echec', 'Echec'),
+    ]
+
+    # Nombre maximum de tentatives d'un lot en conflit (prospects modifiés pendant le calcul)
+    TENTATIVES_PAR_LOT = 3
+
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    montant_par_prospect = models.DecimalField(max_digits=10, decimal_places=2)
+    demande_par = models.CharField(max_length=150, blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_debut = models.DateTimeField(null=True, blank=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+    date_mise_a_jour = models.DateTimeField(auto_now=True)
+    nb_influenceurs_total = models.PositiveIntegerField(default=0)
+    nb_influenceurs_traites = models.PositiveIntegerField(default=0)
+    nb_remises = models.PositiveIntegerField(default=0)
+    montant_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    erreurs = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['statut', 'date_creation'], name='calcul_remises_statut_idx'),
+        ]
+
+    def __str__(self):
+        return f"Calcul de remises #{self.pk} - {self.statut}"
+
+    @property
+    def progression(self):
+        """Pourcentage d'influenceurs traités"""
+        if self.statut == 'termine':
+            return 100
+        if not self.nb_influenceurs_total:
+            return 0
+        return round(self.nb_influenceurs_traites * 100 / self.nb_influenceurs_total, 2)
+
+    @classmethod
+    def demander(cls, montant_par_prospect, demande_par=''):
+        """Enregistre une demande de calcul, exécutée ensuite par le worker"""
+        return cls.objects.create(montant_par_prospect=montant_par_prospect, demande_par=demande_par)
+
+    @classmethod
+    def prendre_suivant(cls, delai_reprise=timedelta(minutes=10)):
+        """
+        Réserve le prochain calcul à exécuter (le plus ancien en attente), ou un calcul
+        en cours sans progression depuis `delai_reprise` (worker arrêté). La reprise est sans
+        risque : seuls les prospects encore sans remise sont rémunérés.
+        """
+        limite = timezone.now() - delai_reprise
+        return cls._reserver(
+            cls.objects.filter(models.Q(statut='en_attente') | models.Q(statut='en_cours', date_mise_a_jour__lt=limite))
+            .order_by('date_creation', 'pk')
+        )
+
+    @classmethod
+    def reserver(cls, pk):
+        """
+        Réserve le calcul `pk` s'il est encore en attente (exécution synchrone) ;
+        None s'il a déjà été pris par un worker.
+        """
+        return cls._reserver(cls.objects.filter(pk=pk, statut='en_attente'))
+
+    @classmethod
+    def _reserver(cls, queryset):
+        with transaction.atomic():
+            calcul = queryset.select_for_update(skip_locked=True).first()
+            if calcul is None:
+                return None
+            calcul.statut = 'en_cours'
+            calcul.date_debut = calcul.date_debut or timezone.now()
+            calcul.save(update_fields=['statut', 'date_debut', 'date_mise_a_jour'])
+        return calcul
+
+    def executer(self, taille_lot=None):
+        """
+        Exécute le calcul par lots de `taille_lot` influenceurs, chaque lot dans sa propre
+        transaction (Remise._generer_remises). La progression est enregistrée après chaque lot ;
+        l'échec d'un lot est consigné dans `erreurs` sans interrompre les suivants.
+        """
+        from prospect.models import Prospect
+
+        taille_lot = taille_lot or Remise.TAILLE_LOT
+        influenceur_ids = list(
+            Prospect.objects.filter(statut='confirme', remise__isnull=True)
+            .order_by('influenceur_id').values_list('influenceur_id', flat=True).distinct()
+        )
+        self.nb_influenceurs_total = self.nb_influenceurs_traites + len(influenceur_ids)
+        self.save(update_fields=['nb_influenceurs_total', 'date_mise_a_jour'])
+
+        nb_lots_en_echec = 0
+        for debut in range(0, len(influenceur_ids), taille_lot):
+            lot = influenceur_ids[debut:debut + taille_lot]
+            try:
+                remises = self._executer_lot(lot)
+            except Exception as e:
+                nb_lots_en_echec += 1
+                logger.exception(f"Calcul de remises #{self.pk} : échec du lot {lot[0]}-{lot[-1]}")
+                self.erreurs.append({'influenceurs': [lot[0], lot[-1]], 'erreur': str(e)})
+            else:
+                self.nb_remises += len(remises)
+                self.montant_total += sum((r.montant for r in remises), Decimal('0'))
+            self.nb_influenceurs_traites += len(lot)
+            self.save(update_fields=[
+                'nb_influenceurs_traites', 'nb_remises', 'montant_total', 'erreurs', 'date_mise_a_jour'
+            ])
+
+        nb_lots = -(-len(influenceur_ids) // taille_lot)
+        self.statut = 'echec' if nb_lots and nb_lots_en_echec == nb_lots else 'termine'
+        self.date_fin = timezone.now()
+        self.save(update_fields=['statut', 'date_fin', 'date_mise_a_jour'])
 
+    def _executer_lot(self, influenceur_ids):
+        for tentative in range(1, self.TENTATIVES_PAR_LOT + 1):
+            try:
+                return Remise._generer_remises(self.montant_par_prospect, influenceur_ids=influenceur_ids, calcul=self)
+            except ConflitCalculRemises:
+                if tentative == self.TENTATIVES_PAR_LOT:
+                    raise
@@ -1,6 +1,6 @@
 from rest_framework import serializers
-from .models import Remise
-from influenceur.serializers import InfluenceurSerializer
+from .models import Remise, CalculRemises
+from influenceur.serializers import InfluenceurSerializer, InfluenceurResumeSerializer, DepliableMixin
 from influenceur.models import Influenceur
 
 
@@ -15,3 +15,59 @@ class RemiseSerializers(serializers.ModelSerializer) :
     class Meta :
         model = Remise
         fields = '__all__'
+
+
+class RemiseListeSerializer(DepliableMixin, serializers.ModelSerializer):
+    """
+    Serializer de liste (lecture seule) : l'influenceur est représenté par son id et un
+    résumé chargé par jointure, le détail complet n'est inclus qu'avec ?expand=influenceur.
+    """
+    # Listes servies depuis .values() (influenceur/lecture_rapide.py)
+    lecture_rapide = True
+    # Jointures nécessaires pour sérialiser une page en une seule requête
+    select_related = ('influenceur',)
+    champs_depliables = {'influenceur': 'influenceur_details'}
+
+    statut_display = serializers.CharField(source='get_statut_display', read_only=True)
+    influenceur_resume = InfluenceurResumeSerializer(source='influenceur', read_only=True)
+    influenceur_details = InfluenceurSerializer(source='influenceur', read_only=True)
+
+    class Meta:
+        model = Remise
+        fields = [
+            'id', 'montant', 'statut', 'statut_display', 'influenceur', 'influenceur_resume',
+            'justificatif', 'date_creation', 'date_paiement', 'description', 'influenceur_details',
+        ]
+        read_only_fields = fields
+
+
+class RemiseExportSerializer(serializers.ModelSerializer):
+    """
+    Colonnes des exports CSV/NDJSON (lecture rapide) : libellé du statut, influenceur aplati.
+    """
+    statut = serializers.CharField(source='get_statut_display', read_only=True)
+    influenceur_nom = serializers.CharField(source='influenceur.nom', read_only=True)
+    influenceur_code = serializers.CharField(source='influenceur.code_affiliation', read_only=True)
+
+    class Meta:
+        model = Remise
+        fields = [
+            'id', 'date_creation', 'montant', 'statut', 'date_paiement',
+            'influenceur', 'influenceur_nom', 'influenceur_code', 'description', 'justificatif',
+        ]
+        read_only_fields = fields
+
+
+class CalculRemisesSerializer(serializers.ModelSerializer):
+    """Etat d'un calcul de remises en arrière-plan (suivi de progression)"""
+    statut_display = serializers.CharField(source='get_statut_display', read_only=True)
+    progression = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = CalculRemises
+        fields = [
+            'id', 'statut', 'statut_display', 'progression', 'montant_par_prospect', 'demande_par',
+            'nb_influenceurs_total', 'nb_influenceurs_traites', 'nb_remises', 'montant_total',
+            'erreurs', 'date_creation', 'date_debut', 'date_fin', 'date_mise_a_jour',
+        ]
+        read_only_fields = fields
@@ -1,3 +1,291 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from influenceur.models import Influenceur, InfluenceurStats
+from prospect.models import Prospect
+from .models import Remise, ConflitCalculRemises, CalculRemises
 
-# Create your tests here.
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RemisePaginationTests(TestCase):
+    """
+    Tests de la pagination par curseur des listes de remises
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.influenceur = Influenceur.create_influenceur(nom='Awa Traoré', email='awa@example.com', password='secret')
+        self.autre = Influenceur.create_influenceur(nom='Moussa Diarra', email='moussa@example.com', password='secret')
+        maintenant = timezone.now()
+        for i in range(12):
+            remise = Remise.objects.create(
+                influenceur=self.influenceur if i % 3 else self.autre,
+                montant=Decimal('10.00'),
+            )
+            # Deux remises par date pour vérifier le départage des ex aequo
+            Remise.objects.filter(pk=remise.pk).update(date_creation=maintenant - timedelta(hours=i // 2))
+
+    def parcourir(self, url, **params):
+        """Parcourt toutes les pages et retourne les ids dans l'ordre"""
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids.extend(r['id'] for r in data['results'])
+            if not data['next']:
+                return ids
+            response = self.client.get(data['next'])
+
+    def ids_attendus(self, **filtres):
+        return list(
+            Remise.objects.filter(**filtres)
+            .order_by('-date_creation', '-id').values_list('id', flat=True)
+        )
+
+    def test_parcours_complet_sans_doublon(self):
+        self.assertEqual(self.parcourir(reverse('remise_view'), page_size=5), self.ids_attendus())
+
+    def test_remises_influenceur(self):
+        url = reverse('influenceur_remises', args=[self.influenceur.pk])
+        self.assertEqual(self.parcourir(url, page_size=3), self.ids_attendus(influenceur=self.influenceur))
+
+    def test_mode_compatibilite(self):
+        response = self.client.get(reverse('remise_view'), {'pagination': 'false'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in response.json()], self.ids_attendus())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RemiseExportTests(TestCase):
+    """
+    Tests de l'export en flux des remises
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.influenceur = Influenceur.create_influenceur(nom='Awa Traoré', email='awa@example.com', password='secret')
+        Remise.objects.create(influenceur=self.influenceur, montant=Decimal('10'), statut='payee',
+                              date_paiement=timezone.now())
+        Remise.objects.create(influenceur=self.influenceur, montant=Decimal('25.5'))
+
+    def test_csv(self):
+        import csv
+        import io
+        response = self.client.get(reverse('remises_export'), {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        lignes = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual([(l['montant'], l['statut']) for l in lignes], [('25.50', 'En attente'), ('10.00', 'Payée')])
+        self.assertEqual(lignes[1]['influenceur_nom'], 'Awa Traoré')
+
+    def test_filtre_statut_liste(self):
+        response = self.client.get(reverse('remise_view'), {'statut': 'payee'})
+        self.assertEqual([r['statut'] for r in response.json()['results']], ['payee'])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class GenerationRemisesTests(TestCase):
+    """
+    Tests du calcul des remises en masse (Remise.generer_remises_pour_tous)
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.nb_prospects = 0
+
+    def creer_influenceur(self, n, nb_confirmes, nb_autres=1):
+        influenceur = Influenceur.create_influenceur(nom=f'Influenceur {n}', email=f'i{n}@example.com', password='x')
+        for i in range(nb_confirmes + nb_autres):
+            self.nb_prospects += 1
+            Prospect.objects.create(
+                nom=f'Prospect {self.nb_prospects}', email=f'p{self.nb_prospects}@example.com',
+                telephone=f'{self.nb_prospects:08d}', influenceur=influenceur,
+                statut='confirme' if i < nb_confirmes else 'en_attente',
+            )
+        return influenceur
+
+    def test_une_remise_par_influenceur(self):
+        awa = self.creer_influenceur(1, nb_confirmes=3)
+        moussa = self.creer_influenceur(2, nb_confirmes=1)
+        sans_prospect = self.creer_influenceur(3, nb_confirmes=0)
+
+        remises = Remise.generer_remises_pour_tous(Decimal('10.00'))
+
+        self.assertEqual({r.influenceur_id: r.montant for r in remises}, {awa.pk: Decimal('30.00'), moussa.pk: Decimal('10.00')})
+        self.assertEqual(Remise.objects.filter(influenceur=sans_prospect).count(), 0)
+        for remise in remises:
+            self.assertEqual(
+                set(Prospect.objects.filter(remise=remise).values_list('statut', flat=True)), {'confirme'}
+            )
+        self.assertFalse(Prospect.objects.filter(statut='confirme', remise__isnull=True).exists())
+        # Les statistiques maintenues correspondent aux tables brutes
+        self.assertEqual(InfluenceurStats.verifier(), [])
+        self.assertEqual(InfluenceurStats.pour(awa).montant_en_attente, Decimal('30.00'))
+
+    def test_pas_de_double_remuneration(self):
+        self.creer_influenceur(1, nb_confirmes=2)
+        self.assertEqual(len(Remise.generer_remises_pour_tous()), 1)
+        self.assertEqual(Remise.generer_remises_pour_tous(), [])
+        self.assertEqual(Remise.objects.count(), 1)
+
+    def test_nombre_de_requetes_constant(self):
+        self.creer_influenceur(1, nb_confirmes=2)
+        with CaptureQueriesContext(connection) as peu:
+            Remise.generer_remises_pour_tous()
+        for n in range(2, 12):
+            self.creer_influenceur(n, nb_confirmes=n)
+        with CaptureQueriesContext(connection) as beaucoup:
+            self.assertEqual(len(Remise.generer_remises_pour_tous()), 10)
+        self.assertEqual(len(peu), len(beaucoup))
+
+    def test_conflit_annule_tout(self):
+        self.creer_influenceur(1, nb_confirmes=2)
+        with mock.patch('django.db.models.query.QuerySet.update', return_value=1):
+            with self.assertRaises(ConflitCalculRemises):
+                Remise.generer_remises_pour_tous()
+        self.assertEqual(Remise.objects.count(), 0)
+        self.assertEqual(InfluenceurStats.verifier(), [])
+
+    def test_remise_influenceur(self):
+        awa = self.creer_influenceur(1, nb_confirmes=2)
+        moussa = self.creer_influenceur(2, nb_confirmes=1)
+        remise = Remise.calculer_remise_automatique(awa, Decimal('5'))
+        self.assertEqual((remise.influenceur_id, remise.montant), (awa.pk, Decimal('10')))
+        self.assertEqual(Prospect.objects.filter(influenceur=moussa, remise__isnull=True, statut='confirme').count(), 1)
+        # Instance retournée suivie : la payer met les statistiques à jour une seule fois
+        remise.marquer_comme_payee()
+        self.assertEqual(InfluenceurStats.verifier(), [])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CalculRemisesTests(TestCase):
+    """
+    Tests du calcul des remises en arrière-plan (CalculRemises et run_commission_worker)
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.nb_prospects = 0
+        self.influenceurs = [self.creer_influenceur(n, nb_confirmes=n) for n in range(1, 6)]
+
+    def creer_influenceur(self, n, nb_confirmes):
+        influenceur = Influenceur.create_influenceur(nom=f'Influenceur {n}', email=f'i{n}@example.com', password='x')
+        for _ in range(nb_confirmes):
+            self.nb_prospects += 1
+            Prospect.objects.create(
+                nom=f'Prospect {self.nb_prospects}', email=f'p{self.nb_prospects}@example.com',
+                telephone=f'{self.nb_prospects:08d}', influenceur=influenceur, statut='confirme',
+            )
+        return influenceur
+
+    def test_demande_mise_en_file(self):
+        response = self.client.post(reverse('calculer_remises_automatiques'), {'montant_par_prospect': '5.00'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['calcul']['statut'], 'en_attente')
+        self.assertEqual(response.data['suivi'], reverse('calcul_remises_detail', args=[response.data['calcul']['id']]))
+        # Rien n'est calculé tant que le worker n'est pas passé
+        self.assertEqual(Remise.objects.count(), 0)
+
+    def test_montant_invalide(self):
+        for montant in ('abc', 'NaN', 'sNaN', 'Infinity', '-Infinity', '1e20', '0.001', '-5', '0'):
+            with self.subTest(montant=montant):
+                response = self.client.post(reverse('calculer_remises_automatiques'), {'montant_par_prospect': montant})
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(CalculRemises.objects.count(), 0)
+
+    def test_montant_invalide_par_influenceur(self):
+        url = reverse('calculer_remise_influenceur', args=[self.influenceurs[0].pk])
+        for montant in ('abc', 'NaN', '-5', '0', '0.001', '1e20'):
+            with self.subTest(montant=montant):
+                self.assertEqual(self.client.post(url, {'montant_par_prospect': montant}).status_code, 400)
+        self.assertEqual(Remise.objects.count(), 0)
+        response = self.client.post(url, {'montant_par_prospect': '5.00'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data['remise']['montant']), Decimal('5.00'))
+
+    def test_worker_par_lots_et_suivi(self):
+        calcul_id = self.client.post(reverse('calculer_remises_automatiques')).data['calcul']['id']
+
+        call_command('run_commission_worker', '--once', '--chunk-size', '2', stdout=StringIO())
+
+        suivi = self.client.get(reverse('calcul_remises_detail', args=[calcul_id])).data
+        self.assertEqual(suivi['statut'], 'termine')
+        self.assertEqual(suivi['progression'], 100)
+        self.assertEqual(suivi['nb_influenceurs_total'], 5)
+        self.assertEqual(suivi['nb_influenceurs_traites'], 5)
+        self.assertEqual(suivi['nb_remises'], 5)
+        self.assertEqual(Decimal(suivi['montant_total']), Decimal('150.00'))
+        self.assertEqual(suivi['erreurs'], [])
+        self.assertFalse(Prospect.objects.filter(statut='confirme', remise__isnull=True).exists())
+        self.assertEqual(InfluenceurStats.verifier(), [])
+
+        remises = self.client.get(reverse('calcul_remises_remises', args=[calcul_id]), {'pagination': 'false'}).data
+        self.assertEqual({r['influenceur'] for r in remises}, {i.pk for i in self.influenceurs})
+
+    def test_file_vide(self):
+        self.assertIsNone(CalculRemises.prendre_suivant())
+        calcul = CalculRemises.demander(Decimal('10.00'))
+        self.assertEqual(CalculRemises.prendre_suivant().pk, calcul.pk)
+        # Déjà pris par un worker : pas repris tant qu'il progresse
+        self.assertIsNone(CalculRemises.prendre_suivant())
+        # Sans progression depuis le délai de reprise : repris par un autre worker
+        self.assertEqual(CalculRemises.prendre_suivant(timedelta(seconds=-1)).pk, calcul.pk)
+
+    def test_lot_en_erreur_consigne(self):
+        CalculRemises.demander(Decimal('10.00'))
+        calcul = CalculRemises.prendre_suivant()
+        generer = Remise._generer_remises
+
+        def generer_sauf_premier_lot(montant, influenceur_ids=None, calcul=None):
+            if self.influenceurs[0].pk in influenceur_ids:
+                raise ConflitCalculRemises()
+            return generer(montant, influenceur_ids=influenceur_ids, calcul=calcul)
+
+        with mock.patch.object(Remise, '_generer_remises', side_effect=generer_sauf_premier_lot) as appel, \
+                self.assertLogs('remise.models', 'ERROR'):
+            calcul.executer(taille_lot=2)
+
+        calcul.refresh_from_db()
+        self.assertEqual(calcul.statut, 'termine')
+        self.assertEqual(calcul.nb_remises, 3)
+        self.assertEqual(len(calcul.erreurs), 1)
+        # Le lot en conflit est retenté avant d'être abandonné
+        self.assertEqual(appel.call_count, CalculRemises.TENTATIVES_PAR_LOT + 2)
+        self.assertEqual(Prospect.objects.filter(statut='confirme', remise__isnull=True).count(), 3)
+
+    @override_settings(CALCUL_REMISES_SYNCHRONE=True)
+    def test_execution_synchrone(self):
+        response = self.client.post(reverse('calculer_remises_automatiques'))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['calcul']['statut'], 'termine')
+        self.assertEqual(Remise.objects.filter(calcul_id=response.data['calcul']['id']).count(), 5)
+
+    @override_settings(CALCUL_REMISES_SYNCHRONE=True)
+    def test_execution_synchrone_du_calcul_demande(self):
+        # Un calcul plus ancien attend dans la file : il reste au worker
+        ancien = CalculRemises.demander(Decimal('1.00'))
+        response = self.client.post(reverse('calculer_remises_automatiques'), {'montant_par_prospect': '5.00'})
+        self.assertEqual(response.data['calcul']['statut'], 'termine')
+        self.assertEqual(Decimal(response.data['calcul']['montant_total']), Decimal('75.00'))
+        ancien.refresh_from_db()
+        self.assertEqual(ancien.statut, 'en_attente')
+        self.assertIsNone(CalculRemises.reserver(response.data['calcul']['id']))
@@ -1,17 +1,45 @@
-from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.shortcuts import get_object_or_404
-from .models import Remise
-from .serializers import RemiseSerializers
+from django.urls import reverse
+from .models import Remise, ConflitCalculRemises, CalculRemises
+from .serializers import RemiseSerializers, RemiseListeSerializer, RemiseExportSerializer, CalculRemisesSerializer
 from influenceur.permissions import CanPayRemises, IsInfluenceurOrAdmin, IsAdminUser
-from influenceur.auth import get_influenceur_from_user
+from influenceur.auth import get_influenceur_from_request
+from influenceur.models import Influenceur, InfluenceurStats
+from influenceur import cache, detecteur_n1, export
+from influenceur.filtres import lire_filtres, appliquer_filtres, FiltreInvalide
+from influenceur.pagination import reponse_paginee, RemiseCursorPagination
+from django.core.exceptions import ValidationError
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 from django.db import models
-from decimal import Decimal
+
+def _remises_filtrees(request):
+    """
+    Remises visibles par l'utilisateur, filtrées selon les paramètres GET
+    (communs à la liste et à l'export). Retourne (queryset, None) ou (None, réponse d'erreur).
+    """
+    try:
+        filtres = lire_filtres(request.GET, dict(Remise.STATUT_CHOICES))
+    except FiltreInvalide as e:
+        return None, Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Filtrer par influenceur si ce n'est pas un admin
+    current_influenceur = get_influenceur_from_request(request)
+    if not request.user.is_superuser and current_influenceur:
+        remises = Remise.objects.filter(influenceur=current_influenceur)
+        filtres['influenceur'] = None
+    else:
+        remises = Remise.objects.all()
+        if filtres['influenceur'] and not Influenceur.objects.filter(pk=filtres['influenceur']).exists():
+            return None, Response({'error': 'Influenceur non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+
+    return appliquer_filtres(remises, filtres, 'date_creation'), None
+
 
 @api_view(['GET'])
 @parser_classes([MultiPartParser, FormParser])
@@ -20,17 +48,34 @@ def remise_view(request):
     """
     Vue API pour lister toutes les remises (GET) .
     Les influenceurs voient leurs propres remises, les admins voient toutes.
+    Filtres : ?influenceur={id}, ?statut={en_attente|payee}, ?depuis=AAAA-MM-JJ&jusqu_au=AAAA-MM-JJ
+    Pagination par curseur (?cursor=...&page_size=...), ?pagination=false pour la liste complète.
     """
     if request.method == 'GET':
-        # Filtrer par influenceur si ce n'est pas un admin
-        current_influenceur = get_influenceur_from_user(request.user)
-        if not request.user.is_superuser and current_influenceur:
-            remises = Remise.objects.filter(influenceur=current_influenceur)
-        else:
-            remises = Remise.objects.all()
-            
-        serializer = RemiseSerializers(remises, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        remises, erreur = _remises_filtrees(request)
+        if erreur:
+            return erreur
+        return reponse_paginee(request, remises, RemiseListeSerializer, RemiseCursorPagination)
+
+
+@api_view(['GET'])
+@renderer_classes(export.RENDERERS)
+@permission_classes([IsInfluenceurOrAdmin])
+def remises_export_view(request):
+    """
+    Vue API d'export des remises en flux (GET), au format ?type={csv|ndjson}
+    (ou négocié par l'en-tête Accept, csv par défaut).
+    Mêmes filtres et mêmes droits que la liste ; le statut est exporté avec son libellé.
+    """
+    format_export = export.format_demande(request)
+    if format_export not in export.FORMATS:
+        return Response({'error': 'Type d\'export invalide (csv ou ndjson)'}, status=status.HTTP_400_BAD_REQUEST)
+
+    remises, erreur = _remises_filtrees(request)
+    if erreur:
+        return erreur
+    remises = remises.order_by('-date_creation', '-id')
+    return export.reponse_export(RemiseExportSerializer, remises, format_export, 'remises')
 
 
 @api_view(['POST'])
@@ -44,7 +89,7 @@ def remise_payer_view(request, pk):
     remise = get_object_or_404(Remise, pk=pk)
     
     # Vérifier les permissions pour cette remise spécifique
-    current_influenceur = get_influenceur_from_user(request.user)
+    current_influenceur = get_influenceur_from_request(request)
     if not request.user.is_superuser and current_influenceur and remise.influenceur != current_influenceur:
         return Response({'error': 'Accès non autorisé'}, status=status.HTTP_403_FORBIDDEN)
     
@@ -68,31 +113,56 @@ def remise_payer_view(request, pk):
 @permission_classes([IsAdminUser])
 def calculer_remises_automatiques_view(request):
     """
-    Vue API pour calculer automatiquement les remises pour tous les influenceurs.
-    Seuls les admins peuvent déclencher ce calcul.
+    Vue API pour lancer le calcul automatique des remises de tous les influenceurs.
+    Seuls les admins peuvent déclencher ce calcul. Le calcul est mis en file (CalculRemises)
+    et exécuté en arrière-plan par la commande run_commission_worker : la réponse (202)
+    contient l'URL de suivi. Avec CALCUL_REMISES_SYNCHRONE=True, il est exécuté immédiatement.
     """
-    from decimal import Decimal
-    
-    montant_par_prospect = Decimal(request.data.get('montant_par_prospect', '10.00'))
-    
+    # Validé comme la colonne (nombre fini, max_digits, decimal_places) : 'NaN' ou '1e20' sont refusés
+    champ = CalculRemises._meta.get_field('montant_par_prospect')
     try:
-        remises_creees = Remise.generer_remises_pour_tous(montant_par_prospect)
-        
-        if remises_creees:
-            serializer = RemiseSerializers(remises_creees, many=True)
-            return Response({
-                'detail': f'{len(remises_creees)} remise(s) créée(s) automatiquement.',
-                'remises': serializer.data
-            }, status=status.HTTP_201_CREATED)
-        else:
-            return Response({
-                'detail': 'Aucune remise à créer. Tous les prospects ont déjà une remise.'
-            }, status=status.HTTP_200_OK)
-            
-    except Exception as e:
-        return Response({
-            'error': f'Erreur lors du calcul des remises : {str(e)}'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        montant_par_prospect = champ.clean(str(request.data.get('montant_par_prospect', '10.00')), None)
+    except ValidationError:
+        return Response({'error': 'montant_par_prospect invalide'}, status=status.HTTP_400_BAD_REQUEST)
+    if montant_par_prospect <= 0:
+        return Response({'error': 'montant_par_prospect doit être positif'}, status=status.HTTP_400_BAD_REQUEST)
+
+    calcul = CalculRemises.demander(montant_par_prospect, demande_par=request.user.get_username())
+    if getattr(settings, 'CALCUL_REMISES_SYNCHRONE', False):
+        # Ce calcul précisément (pas le plus ancien de la file) ; déjà pris par un worker, il y est suivi
+        reserve = CalculRemises.reserver(calcul.pk)
+        if reserve is not None:
+            # Une transaction par lot d'influenceurs : la répétition est voulue
+            with detecteur_n1.tolerer():
+                reserve.executer()
+        calcul.refresh_from_db()
+
+    return Response({
+        'detail': 'Calcul des remises mis en file.',
+        'calcul': CalculRemisesSerializer(calcul).data,
+        'suivi': reverse('calcul_remises_detail', args=[calcul.pk]),
+        'remises': reverse('calcul_remises_remises', args=[calcul.pk]),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def calcul_remises_detail_view(request, pk):
+    """
+    Vue API de suivi d'un calcul de remises : statut, progression, compteurs et erreurs par lot.
+    """
+    calcul = get_object_or_404(CalculRemises, pk=pk)
+    return Response(CalculRemisesSerializer(calcul).data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def calcul_remises_remises_view(request, pk):
+    """
+    Vue API listant les remises créées par un calcul (pagination par curseur, comme /remises/).
+    """
+    calcul = get_object_or_404(CalculRemises, pk=pk)
+    return reponse_paginee(request, Remise.objects.filter(calcul=calcul), RemiseListeSerializer, RemiseCursorPagination)
 
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
@@ -101,11 +171,15 @@ def calculer_remise_influenceur_view(request, influenceur_id):
     Vue API pour calculer une remise pour un influenceur spécifique.
     Seuls les admins peuvent déclencher ce calcul.
     """
-    from influenceur.models import Influenceur
-    from decimal import Decimal
-    
     influenceur = get_object_or_404(Influenceur, pk=influenceur_id)
-    montant_par_prospect = Decimal(request.data.get('montant_par_prospect', '10.00'))
+    # Même validation que calculer_remises_automatiques_view
+    champ = CalculRemises._meta.get_field('montant_par_prospect')
+    try:
+        montant_par_prospect = champ.clean(str(request.data.get('montant_par_prospect', '10.00')), None)
+    except ValidationError:
+        return Response({'error': 'montant_par_prospect invalide'}, status=status.HTTP_400_BAD_REQUEST)
+    if montant_par_prospect <= 0:
+        return Response({'error': 'montant_par_prospect doit être positif'}, status=status.HTTP_400_BAD_REQUEST)
     
     try:
         remise = Remise.calculer_remise_automatique(influenceur, montant_par_prospect)
@@ -121,6 +195,10 @@ def calculer_remise_influenceur_view(request, influenceur_id):
                 'detail': 'Aucun prospect sans remise pour cet influenceur.'
             }, status=status.HTTP_200_OK)
             
+    except ConflitCalculRemises:
+        return Response({
+            'error': 'Les prospects à rémunérer ont changé pendant le calcul, aucune remise créée. Réessayez.'
+        }, status=status.HTTP_409_CONFLICT)
     except Exception as e:
         return Response({
             'error': f'Erreur lors du calcul de la remise : {str(e)}'
@@ -132,30 +210,18 @@ def statistiques_remises_view(request):
     """
     Vue API pour obtenir des statistiques sur les remises.
     Seuls les admins peuvent voir les statistiques globales.
+    Les compteurs sont lus dans la table InfluenceurStats (une requête).
     """
-    total_remises = Remise.objects.count()
-    remises_payees = Remise.objects.filter(statut='payee').count()
-    remises_en_attente = Remise.objects.filter(statut='en_attente').count()
-    
-    montant_total = Remise.objects.aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
-    
-    montant_paye = Remise.objects.filter(statut='payee').aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
-    
-    montant_en_attente = Remise.objects.filter(statut='en_attente').aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
-    
-    stats = {
-        'total_remises': total_remises,
-        'remises_payees': remises_payees,
-        'remises_en_attente': remises_en_attente,
-        'montant_total': float(montant_total),
-        'montant_paye': float(montant_paye),
-        'montant_en_attente': float(montant_en_attente),
-    }
+    def calculer():
+        totaux = InfluenceurStats.totaux()
+        return {
+            'total_remises': totaux['nb_remises'],
+            'remises_payees': totaux['nb_remises_payees'],
+            'remises_en_attente': totaux['nb_remises_en_attente'],
+            'montant_total': float(totaux['montant_paye'] + totaux['montant_en_attente']),
+            'montant_paye': float(totaux['montant_paye']),
+            'montant_en_attente': float(totaux['montant_en_attente']),
+        }
     
+    stats = cache.obtenir('statistiques_remises', None, calculer)
     return Response(stats, status=status.HTTP_200_OK)
@@ -12,8 +12,11 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from decouple import config
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
+import importlib.util
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -78,6 +81,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'influenceur.instrumentation.InstrumentationMiddleware',
+    'influenceur.detecteur_n1.DetectionN1Middleware',
 ]
 
 ROOT_URLCONF = 'src.urls'
@@ -121,8 +126,26 @@ WSGI_APPLICATION = 'src.wsgi.application'
 DATABASES = {
     'default':dj_database_url.parse(env('DATABASE_URL'))
 }
+# Cache (statistiques et dashboards)
+# Exemples : locmemcache://affiliation, filecache:///var/tmp/affiliation_cache, rediscache://127.0.0.1:6379/1
+# TIMEOUT se règle dans l'URL (?timeout=300) ; MAX_ENTRIES (?max_entries=10000) ne vaut que pour
+# locmem et fichier, Redis le refuse. locmem est propre à chaque processus : les invalidations
+# (statistiques, influenceur connecté) ne sont alors pas vues par les autres workers, la production
+# doit utiliser un cache partagé (Redis). La version des permissions des tokens JWT est alors lue
+# en base à chaque requête (voir cache.version_permissions).
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://affiliation?timeout=300&max_entries=10000'),
+}
+STATS_CACHE_TIMEOUT = env.int('STATS_CACHE_TIMEOUT', default=300)
+
+# Exports CSV/NDJSON : nombre de lignes lues par lot
+EXPORT_CHUNK_SIZE = env.int('EXPORT_CHUNK_SIZE', default=2000)
+
+# Calcul des remises : exécuté par le worker (run_commission_worker), ou dans la requête si True
+CALCUL_REMISES_SYNCHRONE = env.bool('CALCUL_REMISES_SYNCHRONE', default=False)
+
 # Configuration pour envoyer des mail
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = env('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST')
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
@@ -130,6 +153,15 @@ EMAIL_PORT = config('EMAIL_PORT')
 EMAIL_USE_TLS = config('EMAIL_USE_TLS')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')
 
+# File d'envoi des emails (run_email_dispatcher) : taille des lots, tentatives avant abandon
+# et délai avant la première nouvelle tentative (doublé à chaque échec), en secondes
+EMAIL_OUTBOX_BATCH_SIZE = env.int('EMAIL_OUTBOX_BATCH_SIZE', default=50)
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5)
+EMAIL_OUTBOX_BACKOFF = env.int('EMAIL_OUTBOX_BACKOFF', default=60)
+# Connexions SMTP simultanées par lot et débit maximum (emails par seconde, 0 = sans limite)
+EMAIL_OUTBOX_CONCURRENCY = env.int('EMAIL_OUTBOX_CONCURRENCY', default=1)
+EMAIL_OUTBOX_RATE = env.float('EMAIL_OUTBOX_RATE', default=0)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -148,6 +180,31 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hachage des mots de passe : PASSWORD_HASHER (pbkdf2, argon2, scrypt ou bcrypt) hache les
+# nouveaux mots de passe, les autres algorithmes restent reconnus et leurs hachages sont
+# remplacés à la connexion suivante (argon2 et bcrypt nécessitent argon2-cffi et bcrypt).
+# Hachages exécutés par PASSWORD_HASHING_WORKERS threads, PASSWORD_HASHING_QUEUE en attente
+# au plus (au-delà : 503), 0 worker pour hacher dans le thread de la requête
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'bcrypt': 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+}
+PASSWORD_HASHER = env('PASSWORD_HASHER', default='pbkdf2')
+if PASSWORD_HASHER not in _PASSWORD_HASHERS:
+    raise ImproperlyConfigured(f'PASSWORD_HASHER doit valoir {", ".join(_PASSWORD_HASHERS)}')
+if PASSWORD_HASHER in ('argon2', 'bcrypt') and importlib.util.find_spec(PASSWORD_HASHER) is None:
+    raise ImproperlyConfigured(f'PASSWORD_HASHER={PASSWORD_HASHER} nécessite le paquet '
+                               f'{"argon2-cffi" if PASSWORD_HASHER == "argon2" else "bcrypt"}')
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS[PASSWORD_HASHER],
+    *(hasher for nom, hasher in _PASSWORD_HASHERS.items() if nom != PASSWORD_HASHER),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+PASSWORD_HASHING_WORKERS = env.int('PASSWORD_HASHING_WORKERS', default=min(4, os.cpu_count() or 1))
+PASSWORD_HASHING_QUEUE = env.int('PASSWORD_HASHING_QUEUE', default=32)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -173,6 +230,60 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AFFILIATION_BASE_URL = config('AFFILIATION_BASE_URL', default="http://localhost:8000")
 
+# Formulaire d'affiliation : durée de cache de la résolution code -> influenceur (secondes)
+# et mise en file des inscriptions, importées par lots par flush_affiliation_queue
+AFFILIATION_CODE_CACHE_TIMEOUT = env.int('AFFILIATION_CODE_CACHE_TIMEOUT', default=300)
+AFFILIATION_INTAKE_BUFFERED = env.bool('AFFILIATION_INTAKE_BUFFERED', default=False)
+
+# Résolution utilisateur -> influenceur (permissions et vues) : durée de cache en secondes,
+# invalidée à chaque sauvegarde ou suppression de l'influenceur
+AUTH_INFLUENCEUR_CACHE_TIMEOUT = env.int('AUTH_INFLUENCEUR_CACHE_TIMEOUT', default=60)
+# Version des permissions des influenceurs (révocation des tokens JWT), publiée dans le cache
+# à chaque changement et relue en base au plus une fois par période
+AUTH_PERMISSION_VERSION_CACHE_TIMEOUT = env.int('AUTH_PERMISSION_VERSION_CACHE_TIMEOUT', default=300)
+
+# Dernière connexion d'un influenceur réécrite au plus une fois par intervalle (secondes)
+LAST_LOGIN_UPDATE_INTERVAL = env.int('LAST_LOGIN_UPDATE_INTERVAL', default=60)
+# Dernière activité des requêtes authentifiées par token (influenceur.activite) : notée au plus
+# une fois par LAST_SEEN_INTERVAL secondes et par influenceur, écrite par lots d'au plus
+# LAST_SEEN_BATCH_SIZE influenceurs toutes les LAST_SEEN_FLUSH_INTERVAL secondes
+LAST_SEEN_INTERVAL = env.int('LAST_SEEN_INTERVAL', default=300)
+LAST_SEEN_FLUSH_INTERVAL = env.float('LAST_SEEN_FLUSH_INTERVAL', default=30)
+LAST_SEEN_BATCH_SIZE = env.int('LAST_SEEN_BATCH_SIZE', default=500)
+
+# Instrumentation des requêtes (influenceur.instrumentation) : seuil de journalisation des
+# requêtes lentes (ms), en-tête Server-Timing et mesures gardées en mémoire par vue
+SLOW_REQUEST_THRESHOLD_MS = env.float('SLOW_REQUEST_THRESHOLD_MS', default=500)
+SERVER_TIMING_HEADER = env.bool('SERVER_TIMING_HEADER', default=False)
+INSTRUMENTATION_BUFFER_SIZE = env.int('INSTRUMENTATION_BUFFER_SIZE', default=1000)
+
+# Détection des requêtes N+1 (influenceur.detecteur_n1) : exception en développement et pendant
+# les tests, avertissement sur un échantillon de requêtes en production
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+N1_DETECTION = env('N1_DETECTION', default='raise' if DEBUG or TESTING else 'log')
+N1_THRESHOLD = env.int('N1_THRESHOLD', default=10)
+N1_SAMPLE_RATE = env.float('N1_SAMPLE_RATE', default=0.05)
+
+# Journalisation sur la sortie standard ; les requêtes lentes sont des lignes JSON brutes
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+        'json': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+        'console_json': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'root': {'handlers': ['console'], 'level': env('LOG_LEVEL', default='WARNING')},
+    'loggers': {
+        # Les réponses 4xx sont visibles dans l'instrumentation ; seules les erreurs 5xx sont journalisées
+        'django.request': {'level': 'ERROR'},
+        'influenceur.instrumentation': {'handlers': ['console_json'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 
 
 MEDIA_URL = '/media/'
@@ -212,7 +323,7 @@ CORS_ALLOW_HEADERS = [
 # Configuration REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'influenceur.auth.InfluenceurJWTAuthentication',  # JWT simplejwt, sans requête pour les influenceurs
         'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],